@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Streaming conversion of foreign tomography layouts to DXchange HDF5.
+
+Source plugins (sources.py) expose the projections, flats, darks and angles
+of one format as lazy arrays; the writer below copies them into
+``/exchange/data``, ``data_white``, ``data_dark`` and ``theta`` in slabs
+bounded by ``--memory``, so files larger than RAM convert fine. Chunking and
+compression of HDF5 sources are preserved unless overridden, and several
+input files are converted concurrently.
+
+Supported sources: nsls (NSLS-II FXI fly scan), nexus (NXtomo image_key
+stack), nikon (XTEK CT folder of TIFFs), vgstudio (.vgi/.vol volume).
+
+Usage:
+    python dxconvert.py fly_scan_*.h5 --out-dir /data/dx
+    python dxconvert.py /data/nikon/run_01 --source nikon --compression gzip
+    python dxconvert.py --list
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import h5py
+import numpy as np
+
+import sources  # registers the plugins
+from dxsource import SOURCES, find_source
+
+DXCHANGE = '/exchange'
+
+
+def dataset_options(src, chunks='source', compression='source', level=None):
+    """h5py create_dataset options for one output dataset.
+
+    ``chunks`` is 'source' (keep the source chunking, one projection per
+    chunk if the source has none), 'proj' (one projection per chunk) or an
+    explicit tuple; ``compression`` is 'source', 'none', 'gzip' or 'lzf'.
+    """
+    src_chunks = getattr(src, 'chunks', None)
+    if chunks == 'source':
+        chunks = src_chunks or 'proj'
+    if chunks == 'proj':
+        chunks = (1,) + tuple(src.shape[1:])
+    chunks = tuple(min(c, max(1, s)) for c, s in zip(chunks, src.shape))
+
+    opts = {'chunks': chunks}
+    if compression == 'source':
+        if getattr(src, 'compression', None) in ('gzip', 'lzf'):
+            opts['compression'] = src.compression
+            opts['compression_opts'] = src.compression_opts
+    elif compression != 'none':
+        opts['compression'] = compression
+        if compression == 'gzip' and level is not None:
+            opts['compression_opts'] = level
+    return opts
+
+
+def copy_dataset(src, dst, memory):
+    """Copy src into dst along axis 0, at most memory bytes per slab.
+
+    Slabs are whole multiples of the destination chunk length so every chunk
+    is written (and compressed) exactly once.
+    """
+    n = src.shape[0]
+    frame = np.dtype(src.dtype).itemsize * int(np.prod(src.shape[1:]))
+    step = dst.chunks[0] if dst.chunks else 1
+    slab = max(step, memory // max(frame, 1) // step * step)
+    for start in range(0, n, slab):
+        stop = min(start + slab, n)
+        dst[start:stop] = src[start:stop]
+    return frame * n
+
+
+def convert(path, out_dir, source=None, chunks='source', compression='source',
+            level=None, memory=1024**3):
+    """Convert one input to ``<out_dir>/<name>.h5`` in DXchange layout.
+
+    Returns
+    -------
+    tuple
+        Output file, bytes of image data written and elapsed seconds.
+    """
+    t0 = time.perf_counter()
+    cls = find_source(path, source)
+    nbytes = 0
+    with cls(path) as src:
+        out = os.path.join(out_dir, src.output_name() + '.h5')
+        with h5py.File(out, 'w') as h5w:
+            for name, data in src.datasets.items():
+                opts = dataset_options(data, chunks, compression, level)
+                dst = h5w.create_dataset(f'{DXCHANGE}/{name}', shape=data.shape,
+                                         dtype=data.dtype, **opts)
+                nbytes += copy_dataset(data, dst, memory)
+            if src.theta is not None:
+                h5w.create_dataset(f'{DXCHANGE}/theta', data=np.asarray(src.theta, dtype=np.float64))
+            h5w.attrs['source_format'] = cls.name
+            h5w.attrs['source_path'] = os.path.abspath(path)
+    return out, nbytes, time.perf_counter() - t0
+
+
+def _chunks_arg(value):
+    if value in ('source', 'proj'):
+        return value
+    return tuple(int(c) for c in value.split(','))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('inputs', nargs='*', help='Input files or folders')
+    parser.add_argument('--out-dir', default='.', help='Output folder (default: .)')
+    parser.add_argument('--source', choices=sorted(SOURCES),
+                        help='Source format (default: detect)')
+    parser.add_argument('--chunks', type=_chunks_arg, default='source',
+                        help="'source', 'proj' or comma separated chunk shape (default: source)")
+    parser.add_argument('--compression', choices=('source', 'none', 'gzip', 'lzf'),
+                        default='source', help='Output compression (default: source)')
+    parser.add_argument('--level', type=int, default=None, help='gzip level')
+    parser.add_argument('--workers', type=int, default=min(4, os.cpu_count()),
+                        help='Files converted concurrently')
+    parser.add_argument('--memory', type=float, default=4.0,
+                        help='Total memory cap for data slabs in GB (default: 4)')
+    parser.add_argument('--list', action='store_true', help='List the source plugins and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, cls in sorted(SOURCES.items()):
+            print(f'{name:10s} {cls.__doc__.splitlines()[0]}')
+        return
+    if not args.inputs:
+        parser.error('No input files given')
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    workers = max(1, min(args.workers, len(args.inputs)))
+    memory = int(args.memory * 1024**3) // workers
+    t0 = time.perf_counter()
+    total = 0
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(convert, path, args.out_dir, args.source, args.chunks,
+                               args.compression, args.level, memory): path
+                   for path in args.inputs}
+        for future in as_completed(futures):
+            try:
+                out, nbytes, dt = future.result()
+            except Exception as err:
+                print(f'ERROR: {futures[future]}: {err}', file=sys.stderr)
+                failed += 1
+                continue
+            total += nbytes
+            print('Done: %s %.1f MB in %.1f s (%.1f MB/s)'
+                  % (out, nbytes / 1024**2, dt, nbytes / 1024**2 / max(dt, 1e-9)))
+    dt = time.perf_counter() - t0
+    print('All %d inputs: %.1f MB in %.1f s (%.1f MB/s aggregate)'
+          % (len(args.inputs), total / 1024**2, dt, total / 1024**2 / max(dt, 1e-9)))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Source-plugin registry for converting foreign tomography layouts to DXchange.
+
+A source plugin describes where one facility or vendor format keeps its
+projections, flats, darks and angles. It exposes them as lazy, slab-readable
+arrays so the shared streaming writer in dxconvert.py never loads a whole
+dataset. A new layout is a small subclass of Source registered with
+``@register_source``; see sources.py for examples.
+"""
+
+import os
+
+import numpy as np
+
+SOURCES = {}
+
+
+def register_source(cls):
+    """Class decorator adding a Source subclass to the plugin registry."""
+    SOURCES[cls.name] = cls
+    return cls
+
+
+def find_source(path, name=None):
+    """Return the Source class for path, by name or by asking every plugin."""
+    if name is not None:
+        try:
+            return SOURCES[name]
+        except KeyError:
+            raise ValueError(f'Unknown source {name!r}, choose from {sorted(SOURCES)}')
+    for cls in SOURCES.values():
+        if cls.match(path):
+            return cls
+    raise ValueError(f'No source plugin recognizes {path}')
+
+
+class Source:
+    """Base class of the source plugins.
+
+    Subclasses set ``name``, implement ``match`` and ``open``; ``open`` fills
+    ``self.datasets`` with DXchange names ('data', 'data_white', 'data_dark')
+    mapped to arrays supporting ``shape``, ``dtype`` and slicing along axis 0,
+    and sets ``self.theta`` (degrees) if the format records angles.
+    """
+
+    name = None
+
+    def __init__(self, path):
+        self.path = path
+        self.datasets = {}
+        self.theta = None
+        self._files = []
+
+    @classmethod
+    def match(cls, path):
+        """True if path looks like this plugin's format."""
+        return False
+
+    def open(self):
+        raise NotImplementedError
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        self._files = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def output_name(self):
+        """Base name of the DXchange file written for this source."""
+        return os.path.splitext(os.path.basename(os.path.normpath(self.path)))[0]
+
+
+class FrameView:
+    """Lazy view of selected frames (axis 0) of an HDF5 dataset.
+
+    Slab reads are split into runs of consecutive frames, each read with a
+    single hyperslab selection.
+    """
+
+    def __init__(self, dset, indices):
+        self.dset = dset
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.shape = (len(self.indices),) + dset.shape[1:]
+        self.dtype = dset.dtype
+        self.chunks = dset.chunks
+        self.compression = dset.compression
+        self.compression_opts = dset.compression_opts
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('FrameView only supports slices along axis 0')
+        sel = self.indices[index]
+        out = np.empty((len(sel),) + self.shape[1:], dtype=self.dtype)
+        if not len(sel):
+            return out
+        breaks = np.flatnonzero(np.diff(sel) != 1) + 1
+        pos = 0
+        for run in np.split(sel, breaks):
+            out[pos:pos + len(run)] = self.dset[run[0]:run[-1] + 1]
+            pos += len(run)
+        return out
+
+
+class TiffStackView:
+    """Lazy (frames, rows, columns) view of a list of single-image TIFF files."""
+
+    def __init__(self, files):
+        import tifffile
+        self._tifffile = tifffile
+        self.files = list(files)
+        first = tifffile.imread(self.files[0])
+        self.shape = (len(self.files),) + first.shape
+        self.dtype = first.dtype
+        self.chunks = None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        files = self.files[index]
+        out = np.empty((len(files),) + self.shape[1:], dtype=self.dtype)
+        for i, fname in enumerate(files):
+            out[i] = self._tifffile.imread(fname)
+        return out
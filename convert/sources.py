@@ -0,0 +1,135 @@
+"""
+Source plugins for dxconvert.py.
+
+Each plugin maps one foreign layout onto the DXchange datasets. Add a new
+layout by subclassing dxsource.Source and decorating it with
+``@register_source``.
+"""
+
+import configparser
+import glob
+import os
+
+import h5py
+import numpy as np
+
+from dxsource import Source, FrameView, TiffStackView, register_source
+
+
+@register_source
+class NslsFlyScan(Source):
+    """NSLS-II FXI fly scan: img_tomo, img_bkg, img_dark and angle at the root."""
+
+    name = 'nsls'
+    keys = {'data': 'img_tomo', 'data_white': 'img_bkg', 'data_dark': 'img_dark'}
+
+    @classmethod
+    def match(cls, path):
+        if not h5py.is_hdf5(path):
+            return False
+        with h5py.File(path, 'r') as f:
+            return 'img_tomo' in f and 'angle' in f
+
+    def open(self):
+        f = h5py.File(self.path, 'r')
+        self._files.append(f)
+        self.datasets = {k: f[v] for k, v in self.keys.items() if v in f}
+        self.theta = f['angle'][:]
+
+
+@register_source
+class NexusTomo(Source):
+    """NeXus NXtomo (Diamond, ESRF): one data stack split by image_key."""
+
+    name = 'nexus'
+    data_paths = ('/entry1/tomo_entry/data/data', '/entry0000/data/data', '/entry/data/data')
+    angle_paths = ('/entry1/tomo_entry/data/rotation_angle', '/entry0000/data/rotation_angle',
+                   '/entry/data/rotation_angle')
+    key_paths = ('/entry1/tomo_entry/instrument/detector/image_key', '/entry1/instrument/image_key/image_key',
+                 '/entry0000/data/image_key', '/entry/data/image_key')
+
+    @staticmethod
+    def _first(f, paths):
+        for p in paths:
+            if p in f:
+                return p
+        return None
+
+    @classmethod
+    def match(cls, path):
+        if not h5py.is_hdf5(path):
+            return False
+        with h5py.File(path, 'r') as f:
+            return cls._first(f, cls.data_paths) is not None and cls._first(f, cls.key_paths) is not None
+
+    def open(self):
+        f = h5py.File(self.path, 'r')
+        self._files.append(f)
+        dset = f[self._first(f, self.data_paths)]
+        image_key = f[self._first(f, self.key_paths)][:].astype(int)
+        for name, key in (('data', 0), ('data_white', 1), ('data_dark', 2)):
+            indices = np.flatnonzero(image_key == key)
+            if len(indices):
+                self.datasets[name] = FrameView(dset, indices)
+        angle_path = self._first(f, self.angle_paths)
+        if angle_path is not None:
+            self.theta = f[angle_path][:][image_key == 0]
+
+
+@register_source
+class NikonXtek(Source):
+    """Nikon XTEK CT run folder: <name>.xtekct plus one TIFF per projection."""
+
+    name = 'nikon'
+
+    @classmethod
+    def match(cls, path):
+        return os.path.isdir(path) and bool(glob.glob(os.path.join(path, '*.xtekct')))
+
+    def open(self):
+        xtekct = sorted(glob.glob(os.path.join(self.path, '*.xtekct')))[0]
+        config = configparser.ConfigParser(interpolation=None)
+        with open(xtekct, encoding='latin-1') as f:
+            config.read_file(f)
+        ct = config['XTekCT']
+        stem = os.path.splitext(os.path.basename(xtekct))[0]
+        files = sorted(glob.glob(os.path.join(self.path, stem + '_[0-9]*.tif')))
+        if not files:
+            raise ValueError(f'{self.path}: no projection TIFFs {stem}_NNNN.tif')
+        self.datasets['data'] = TiffStackView(files)
+        start = float(ct.get('InitialAngle', 0))
+        step = float(ct.get('AngularStep', 360.0 / len(files)))
+        self.theta = start + step * np.arange(len(files))
+
+
+@register_source
+class VGStudioVolume(Source):
+    """VGStudio raw volume: .vgi header next to the .vol data file."""
+
+    name = 'vgstudio'
+    dtypes = {
+        'unsigned char': np.uint8, 'unsigned short': np.uint16, 'unsigned int': np.uint32,
+        'char': np.int8, 'short': np.int16, 'int': np.int32,
+        'float': np.float32, 'double': np.float64,
+    }
+
+    @classmethod
+    def match(cls, path):
+        return path.lower().endswith('.vgi')
+
+    def open(self):
+        meta = {}
+        with open(self.path, 'r') as f:
+            for line in f:
+                key, sep, val = line.strip().partition('=')
+                if sep:
+                    meta[key.strip().lower()] = val.strip()
+        nx, ny, nz = map(int, meta['size'].split())
+        dtype = self.dtypes[meta.get('datatype', 'unsigned short').lower()]
+        endian = meta.get('byteorder', meta.get('endiantype', 'little-endian')).lower()
+        dtype = np.dtype(dtype).newbyteorder('<' if 'little' in endian else '>')
+        vol_name = meta.get('name', os.path.splitext(os.path.basename(self.path))[0] + '.vol')
+        vol_path = os.path.join(os.path.dirname(self.path), vol_name)
+        skip = int(meta.get('skipheader', meta.get('skipbytes', 0)))
+        # Memory-mapped, so the writer only pages in the slabs it copies...
+        self.datasets['data'] = np.memmap(vol_path, dtype=dtype, mode='r', offset=skip, shape=(nz, ny, nx))
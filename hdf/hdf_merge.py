@@ -1,35 +1,130 @@
 import os
+import sys
+import time
+import argparse
 import h5py
 
 home_dir = '/data/2023-02/Jakes_rec/Absorptoin_EW_01_047_rec_00_parts/'
 out_dir = '/data/2023-02/Jakes_rec/'
 
-first = True
+DS_PROJ = 'exchange/data'
+SLAB = 50   # projections per read/write when chunks have to be decoded
 
-with h5py.File(out_dir + 'Absorptoin_EW_01_047_rec_00_nolinks.h5', 'a') as h5w:
-    for entry in os.scandir(home_dir):
-        fname = home_dir + entry.name
 
-        with h5py.File(fname, 'r') as h5r:
+def part_layout(fname):
+    """Shape, dtype, chunks and HDF5 filter pipeline of one part's data."""
+    with h5py.File(fname, 'r') as h5r:
+        dset = h5r[DS_PROJ]
+        dcpl = dset.id.get_create_plist()
+        filters = tuple(dcpl.get_filter(i)[:3] for i in range(dcpl.get_nfilters()))
+        return {'shape': dset.shape, 'dtype': dset.dtype,
+                'chunks': dset.chunks, 'filters': filters}
+
+
+def can_copy_chunks(layouts):
+    """True if raw chunks can be moved between parts and the output as is.
+
+    All parts need the same dtype, image size, chunk shape and filters, and
+    every part but the last must end on a chunk boundary along axis 0 so
+    the chunks keep their alignment in the merged dataset.
+    """
+    first = layouts[0]
+    if first['chunks'] is None:
+        return False
+    for layout in layouts:
+        for key in ('dtype', 'chunks', 'filters'):
+            if layout[key] != first[key]:
+                return False
+        if layout['shape'][1:] != first['shape'][1:]:
+            return False
+    return all(l['shape'][0] % first['chunks'][0] == 0 for l in layouts[:-1])
+
+
+def create_output(h5w, fname, total):
+    """Create the merged dataset with its final shape in one go.
+
+    The creation property list of the first part is reused, so chunk shape
+    and filters are identical to the parts'.
+    """
+    with h5py.File(fname, 'r') as h5r:
+        src = h5r[DS_PROJ]
+        shape = (total,) + src.shape[1:]
+        space = h5py.h5s.create_simple(shape, (h5py.h5s.UNLIMITED,) + src.shape[1:])
+        group = h5w.require_group(os.path.dirname(DS_PROJ))
+        h5py.h5d.create(group.id, os.path.basename(DS_PROJ).encode(),
+                        src.id.get_type(), space,
+                        dcpl=src.id.get_create_plist())
+    return h5w[DS_PROJ]
+
+
+def copy_chunks(src, dst, start):
+    """Move every stored chunk of src into dst, shifted by start projections."""
+    sid, did = src.id, dst.id
+    nbytes = 0
+    for index in range(sid.get_num_chunks()):
+        offset = sid.get_chunk_info(index).chunk_offset
+        filter_mask, chunk = sid.read_direct_chunk(offset)
+        did.write_direct_chunk((offset[0] + start,) + tuple(offset[1:]),
+                               chunk, filter_mask)
+        nbytes += len(chunk)
+    return nbytes
+
+
+def copy_slabs(src, dst, start):
+    """Decode and re-encode src into dst, SLAB projections at a time."""
+    n = src.shape[0]
+    for s in range(0, n, SLAB):
+        e = min(s + SLAB, n)
+        dst[start + s:start + e] = src[s:e]
+    return n * src.dtype.itemsize * src.shape[1] * src.shape[2]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Merge the exchange/data of part files into one dataset.')
+    parser.add_argument('--parts', default=home_dir, help='Folder with the part files')
+    parser.add_argument('--output', default=os.path.join(out_dir, 'Absorptoin_EW_01_047_rec_00_nolinks.h5'),
+                        help='Merged output file')
+    parser.add_argument('--decode', action='store_true',
+                        help='Always decode/re-encode instead of copying raw chunks')
+    args = parser.parse_args()
+
+    fnames = sorted(os.path.join(args.parts, e.name) for e in os.scandir(args.parts)
+                    if e.is_file() and e.name.endswith(('.h5', '.hdf', '.hdf5')))
+    if not fnames:
+        print('ERROR: no hdf file found in %s' % args.parts)
+        sys.exit(1)
+
+    # Pre-scan all parts to size the output once...
+    layouts = [part_layout(fname) for fname in fnames]
+    total = sum(l['shape'][0] for l in layouts)
+    direct = not args.decode and can_copy_chunks(layouts)
+    print('exchange/data', ':', layouts[0]['dtype'], (total,) + layouts[0]['shape'][1:],
+          'raw chunk copy' if direct else 'decoded copy')
+
+    t0 = time.perf_counter()
+    nbytes = 0
+    with h5py.File(args.output, 'w') as h5w:
+        if direct:
+            dst = create_output(h5w, fnames[0], total)
+        else:
+            dst = h5w.create_dataset(DS_PROJ, shape=(total,) + layouts[0]['shape'][1:],
+                                     dtype=layouts[0]['dtype'], chunks=True,
+                                     maxshape=(None,) + layouts[0]['shape'][1:])
+        start = 0
+        for fname, layout in zip(fnames, layouts):
             print('reading: ', fname)
+            with h5py.File(fname, 'r') as h5r:
+                src = h5r[DS_PROJ]
+                if direct:
+                    nbytes += copy_chunks(src, dst, start)
+                else:
+                    nbytes += copy_slabs(src, dst, start)
+            start += layout['shape'][0]
+
+    dt = time.perf_counter() - t0
+    print('done: %.1f MB in %.2f s (%.1f MB/s)' % (nbytes / 1024**2, dt, nbytes / 1024**2 / dt))
+
 
-            ds_arr = h5r['exchange/data'][:, :, :]
-            if first:
-                print ('exchange/data', ':', ds_arr.dtype, ds_arr.shape)
-                print('create_dataset')
-                # h5w.create_dataset('exchange/data', data=ds_arr)
-                h5w.create_dataset('exchange/data', data=ds_arr, chunks=True, maxshape=(None,ds_arr.shape[1],ds_arr.shape[2]))
-                first = False
-            else:
-                h5w['exchange/data'].resize((h5w['exchange/data'].shape[0] + h5r['exchange/data'].shape[0]), axis=0)
-                h5w['exchange/data'][-ds_arr.shape[0]:] = ds_arr
-
-print ('done')
-
-# with h5py.File(out_dir + 'all.h5', 'a') as h5w:
-#     fname = home_dir + 'p0005.h5'
-#     with h5py.File(fname, 'r') as h5r:
-#         print('reading: ', fname)
-#         ds_arr = h5r['exchange/data'][...]
-#         print ('exchange/data', ':', ds_arr.dtype, ds_arr.shape)
-#         h5w.create_dataset('exchange/data', data=ds_arr[:])
+if __name__ == '__main__':
+    main()
@@ -1,57 +1,113 @@
 import os
 import sys
+import time
+import argparse
 import h5py
 import numpy as np
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import meta
 
-try:
-    top = os.path.join(sys.argv[1], '')
+DS_PROJ = 'exchange/data'
+
+
+def copy_meta(fname, h5r, h5w):
+    """Copy all non-exchange meta data of fname with a single meta.read_hdf pass."""
+    try:  # trying to copy meta
+        tree, meta_dict = meta.read_hdf(fname)
+        print('Reading meta data: ', fname)
+        for key, value in meta_dict.items():
+            # print(key, value)
+            if key.find('exchange') != 1:
+                dset = h5w.create_dataset(key, data=value[0], dtype=h5r[key].dtype, shape=(1,))
+                if value[1] is not None:
+                    s = value[1]
+                    utf8_type = h5py.string_dtype('utf-8', len(s)+1)
+                    dset.attrs['units'] =  np.array(s.encode("utf-8"), dtype=utf8_type)
+    except:
+        print('ERROR: Skip copying meta')
+        pass
+
+
+def flatten(fname, top, out_dir, memory):
+    """Write a copy of one file with exchange/data resolved from its links.
+
+    The data is copied in slabs along axis 0 (whole chunks when the source is
+    chunked) holding at most ``memory`` bytes.
+
+    Returns
+    -------
+    tuple
+        File name, bytes of data copied and elapsed seconds.
+    """
+    t0 = time.perf_counter()
+    with h5py.File(os.path.join(out_dir, fname), 'w') as h5w:
+        with h5py.File(os.path.join(top, fname), 'r') as h5r:
+            copy_meta(os.path.join(top, fname), h5r, h5w)
+
+            src = h5r[DS_PROJ]
+            shape = src.shape
+            frame = src.dtype.itemsize * int(np.prod(shape[1:]))
+            step = src.chunks[0] if src.chunks else 1
+            slab = max(step, memory // frame // step * step)
+            dst = h5w.create_dataset(DS_PROJ, shape=shape, dtype=src.dtype,
+                                     chunks=src.chunks or True,
+                                     compression=src.compression,
+                                     compression_opts=src.compression_opts,
+                                     shuffle=src.shuffle)
+            print('Saving', ':', src.dtype, shape, 'to: ', os.path.join(out_dir, fname))
+            buf = np.empty((min(slab, shape[0]),) + shape[1:], dtype=src.dtype)
+            for start in range(0, shape[0], slab):
+                stop = min(start + slab, shape[0])
+                out = buf[:stop - start]
+                src.read_direct(out, np.s_[start:stop])
+                dst.write_direct(out, dest_sel=np.s_[start:stop])
+    return fname, frame * shape[0], time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Copy linked HDF5 files into self-contained files in <folder>/no_links.')
+    parser.add_argument('folder', help='Folder with the linked HDF5 files')
+    parser.add_argument('--workers', type=int, default=min(8, os.cpu_count()),
+                        help='Files processed concurrently')
+    parser.add_argument('--memory', type=float, default=4.0,
+                        help='Total memory cap for data slabs in GB (default: 4)')
+    args = parser.parse_args()
+
+    top = os.path.join(args.folder, '')
     # Arguments passed
-    if os.path.exists(top):
-        print("\nPath: %s does exist" % top)
-        out_dir = os.path.join(top, 'no_links')
-        # make sure logs directory exists
-        if not os.path.exists(out_dir):
-            os.makedirs(out_dir)
-
-        h5_file_list = list(filter(lambda x: x.endswith(('.h5', '.hdf', 'hdf5')), os.listdir(top)))
-        print(top, h5_file_list)
-        # exit()
-        if (h5_file_list):
-            h5_file_list.sort()
-            # print("Found: %s" % h5_file_list) 
-            index=0
-            for fname in h5_file_list:
-                print("Found: %s" % fname)
-                with h5py.File(os.path.join(out_dir, fname), 'a') as h5w:
-                    with h5py.File(fname, 'r') as h5r:
-                        try:  # trying to copy meta
-                            tree, meta_dict = meta.read_hdf(fname)
-                            print('Reading meta data: ', fname)
-                            for key, value in meta_dict.items():
-                                # print(key, value)
-                                if key.find('exchange') != 1:
-                                    dset = h5w.create_dataset(key, data=value[0], dtype=h5r[key].dtype, shape=(1,))
-                                    if value[1] is not None:
-                                        s = value[1]
-                                        utf8_type = h5py.string_dtype('utf-8', len(s)+1)
-                                        dset.attrs['units'] =  np.array(s.encode("utf-8"), dtype=utf8_type)
-                        except:
-                            print('ERROR: Skip copying meta')
-                            pass
-
-                        print('Reading data: ', fname)
-                        ds_arr = h5r['exchange/data'][:,:,:]
-                        print ('Saving', ':', ds_arr.dtype, ds_arr.shape, 'to: ', os.path.join(out_dir, fname))
-                        h5w.create_dataset('exchange/data', data=ds_arr[:])
-        else:
-            print('ERROR: no hdf file found in %s' % top)
-    else:
+    if not os.path.exists(top):
         print("Path: %s does not exist" % top)
+        sys.exit(1)
+    print("\nPath: %s does exist" % top)
+    out_dir = os.path.join(top, 'no_links')
+    # make sure logs directory exists
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    h5_file_list = sorted(filter(lambda x: x.endswith(('.h5', '.hdf', 'hdf5')), os.listdir(top)))
+    print(top, h5_file_list)
+    if not h5_file_list:
+        print('ERROR: no hdf file found in %s' % top)
+        sys.exit(1)
 
-except IndexError:
-    print('ERROR: Enter a valid directory path')
+    workers = max(1, min(args.workers, len(h5_file_list)))
+    memory = int(args.memory * 1024**3) // workers
+    t0 = time.perf_counter()
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(flatten, fname, top, out_dir, memory)
+                   for fname in h5_file_list]
+        for future in as_completed(futures):
+            fname, nbytes, dt = future.result()
+            total += nbytes
+            print('Done: %s %.1f MB in %.1f s (%.1f MB/s)'
+                  % (fname, nbytes / 1024**2, dt, nbytes / 1024**2 / dt))
+    dt = time.perf_counter() - t0
+    print('All %d files: %.1f MB in %.1f s (%.1f MB/s aggregate)'
+          % (len(h5_file_list), total / 1024**2, dt, total / 1024**2 / dt))
 
 
+if __name__ == '__main__':
+    main()
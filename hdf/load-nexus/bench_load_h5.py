@@ -0,0 +1,86 @@
+"""
+Scaling benchmark for the parallel NeXus loader.
+
+Writes a synthetic NeXus file (darks, flats and projections with an image_key)
+and times load_h5.load_data with every process reading its own block. Run it
+with increasing numbers of ranks:
+
+    for n in 1 2 4 8; do mpiexec -n $n python bench_load_h5.py /tmp/bench.nx --csv scaling.csv; done
+
+The reported time is the slowest rank's; bandwidth is the whole volume over
+that time.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from mpi4py import MPI
+import h5py as h5
+
+import load_h5 as load_h5
+
+DATA_PATH = "/entry1/tomo_entry/data/data"
+ANGLE_PATH = "/entry1/tomo_entry/data/rotation_angle"
+KEY_PATH = "/entry1/tomo_entry/instrument/detector/image_key"
+
+
+def write_nexus(fname, nproj, ny, nx, nflat, ndark):
+    """Write a synthetic NeXus tomo file: darks, flats, projections, flats."""
+    keys = np.concatenate([np.full(ndark, 2), np.full(nflat, 1), np.zeros(nproj), np.full(nflat, 1)]).astype(np.uint8)
+    angles = np.concatenate([np.zeros(ndark + nflat), np.linspace(0, 180, nproj, endpoint=False), np.zeros(nflat)])
+    with h5.File(fname, "w") as f:
+        dset = f.create_dataset(DATA_PATH, shape=(len(keys), ny, nx), dtype=np.uint16, chunks=(1, ny, nx))
+        rng = np.random.default_rng(0)
+        frame = rng.integers(0, 4096, size=(ny, nx), dtype=np.uint16)
+        for i in range(len(keys)):
+            dset[i] = frame
+        f.create_dataset(ANGLE_PATH, data=angles)
+        f.create_dataset(KEY_PATH, data=keys)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="Synthetic NeXus file (written if missing).")
+    parser.add_argument("--shape", type=int, nargs=3, default=(1800, 1024, 1024), help="Projections, rows, columns.")
+    parser.add_argument("--flats", type=int, default=20, help="Flats before and after the projections.")
+    parser.add_argument("--darks", type=int, default=20, help="Darks before the projections.")
+    parser.add_argument("-d", "--dimension", type=int, choices=[1, 2, 3], default=1, help="Dimension to split along.")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="Number of repeats.")
+    parser.add_argument("-c", "--csv", default=None, help="Append results to this csv file.")
+    args = parser.parse_args()
+
+    comm = MPI.COMM_WORLD
+    if comm.rank == 0 and not os.path.exists(args.file):
+        print(f"Writing {args.file} {tuple(args.shape)}", flush=True)
+        write_nexus(args.file, *args.shape, args.flats, args.darks)
+    comm.Barrier()
+
+    data_indices = load_h5.get_data_indices(args.file, image_key_path=KEY_PATH, comm=comm)
+    preview = f"{data_indices[0]}: {data_indices[-1] + 1}, :, :"
+
+    times = []
+    for _ in range(args.repeat):
+        comm.Barrier()
+        t0 = time.perf_counter()
+        data = load_h5.load_data(args.file, args.dimension, DATA_PATH, preview=preview, comm=comm)
+        dt = comm.allreduce(time.perf_counter() - t0, op=MPI.MAX)
+        times.append(dt)
+    nbytes = comm.allreduce(data.nbytes, op=MPI.SUM)
+
+    if comm.rank == 0:
+        best = min(times)
+        mode = "collective (mpio)" if h5.get_config().mpi and comm.size > 1 else "independent"
+        print(f"ranks={comm.size} dim={args.dimension} {mode}: {best:.3f} s, "
+              f"{nbytes / 1024**2 / best:.1f} MB/s")
+        if args.csv:
+            new = not os.path.exists(args.csv)
+            with open(args.csv, "a") as f:
+                if new:
+                    f.write("ranks,dim,mode,seconds,MBps\n")
+                f.write(f"{comm.size},{args.dimension},{mode},{best:.4f},{nbytes / 1024**2 / best:.1f}\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,9 +8,52 @@ Author: Jacob Williamson
 """
 
 import math
+import numpy as np
 import h5py as h5
 
-def load_data(file, dim, path, preview=":,:,:", pad=(0, 0)):
+def _rank_size(comm):
+    """Rank and number of processes of an MPI communicator (0, 1 without one)."""
+    if comm is None:
+        return 0, 1
+    return comm.rank, comm.size
+
+def _open(file, comm):
+    """Open a file for reading, with the mpio driver when h5py was built with MPI.
+
+    :param file: Path to file.
+    :param comm: MPI communicator object.
+    :return: The h5py file and whether reads should be collective.
+    """
+    if comm is not None and comm.size > 1 and h5.get_config().mpi:
+        return h5.File(file, "r", driver="mpio", comm=comm), True
+    return h5.File(file, "r"), False
+
+def _read(dataset, selection, collective):
+    """Read a hyperslab, collectively if the file was opened with the mpio driver."""
+    if collective:
+        with dataset.collective:
+            return dataset[selection]
+    return dataset[selection]
+
+def _preview_range(slice_list, dim, dim_length):
+    """Turn the preview of one dimension into (length, offset, step). Data will be read from data[offset] to
+    data[offset + length * step].
+    """
+    if slice_list[dim] == slice(None):
+        return dim_length, 0, 1
+    start = 0 if slice_list[dim].start is None else slice_list[dim].start
+    stop = dim_length if slice_list[dim].stop is None else slice_list[dim].stop
+    step = 1 if slice_list[dim].step is None else slice_list[dim].step
+    length = math.ceil((stop - start) / step)  # Total length of the section of the dataset being read.
+    return length, start, step
+
+def _block_bounds(length, offset, step, rank, nproc):
+    """Bounds [i0, i1) in dataset indices of the block of the previewed range that process rank loads."""
+    i0 = offset + round((length / nproc) * rank) * step
+    i1 = offset + round((length / nproc) * (rank + 1)) * step
+    return i0, i1
+
+def load_data(file, dim, path, preview=":,:,:", pad=(0, 0), comm=None, halo=False):
     """Load data in parallel, slicing it through a certain dimension. Returns a different block of data for each MPI
     process.
     :param file: Path to file containing the dataset.
@@ -19,123 +62,129 @@ def load_data(file, dim, path, preview=":,:,:", pad=(0, 0)):
     :param preview: Crop the data with a preview:
     :param pad: Pad the data by this number of slices.
     :param comm: MPI communicator object.
+    :param halo: Fill the padding between neighbouring processes by halo exchange instead of re-reading it from disk.
     """
     if dim == 1:
-        data = read_through_dim1(file, path, preview=preview, pad=pad)
+        data = read_through_dim1(file, path, preview=preview, pad=pad, comm=comm, halo=halo)
     elif dim == 2:
-        data = read_through_dim2(file, path, preview=preview, pad=pad)
+        data = read_through_dim2(file, path, preview=preview, pad=pad, comm=comm, halo=halo)
     elif dim == 3:
-        data = read_through_dim3(file, path, preview=preview, pad=pad)
+        data = read_through_dim3(file, path, preview=preview, pad=pad, comm=comm, halo=halo)
     else:
         raise Exception("Invalid dimension. Choose 1, 2 or 3.")
     return data
 
-def read_through_dim3(file, path, preview=":,:,:", pad=(0, 0)):
-    """Read a dataset in parallel, with each MPI process loading a block, the data being split along dimension 3.
+def exchange_halo(core, axis, pad, comm):
+    """Pad a block with slices taken from the blocks of the neighbouring MPI processes.
+    Every process sends the first slices of its block to the previous rank and the last slices to the next rank with
+    MPI sendrecv, so no slice is read from disk twice.
+    :param core: Block of data this process loaded, without padding.
+    :param axis: Dimension the data is split along (0-based).
+    :param pad: Number of slices (before, after) this process needs from its neighbours.
+    :param comm: MPI communicator object.
+    :return: The padded block.
+    """
+    from mpi4py import MPI
+    rank, nproc = _rank_size(comm)
+    pads = comm.allgather((int(pad[0]), int(pad[1])))
+    n = core.shape[axis]
+
+    def take(i0, i1):
+        return np.ascontiguousarray(np.take(core, range(i0, i1), axis=axis))
+
+    def empty(count):
+        shape = list(core.shape)
+        shape[axis] = count
+        return np.empty(shape, dtype=core.dtype)
+
+    # What the neighbours need from this block...
+    n_prev = pads[rank - 1][1] if rank > 0 else 0
+    n_next = pads[rank + 1][0] if rank < nproc - 1 else 0
+    if n_prev > n or n_next > n:
+        raise ValueError(f"Rank {rank}: block of {n} slices is smaller than the padding its neighbours need.")
+    prev = rank - 1 if rank > 0 else MPI.PROC_NULL
+    nxt = rank + 1 if rank < nproc - 1 else MPI.PROC_NULL
+
+    before = empty(pad[0])
+    after = empty(pad[1])
+    # Tails travel up the ranks, heads travel down...
+    comm.Sendrecv(take(n - n_next, n), dest=nxt, recvbuf=before, source=prev)
+    comm.Sendrecv(take(0, n_prev), dest=prev, recvbuf=after, source=nxt)
+    return np.concatenate((before, core, after), axis=axis)
+
+def read_through_dim(file, path, axis, preview=":,:,:", pad=(0, 0), comm=None, halo=False):
+    """Read a dataset in parallel, with each MPI process loading a block, the data being split along axis (0-based).
+    With h5py built against parallel HDF5 the file is opened with the mpio driver and every process reads its block in
+    one collective hyperslab read; otherwise each process reads its block independently.
     :param file: Path to file containing the dataset.
     :param path: Path to dataset within the file.
+    :param axis: Dimension the data is split along (0, 1 or 2).
     :param preview: Crop the data with a preview.
     :param pad: Pad the data by this number of slices.
     :param comm: MPI communicator object.
+    :param halo: Only read the block itself and get the padding shared with neighbouring processes by halo exchange
+        (see exchange_halo). The padding at the two outer ends is still read from disk.
     """
-    rank = 0
-    nproc = 1
+    rank, nproc = _rank_size(comm)
+    halo = halo and nproc > 1
+    if halo:
+        inner = (0 if rank == 0 else pad[0], 0 if rank == nproc - 1 else pad[1])
+        pad = (pad[0] - inner[0], pad[1] - inner[1])
     slice_list = get_slice_list_from_preview(preview)
-    with h5.File(file, "r") as in_file:
+    in_file, collective = _open(file, comm)
+    with in_file:
         dataset = in_file[path]
-        # Turning the preview into a length and offset. Data will be read from data[offset] to data[offset + length].
-        if slice_list[2] == slice(None):
-            length = dataset.shape[2]
-            offset = 0
-            step = 1
-        else:
-            start = 0 if slice_list[2].start is None else slice_list[1].start
-            stop = dataset.shape[2] if slice_list[2].stop is None else slice_list[2].stop
-            step = 1 if slice_list[2].step is None else slice_list[2].step
-            length = (stop - start) // step  # Total length of the section of the dataset being read.
-            offset = start  # Offset where the dataset will start being read.
+        length, offset, step = _preview_range(slice_list, axis, dataset.shape[axis])
         # Bounds of the data this process will load. Length is split between number of processes.
-        i0 = round((length / nproc) * rank) + offset - pad[0]
-        i1 = round((length / nproc) * (rank + 1)) + offset + pad[1]
+        i0, i1 = _block_bounds(length, offset, step, rank, nproc)
+        i0 -= pad[0] * step
+        i1 += pad[1] * step
         # Checking that i0 and i1 are still within the bounds of the dataset after padding.
         if i0 < 0:
             i0 = 0
-        if i1 > dataset.shape[2]:
-            i1 = dataset.shape[2]
-        data = dataset[:, :, i0:i1:step]
-        return data
+        if i1 > dataset.shape[axis]:
+            i1 = dataset.shape[axis]
+        selection = list(slice_list)
+        selection[axis] = slice(i0, i1, step)
+        data = _read(dataset, tuple(selection), collective)
+    if halo:
+        data = exchange_halo(data, axis, inner, comm)
+    return data
 
-def read_through_dim2(file, path, preview=":,:,:", pad=(0, 0)):
+def read_through_dim3(file, path, preview=":,:,:", pad=(0, 0), comm=None, halo=False):
+    """Read a dataset in parallel, with each MPI process loading a block, the data being split along dimension 3.
+    :param file: Path to file containing the dataset.
+    :param path: Path to dataset within the file.
+    :param preview: Crop the data with a preview.
+    :param pad: Pad the data by this number of slices.
+    :param comm: MPI communicator object.
+    :param halo: Fill the padding between processes by halo exchange.
+    """
+    return read_through_dim(file, path, 2, preview=preview, pad=pad, comm=comm, halo=halo)
+
+def read_through_dim2(file, path, preview=":,:,:", pad=(0, 0), comm=None, halo=False):
     """Read a dataset in parallel, with each MPI process loading a block, the data being split along dimension 2.
     :param file: Path to file containing the dataset.
     :param path: Path to dataset within the file.
     :param preview: Crop the data with a preview.
     :param pad: Pad the data by this number of slices.
     :param comm: MPI communicator object.
+    :param halo: Fill the padding between processes by halo exchange.
     """
-    rank = 0
-    nproc = 1
-    slice_list = get_slice_list_from_preview(preview)
-    with h5.File(file, "r") as in_file:
-        dataset = in_file[path]
-        # Turning the preview into a length and offset. Data will be read from data[offset] to data[offset + length].
-        if slice_list[1] == slice(None):
-            length = dataset.shape[1]
-            offset = 0
-            step = 1
-        else:
-            start = 0 if slice_list[1].start is None else slice_list[1].start
-            stop = dataset.shape[1] if slice_list[1].stop is None else slice_list[1].stop
-            step = 1 if slice_list[1].step is None else slice_list[1].step
-            length = (stop - start)//step  # Total length of the section of the dataset being read.
-            offset = start  # Offset where the dataset will start being read.
-        # Bounds of the data this process will load. Length is split between number of processes.
-        i0 = round((length / nproc) * rank) + offset - pad[0]
-        i1 = round((length / nproc) * (rank + 1)) + offset + pad[1]
-        # Checking that i0 and i1 are still within the bounds of the dataset after padding.
-        if i0 < 0:
-            i0 = 0
-        if i1 > dataset.shape[1]:
-            i1 = dataset.shape[1]
-        data = dataset[slice_list[0], i0:i1:step, :]
-        return data
+    return read_through_dim(file, path, 1, preview=preview, pad=pad, comm=comm, halo=halo)
 
-def read_through_dim1(file, path, preview=":,:,:", pad=(0, 0)):
+def read_through_dim1(file, path, preview=":,:,:", pad=(0, 0), comm=None, halo=False):
     """Read a dataset in parallel, with each MPI process loading a block, the data being split along dimension 1.
     :param file: Path to file containing the dataset.
     :param path: Path to dataset within the file.
     :param preview: Crop the data with a preview.
     :param pad: Pad the data by this number of slices. (needs looking at)
     :param comm: MPI communicator object.
+    :param halo: Fill the padding between processes by halo exchange.
     """
-    rank = 0
-    nproc = 1
-    slice_list = get_slice_list_from_preview(preview)
-    with h5.File(file, "r") as in_file:
-        dataset = in_file[path]
-        # Turning the preview into a length and offset. Data will be read from data[offset] to data[offset + length].
-        if slice_list[0] == slice(None):
-            length = dataset.shape[0]
-            offset = 0
-            step = 1
-        else:
-            start = 0 if slice_list[0].start is None else slice_list[0].start
-            stop = dataset.shape[0] if slice_list[0].stop is None else slice_list[0].stop
-            step = 1 if slice_list[0].step is None else slice_list[0].step
-            length = (stop - start)//step  # Total length of the section of the dataset being read.
-            offset = start  # Offset where the dataset will start being read.
-        # Bounds of the data this process will load. Length is split between number of processes.
-        i0 = round((length / nproc) * rank) + offset - pad[0]
-        i1 = round((length / nproc) * (rank + 1)) + offset + pad[1]
-        # Checking that i0 and i1 are still within the bounds of the dataset after padding.
-        if i0 < 0:
-            i0 = 0
-        if i1 > dataset.shape[0]:
-            i1 = dataset.shape[0]
-        data = dataset[i0:i1:step, slice_list[1], slice_list[2]]
-        return data
+    return read_through_dim(file, path, 0, preview=preview, pad=pad, comm=comm, halo=halo)
 
-def get_pad_values(pad, dim, dim_length, data_indices=None, preview=":,:,:"):
+def get_pad_values(pad, dim, dim_length, data_indices=None, preview=":,:,:", comm=None):
     """Get number of slices the block of data is padded either side. Usually this is (pad, pad) but on edge blocks the
     padding may be less (as there is no data beside the block to pad it with).
     :param pad: Number of slices to pad block with.
@@ -147,8 +196,7 @@ def get_pad_values(pad, dim, dim_length, data_indices=None, preview=":,:,:"):
     :param preview: Preview the data will be cropped by. Should be the same preview given to the get_data() method.
     :param comm: MPI communicator object.
     """
-    rank = 0
-    nproc = 1
+    rank, nproc = _rank_size(comm)
     slice_list = get_slice_list_from_preview(preview)
     if data_indices is not None and dim == 1:
         bound0 = min(data_indices)
@@ -156,43 +204,56 @@ def get_pad_values(pad, dim, dim_length, data_indices=None, preview=":,:,:"):
     else:
         bound0 = 0
         bound1 = dim_length
-    if slice_list[0] == slice(None):
-        length = dim_length
-        offset = 0
-        step = 1
-    else:
-        start = 0 if slice_list[0].start is None else slice_list[0].start
-        stop = dim_length if slice_list[0].stop is None else slice_list[0].stop
-        step = 1 if slice_list[0].step is None else slice_list[0].step
-        length = (stop - start) // step  # Total length of the section of the dataset being read.
-        offset = start  # Offset where the dataset will start being read.
+    length, offset, step = _preview_range(slice_list, dim - 1, dim_length)
     # i0, i1 = range of the data this process will load..
-    i0 = round((length / nproc) * rank) + offset - pad
-    i1 = round((length / nproc) * (rank + 1)) + offset + pad
+    i0, i1 = _block_bounds(length, offset, step, rank, nproc)
+    i0 -= pad * step
+    i1 += pad * step
     # Checking that after padding, the range is still within the bounds it should be.
     if i0 < bound0:
-        pad0 = pad - (bound0 - i0)
+        pad0 = max(0, pad - math.ceil((bound0 - i0) / step))
     else:
         pad0 = pad
     if i1 > bound1:
-        pad1 = pad - (i1 - bound1)
+        pad1 = max(0, pad - math.ceil((i1 - bound1) / step))
     else:
         pad1 = pad
     return pad0, pad1
 
-def get_angles(file, path="/entry1/tomo_entry/data/rotation_angle"):
+def _read_on_root(file, path, comm):
+    """Read a small dataset on rank 0 only and broadcast it to the other processes."""
+    rank, nproc = _rank_size(comm)
+    value = None
+    if rank == 0:
+        with h5.File(file, "r") as in_file:
+            value = in_file[path][...]
+    if nproc > 1:
+        value = comm.bcast(value, root=0)
+    return value
+
+def get_angles(file, path="/entry1/tomo_entry/data/rotation_angle", comm=None):
     """Get angles.
     :param file: Path to file containing the data and angles.
     :param path: Path to the angles within the file.
     :param comm: MPI communicator object.
     """
-    with h5.File(file, "r") as file:
-        angles = file[path][...]
-    return angles
+    return _read_on_root(file, path, comm)
+
+def get_key_runs(image_key, key):
+    """Find the contiguous runs of one value in the image key.
+    :param image_key: Image key as a NumPy array (0 = projection, 1 = flat, 2 = dark).
+    :param key: Image key value to look for.
+    :return: List of (start, stop) index pairs, one per run.
+    """
+    mask = np.concatenate(([False], np.asarray(image_key).astype(int) == key, [False]))
+    edges = np.flatnonzero(np.diff(mask.astype(np.int8)))
+    return list(zip(edges[0::2].tolist(), edges[1::2].tolist()))
 
 def get_darks_flats(file, data_path="/entry1/tomo_entry/data/data",
-                    image_key_path="/entry1/instrument/image_key/image_key", dim=1, pad=0, preview=":,:,:"):
-    """Get darks and flats.
+                    image_key_path="/entry1/instrument/image_key/image_key", dim=1, pad=0, preview=":,:,:",
+                    comm=None):
+    """Get darks and flats. Every contiguous run of darks or flats is read with a single hyperslab selection that
+    already applies the preview.
     :param file: Path to file containing the dataset.
     :param data_path: Path to the dataset within the file.
     :param image_key_path: Path to the image_key within the file.
@@ -200,52 +261,37 @@ def get_darks_flats(file, data_path="/entry1/tomo_entry/data/data",
     :param pad: How many slices data is being padded. Only effects darks and flats if dim = 2. (not implemented yet)
     :param preview: Preview data is being cropped by.
     :param comm: MPI communicator object.
+    :return: Darks and flats as (frames, rows, columns) arrays.
     """
     slice_list = get_slice_list_from_preview(preview)
+    image_key = _read_on_root(file, image_key_path, comm)
     with h5.File(file, "r") as file:
-        darks_indices = []
-        flats_indices = []
-        for i, key in enumerate(file[image_key_path]):
-            if int(key) == 1:
-                flats_indices.append(i)
-            elif int(key) == 2:
-                darks_indices.append(i)
         dataset = file[data_path]
-
+        rows = slice_list[1]
         if dim == 2:
-            rank = comm.rank
-            nproc = comm.size
-            if slice_list[1] == slice(None):
-                length = dataset.shape[1]
-                offset = 0
-                step = 1
-            else:
-                start = 0 if slice_list[1].start is None else slice_list[1].start
-                stop = dataset.shape[1] if slice_list[1].stop is None else slice_list[1].stop
-                step = 1 if slice_list[1].step is None else slice_list[1].step
-                length = (stop - start) // step
-                offset = start
-            i0 = round((length / nproc) * rank) + offset
-            i1 = round((length / nproc) * (rank + 1)) + offset
-            darks = [dataset[x][i0:i1:step][slice_list[2]] for x in darks_indices]
-            flats = [dataset[x][i0:i1:step][slice_list[2]] for x in flats_indices]
-        else:
-            darks = [file[data_path][x][slice_list[1]][slice_list[2]] for x in darks_indices]
-            flats = [file[data_path][x][slice_list[1]][slice_list[2]] for x in flats_indices]
+            rank, nproc = _rank_size(comm)
+            length, offset, step = _preview_range(slice_list, 1, dataset.shape[1])
+            i0, i1 = _block_bounds(length, offset, step, rank, nproc)
+            rows = slice(i0, i1, step)
+
+        def read_runs(key):
+            runs = [dataset[start:stop, rows, slice_list[2]] for start, stop in get_key_runs(image_key, key)]
+            if not runs:
+                return np.empty((0,) + dataset[0:0, rows, slice_list[2]].shape[1:], dtype=dataset.dtype)
+            return np.concatenate(runs) if len(runs) > 1 else runs[0]
+
+        darks = read_runs(2)
+        flats = read_runs(1)
         return darks, flats
 
-def get_data_indices(file, image_key_path="/entry1/instrument/image_key/image_key"):
+def get_data_indices(file, image_key_path="/entry1/instrument/image_key/image_key", comm=None):
     """Get the indices of where the data is in a dataset.
     :param file: Path to the file containing the dataset and image key.
     :param image_key_path: Path to the image key within the file.
     :param comm: MPI communicator object.
     """
-    with h5.File(file, "r") as file:
-        data_indices = []
-        for i, key in enumerate(file[image_key_path]):
-            if int(key) == 0:
-                data_indices.append(i)
-    return data_indices
+    image_key = _read_on_root(file, image_key_path, comm)
+    return np.flatnonzero(np.asarray(image_key).astype(int) == 0)
 
 def get_slice_list_from_preview(preview):
     """Generate slice list to crop data from a preview.
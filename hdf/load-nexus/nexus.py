@@ -30,18 +30,20 @@ def __option_parser():
     parser.add_argument("-rings", "--stripe", default=None, help="The stripes removal method to apply.")
     parser.add_argument("-nc", "--ncore", type=int, default=1, help="The number of cores.")
     parser.add_argument("-pa", "--pad", type=int, default=0, help="The number of slices to pad each chunk with.")
+    parser.add_argument("--halo", action="store_true",
+                        help="Get the padding from neighbouring processes (halo exchange) instead of re-reading it.")
     args = parser.parse_args()
     return args
 
-def read_nexus(args):
+def read_nexus(args, comm=MPI.COMM_WORLD):
     with h5.File(args.in_file, "r") as in_file:
         dataset = in_file[args.path]
         shape = dataset.shape
     print(f"Dataset shape is {shape}")
 
-    angles_degrees = load_h5.get_angles(args.in_file, path=args.path_angle)
+    angles_degrees = load_h5.get_angles(args.in_file, path=args.path_angle, comm=comm)
     data_indices = load_h5.get_data_indices(args.in_file,
-                                            image_key_path=args.image_key_path)
+                                            image_key_path=args.image_key_path, comm=comm)
     angles_radians = np.deg2rad(angles_degrees[data_indices])
 
     # preview to prepare to crop the data from the middle when --crop is used to avoid loading the whole volume.
@@ -59,16 +61,18 @@ def read_nexus(args):
     print(f"Cropped data shape is {cropped_shape}")
 
     dim = args.dimension
-    pad_values = load_h5.get_pad_values(args.pad, dim, shape[dim - 1], data_indices=data_indices, preview=preview)
-    print(f"pad values are {pad_values}.")
-    data = load_h5.load_data(args.in_file, dim, args.path, preview=preview, pad=pad_values)
+    pad_values = load_h5.get_pad_values(args.pad, dim, shape[dim - 1], data_indices=data_indices, preview=preview,
+                                        comm=comm)
+    print(f"Rank {comm.rank}: pad values are {pad_values}.")
+    data = load_h5.load_data(args.in_file, dim, args.path, preview=preview, pad=pad_values, comm=comm,
+                             halo=args.halo)
 
     darks, flats = load_h5.get_darks_flats(args.in_file, args.path,
                                            image_key_path=args.image_key_path,
-                                           preview=preview, dim=args.dimension)
+                                           preview=preview, dim=args.dimension, comm=comm)
 
     (angles_total, detector_y, detector_x) = np.shape(data)
-    print(f"data shape is {(angles_total, detector_y, detector_x)}")
+    print(f"Rank {comm.rank}: data shape is {(angles_total, detector_y, detector_x)}")
 
     return data, darks, flats, angles_radians
 
@@ -0,0 +1,172 @@
+"""
+Vectorized interlaced angle sequences shared by the scan tools.
+
+All schemes are built with NumPy array operations only; bit and digit
+reversal work on whole index arrays, so 10^7 angles take a fraction of a
+second. Outputs are identical (bit for bit) to the loop implementations
+they replace:
+
+- ``equally_spaced_angles``, ``golden_angles``, ``corput_angles`` and
+  ``timbir_angles`` return ``(angles_per_turn, theta_interlaced,
+  theta_monotonic)`` like the ``compute_*_multiturn_angles`` functions of
+  interlaced_delta_angle.py;
+- ``prime_vdc_angles`` is the base-prime Van der Corput sequence of
+  ``tomo/interlaced.py:sequence``, ``tomo/angle.py:interlaced_angle_sequence``
+  and ``genang`` in the streaming scripts.
+
+Run ``python bench_angle_sequences.py`` to check and time them against the
+original loops.
+"""
+
+import numpy as np
+
+_REV8 = np.array([int(f'{i:08b}'[::-1], 2) for i in range(256)], dtype=np.int64)
+
+
+def bit_reverse(values, bits):
+    """Reverse the lowest ``bits`` bits of every value (bits <= 63)."""
+    values = np.asarray(values, dtype=np.int64)
+    nbytes = max(1, (bits + 7) // 8)
+    out = np.zeros_like(values)
+    for b in range(nbytes):
+        out |= _REV8[(values >> (8 * b)) & 255] << (8 * (nbytes - 1 - b))
+    return out >> (8 * nbytes - bits)
+
+
+def radical_inverse(values, base):
+    """Van der Corput radical inverse of non-negative integers in ``base``.
+
+    Digits are accumulated lowest first with the same float operations as
+    the scalar loop, so results are identical to it.
+    """
+    b = np.asarray(values, dtype=np.int64).copy()
+    r = np.zeros(b.shape, dtype=np.float64)
+    q = 1 / base
+    while b.any():
+        r += (b % base) * q
+        q /= base
+        b //= base
+    return r
+
+
+def is_power_of_two(K):
+    return K >= 1 and (K & (K - 1)) == 0
+
+
+def ensure_power_of_two(K):
+    if not is_power_of_two(K):
+        raise ValueError(f"K={K} must be a power of two.")
+
+
+def _result(turns):
+    angles_per_turn = [t.copy() for t in turns]
+    theta_interlaced = turns.ravel()
+    return angles_per_turn, theta_interlaced, np.sort(theta_interlaced)
+
+
+def prime_vdc_angles(nproj_total, nproj_per_rot, prime=3, continuous_angle=True,
+                     start=0.0, span=360.0):
+    """Interlaced angles from the base-prime Van der Corput sequence (degrees).
+
+    Rotation i starts at the radical inverse of i times span / nproj_per_rot
+    and advances by span / nproj_per_rot; with continuous_angle the angles
+    of rotation i are shifted by i * 360.
+    """
+    nrot = -(-nproj_total // nproj_per_rot)
+    r = radical_inverse(np.arange(nrot), prime)
+    r *= (span / nproj_per_rot)
+    steps = np.arange(nproj_per_rot) * span / nproj_per_rot
+    seq = (r[:, None] + steps[None, :]).ravel()[:nproj_total]
+    if start:
+        seq = start + seq
+    if continuous_angle:
+        seq += (np.arange(nproj_total) // nproj_per_rot) * 360.0
+    return seq
+
+
+def equally_spaced_angles(num_angles=180, K_interlace=3, rotation_start=0.0,
+                          rotation_stop=180.0, delta_theta=None, degrees=True):
+    N = int(num_angles)
+    K = int(K_interlace)
+    if delta_theta is None:
+        delta_theta = (rotation_stop - rotation_start) / N
+    rotation_step = float(delta_theta)
+    n = np.arange(N, dtype=float)
+    k = np.arange(K)
+    turns = (rotation_start + (n[None, :] - (k / K)[:, None]) * rotation_step
+             + 360.0 * k[:, None])
+    return _result(turns)
+
+
+def golden_angles(num_angles=180, K_interlace=3, rotation_start=0.0, degrees=True):
+    N = int(num_angles)
+    K = int(K_interlace)
+    start_deg = float(rotation_start)
+    if N <= 0 or K <= 0:
+        raise ValueError("N and K must be > 0")
+    golden_angle = 360.0 * (3.0 - np.sqrt(5.0)) / 2.0
+    phi_inv = (np.sqrt(5.0) - 1.0) / 2.0
+
+    base = (start_deg + np.arange(N) * golden_angle) % 360.0
+    base.sort()
+    k = np.arange(K)
+    offsets = (k / (N + 1.0)) * 360.0 * phi_inv
+    blocks = np.sort((base[None, :] + offsets[:, None]) % 360.0, axis=1)
+    blocks[0] = base
+    turns = (start_deg + 360.0 * k)[:, None] + blocks
+    return _result(turns)
+
+
+def corput_angles(num_angles=180, K_interlace=4, rotation_start=0.0,
+                  rotation_stop=None, delta_theta=None, degrees=True):
+    N = int(num_angles)
+    K = int(K_interlace)
+    start = float(rotation_start)
+    if N <= 0 or K <= 0:
+        raise ValueError("N and K must be > 0")
+    if rotation_stop is None:
+        rotation_stop = start + 360.0
+    if delta_theta is not None:
+        delta_theta = float(delta_theta)
+    else:
+        delta_theta = (float(rotation_stop) - start) / N
+
+    base = start + np.arange(N, dtype=np.float64) * delta_theta
+
+    bitsK = int(np.ceil(np.log2(K))) if K > 1 else 1
+    p_corput = bit_reverse(np.arange(1 << bitsK), bitsK)
+    p_corput = p_corput[p_corput < K]
+    offsets = (p_corput.astype(np.float64) / float(K)) * delta_theta
+
+    bitsN = int(np.ceil(np.log2(N))) if N > 1 else 1
+    indices = bit_reverse(np.arange(1 << bitsN), bitsN)
+    indices = indices[indices < N]
+
+    loop_angles = base[indices][None, :] + offsets[:, None]
+    loops = np.sort(np.mod(loop_angles - start, 360.0) + start, axis=1)
+    turns = loops + (360.0 * np.arange(K))[:, None]
+    angles_per_turn = [t.copy() for t in turns]
+    theta_interlaced = np.sort(turns.ravel())
+    return angles_per_turn, theta_interlaced, theta_interlaced.copy()
+
+
+def timbir_angles(num_angles=180, K_interlace=4, rotation_start=0.0, degrees=True):
+    N = int(num_angles)
+    K = int(K_interlace)
+    start_deg = float(rotation_start)
+    ensure_power_of_two(K)
+    bits = int(np.log2(K))
+
+    k = np.arange(K)
+    subloop = bit_reverse(k, bits) if bits else np.zeros(K, dtype=np.int64)
+    idx = np.arange(N)[None, :] * K + subloop[:, None]
+    turns = (start_deg + 360.0 * k)[:, None] + idx * 360.0 / (N * K)
+    return _result(turns)
+
+
+SCHEMES = {
+    "Equally Spaced": equally_spaced_angles,
+    "Golden Angle": golden_angles,
+    "Van der Corput": corput_angles,
+    "TIMBIR": timbir_angles,
+}
@@ -0,0 +1,167 @@
+"""
+Check and time the vectorized angle sequences of angle_sequences.py against
+the per-element loop implementations they replaced (kept here verbatim as
+references).
+
+Usage:
+    python bench_angle_sequences.py                # N=1000 K=8 check, 10^7 angle timing
+    python bench_angle_sequences.py --N 4096 --K 16 --total 10000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import angle_sequences as seqs
+
+
+def _bit_reverse(val, bits):
+    result = 0
+    for _ in range(bits):
+        result = (result << 1) | (val & 1)
+        val >>= 1
+    return result
+
+
+def ref_prime_vdc(nproj_total, nproj_per_rot, prime, continuous_angle=True):
+    seq = []
+    i = 0
+    while len(seq) < nproj_total:
+        b = i
+        i += 1
+        r = 0
+        q = 1 / prime
+        while (b != 0):
+            a = np.mod(b, prime)
+            r += (a * q)
+            q /= prime
+            b = np.floor(b / prime)
+        r *= (360.0 / nproj_per_rot)
+        k = 0
+        while (np.logical_and(len(seq) < nproj_total, k < nproj_per_rot)):
+            seq.append(r + k * 360.0 / nproj_per_rot)
+            k += 1
+    if continuous_angle:
+        j = 0
+        for x in range(len(seq)):
+            if (x % nproj_per_rot == 0):
+                for y in range(nproj_per_rot):
+                    if (x+y) < len(seq):
+                        seq[x+y] += j*360.0
+                j += 1
+    return np.array(seq)
+
+
+def ref_equally_spaced(N, K, rotation_start=0.0, rotation_stop=180.0):
+    rotation_step = float((rotation_stop - rotation_start) / N)
+    n = np.arange(N, dtype=float)
+    angles_per_turn = [rotation_start + (n - k / K) * rotation_step + 360.0 * k for k in range(K)]
+    theta_interlaced = np.concatenate(angles_per_turn).astype(float)
+    return angles_per_turn, theta_interlaced, np.sort(theta_interlaced)
+
+
+def ref_golden(N, K, rotation_start=0.0):
+    start_deg = float(rotation_start)
+    golden_angle = 360.0 * (3.0 - np.sqrt(5.0)) / 2.0
+    phi_inv = (np.sqrt(5.0) - 1.0) / 2.0
+    base = np.array([(start_deg + i * golden_angle) % 360.0 for i in range(N)], dtype=np.float64)
+    base.sort()
+    angles_per_turn, theta_list = [], []
+    for k in range(K):
+        if k == 0:
+            block = base.copy()
+        else:
+            offset = (k / (N + 1.0)) * 360.0 * phi_inv
+            block = np.sort((base + offset) % 360.0)
+        unwrapped_block = start_deg + 360.0 * k + block
+        angles_per_turn.append(unwrapped_block)
+        theta_list.extend(unwrapped_block.tolist())
+    theta_interlaced = np.asarray(theta_list, dtype=np.float64)
+    return angles_per_turn, theta_interlaced, np.sort(theta_interlaced)
+
+
+def ref_corput(N, K, rotation_start=0.0):
+    start = float(rotation_start)
+    delta_theta = 360.0 / N
+    base = start + np.arange(N, dtype=np.float64) * delta_theta
+    bitsK = int(np.ceil(np.log2(K))) if K > 1 else 1
+    p_corput = np.array([_bit_reverse(i, bitsK) for i in range(1 << bitsK)], dtype=np.int64)
+    p_corput = p_corput[p_corput < K]
+    offsets = (p_corput.astype(np.float64) / float(K)) * delta_theta
+    bitsN = int(np.ceil(np.log2(N))) if N > 1 else 1
+    indices = np.array([_bit_reverse(i, bitsN) for i in range(1 << bitsN)], dtype=np.int64)
+    indices = indices[indices < N]
+    angles_per_turn = []
+    for k in range(K):
+        loop_angles_mod = np.sort(np.mod(base[indices] + offsets[k] - start, 360.0) + start)
+        angles_per_turn.append(loop_angles_mod + 360.0 * k)
+    theta_interlaced = np.sort(np.concatenate(angles_per_turn).astype(np.float64))
+    return angles_per_turn, theta_interlaced, theta_interlaced.copy()
+
+
+def ref_timbir(N, K, rotation_start=0.0):
+    start_deg = float(rotation_start)
+    bits = int(np.log2(K))
+    angles_per_turn = []
+    for loop_turn in range(K):
+        base_turn = 360.0 * loop_turn
+        subloop = _bit_reverse(loop_turn, bits)
+        turn_angles = [start_deg + base_turn + (i * K + subloop) * 360.0 / (N * K) for i in range(N)]
+        angles_per_turn.append(np.asarray(turn_angles, dtype=np.float64))
+    theta_interlaced = np.concatenate(angles_per_turn).astype(np.float64)
+    return angles_per_turn, theta_interlaced, np.sort(theta_interlaced)
+
+
+def same(a, b):
+    if isinstance(a, tuple):
+        return all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, list):
+        return len(a) == len(b) and all(np.array_equal(x, y) for x, y in zip(a, b))
+    return np.array_equal(a, b)
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    out = func(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--N', type=int, default=1000, help='Angles per turn')
+    parser.add_argument('--K', type=int, default=8, help='Turns (power of two for TIMBIR)')
+    parser.add_argument('--total', type=int, default=10**7, help='Angles for the large timing')
+    args = parser.parse_args()
+    N, K = args.N, args.K
+
+    cases = [
+        ('prime VdC', ref_prime_vdc, (N * K, N, 3), seqs.prime_vdc_angles, (N * K, N, 3)),
+        ('equally spaced', ref_equally_spaced, (N, K), seqs.equally_spaced_angles, (N, K)),
+        ('golden angle', ref_golden, (N, K), seqs.golden_angles, (N, K)),
+        ('Van der Corput', ref_corput, (N, K), seqs.corput_angles, (N, K)),
+        ('TIMBIR', ref_timbir, (N, K), seqs.timbir_angles, (N, K)),
+    ]
+    print(f'N={N} K={K}: loop vs vectorized')
+    for name, ref, ref_args, new, new_args in cases:
+        a, t_ref = timed(ref, *ref_args)
+        b, t_new = timed(new, *new_args)
+        print(f'  {name:15s} {t_ref * 1e3:9.1f} ms {t_new * 1e3:8.2f} ms  '
+              f'x{t_ref / max(t_new, 1e-9):7.0f}  identical: {same(a, b)}')
+
+    total = args.total
+    n = 2 ** int(np.log2(np.sqrt(total)))
+    print(f'{total} angles, vectorized only:')
+    for name, func, fargs in [
+            ('prime VdC', seqs.prime_vdc_angles, (total, 1000, 3)),
+            ('equally spaced', seqs.equally_spaced_angles, (total // n, n)),
+            ('golden angle', seqs.golden_angles, (total // n, n)),
+            ('Van der Corput', seqs.corput_angles, (total // n, n)),
+            ('TIMBIR', seqs.timbir_angles, (total // n, n))]:
+        _, dt = timed(func, *fargs)
+        print(f'  {name:15s} {dt * 1e3:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,179 +1,23 @@
 import argparse
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
 
+from angle_sequences import (
+    corput_angles,
+    equally_spaced_angles,
+    golden_angles,
+    is_power_of_two,
+    timbir_angles,
+)
+from interlaced_sweep import MODES, delta_stats, distinct_counts, scheme_angles, sweep
 
-def _bit_reverse(val: int, bits: int) -> int:
-    result = 0
-    for _ in range(bits):
-        result = (result << 1) | (val & 1)
-        val >>= 1
-    return result
-
-
-def _ensure_power_of_two(K: int):
-    if K < 1 or (K & (K - 1)) != 0:
-        raise ValueError(f"K={K} must be a power of two.")
-
-
-def _is_power_of_two(K: int) -> bool:
-    return K >= 1 and (K & (K - 1)) == 0
-
-
-def compute_equally_spaced_multiturn_angles(
-    num_angles=180,
-    K_interlace=3,
-    rotation_start=0.0,
-    rotation_stop=180.0,
-    delta_theta=None,
-    degrees=True,
-):
-    N = int(num_angles)
-    K = int(K_interlace)
-
-    if delta_theta is None:
-        delta_theta = (rotation_stop - rotation_start) / N
-    rotation_step = float(delta_theta)
-
-    n = np.arange(N, dtype=float)
-    angles_per_turn = []
-    for k in range(K):
-        theta_n = rotation_start + (n - k / K) * rotation_step + 360.0 * k
-        angles_per_turn.append(theta_n)
-
-    theta_interlaced = np.concatenate(angles_per_turn).astype(float)
-    theta_monotonic = np.sort(theta_interlaced)
-
-    return angles_per_turn, theta_interlaced, theta_monotonic
-
-
-def compute_golden_angle_multiturn_angles(
-    num_angles=180,
-    K_interlace=3,
-    rotation_start=0.0,
-    degrees=True,
-):
-    N = int(num_angles)
-    K = int(K_interlace)
-    start_deg = float(rotation_start)
-
-    if N <= 0 or K <= 0:
-        raise ValueError("N and K must be > 0")
-
-    golden_angle = 360.0 * (3.0 - np.sqrt(5.0)) / 2.0
-    phi_inv = (np.sqrt(5.0) - 1.0) / 2.0
-
-    base = np.array(
-        [(start_deg + i * golden_angle) % 360.0 for i in range(N)],
-        dtype=np.float64,
-    )
-    base.sort()
-
-    angles_per_turn = []
-    theta_list = []
-    for k in range(K):
-        if k == 0:
-            block = base.copy()
-        else:
-            offset = (k / (N + 1.0)) * 360.0 * phi_inv
-            block = np.sort((base + offset) % 360.0)
-
-        unwrapped_block = start_deg + 360.0 * k + block
-        angles_per_turn.append(unwrapped_block)
-        theta_list.extend(unwrapped_block.tolist())
-
-    theta_interlaced = np.asarray(theta_list, dtype=np.float64)
-    theta_monotonic = np.sort(theta_interlaced)
-
-    return angles_per_turn, theta_interlaced, theta_monotonic
-
-
-def compute_corput_multiturn_angles(
-    num_angles=180,
-    K_interlace=4,
-    rotation_start=0.0,
-    rotation_stop=None,
-    delta_theta=None,
-    degrees=True,
-):
-    N = int(num_angles)
-    K = int(K_interlace)
-    start = float(rotation_start)
-
-    if N <= 0 or K <= 0:
-        raise ValueError("N and K must be > 0")
-
-    if rotation_stop is None:
-        rotation_stop = start + 360.0
-
-    if delta_theta is not None:
-        delta_theta = float(delta_theta)
-    else:
-        delta_theta = (float(rotation_stop) - start) / N
-
-    base = start + np.arange(N, dtype=np.float64) * delta_theta
-
-    bitsK = int(np.ceil(np.log2(K))) if K > 1 else 1
-    MK = 1 << bitsK
-    p_corput = np.array(
-        [_bit_reverse(i, bitsK) for i in range(MK)], dtype=np.int64
-    )
-    p_corput = p_corput[p_corput < K]
-    assert len(p_corput) == K
-    offsets = (p_corput.astype(np.float64) / float(K)) * delta_theta
-
-    bitsN = int(np.ceil(np.log2(N))) if N > 1 else 1
-    MN = 1 << bitsN
-    indices = np.array(
-        [_bit_reverse(i, bitsN) for i in range(MN)], dtype=np.int64
-    )
-    indices = indices[indices < N]
-    assert len(indices) == N
-
-    angles_per_turn = []
-    for k in range(K):
-        offset = offsets[k]
-        loop_angles = base[indices] + offset
-        loop_angles_mod = np.mod(loop_angles - start, 360.0) + start
-        loop_angles_mod = np.sort(loop_angles_mod)
-        loop_angles_unwrapped = loop_angles_mod + 360.0 * k
-        angles_per_turn.append(loop_angles_unwrapped)
-
-    theta_unsorted = np.concatenate(angles_per_turn).astype(np.float64)
-    theta_interlaced = np.sort(theta_unsorted)
-    theta_monotonic = theta_interlaced.copy()
-
-    return angles_per_turn, theta_interlaced, theta_monotonic
-
-
-def compute_timbir_multiturn_angles(
-    num_angles=180,
-    K_interlace=4,
-    rotation_start=0.0,
-    degrees=True,
-):
-    N = int(num_angles)
-    K = int(K_interlace)
-    start_deg = float(rotation_start)
-
-    _ensure_power_of_two(K)
-    bits = int(np.log2(K))
-
-    angles_per_turn = []
-    for loop_turn in range(K):
-        base_turn = 360.0 * loop_turn
-        subloop = _bit_reverse(loop_turn, bits)
-        turn_angles = []
-        for i in range(N):
-            idx = i * K + subloop
-            angle_deg = idx * 360.0 / (N * K)
-            turn_angles.append(start_deg + base_turn + angle_deg)
-        angles_per_turn.append(np.asarray(turn_angles, dtype=np.float64))
-
-    theta_interlaced = np.concatenate(angles_per_turn).astype(np.float64)
-    theta_monotonic = np.sort(theta_interlaced)
-
-    return angles_per_turn, theta_interlaced, theta_monotonic
+# Vectorized implementations, see angle_sequences.py
+compute_equally_spaced_multiturn_angles = equally_spaced_angles
+compute_golden_angle_multiturn_angles = golden_angles
+compute_corput_multiturn_angles = corput_angles
+compute_timbir_multiturn_angles = timbir_angles
+_is_power_of_two = is_power_of_two
 
 
 def polar_plot_interlaced(
@@ -292,10 +136,6 @@ def compute_delta_angles_acquisition_order(angles_per_turn):
     return delta_angles
 
 
-def count_distinct_deltas(delta, decimals=6):
-    return len(np.unique(np.round(delta, decimals=decimals)))
-
-
 def plot_delta_angle_distributions(
     datasets,
     degrees=True,
@@ -357,18 +197,15 @@ def plot_delta_angle_distributions(
         has_negative = np.any(delta < 0)
         n_negative = np.sum(delta < 0)
 
-        unique_vals = np.unique(np.round(delta, decimals=6))
-        n_unique = len(unique_vals)
+        stats = delta_stats(angles_per_turn)
+        n_unique = len(stats["unique_dt"])
 
         # --- Top row: distribution view ---
         ax_hist = axes[0, col]
 
         if n_unique <= 20:
-            counts = {}
-            for v in np.round(delta, decimals=6):
-                counts[v] = counts.get(v, 0) + 1
-            vals = np.array(sorted(counts.keys()))
-            cnts = np.array([counts[v] for v in vals])
+            vals = stats["unique_dt"]
+            cnts = stats["counts"]
 
             markerline, stemlines, baseline = ax_hist.stem(
                 vals, cnts, linefmt="-", markerfmt="o", basefmt=" ",
@@ -379,10 +216,8 @@ def plot_delta_angle_distributions(
             stemlines.set_linewidth(2)
 
             total_frames = N * K
-            delta_rounded = np.round(delta, decimals=6)
-            total_angle = float(angles_per_turn[-1][-1] - angles_per_turn[0][0])
-            for v, c in zip(vals, cnts):
-                collected = 1 + int(np.sum(delta_rounded >= v))
+            total_angle = stats["total_angle"]
+            for v, c, collected in zip(vals, cnts, stats["collected"]):
                 eff = 100.0 * collected / total_frames
                 label = f"{v:.3f}{unit}\n(n={c})\n{eff:.1f}%"
                 if frame_time is not None:
@@ -513,11 +348,16 @@ def plot_distinct_deltas_vs_N_K(
     N_values=None,
     K_values=None,
     jitter=0,
+    workers=None,
 ):
     """
     Empirically measure the number of distinct delta_theta values
     as a function of N and K for all four schemes.
 
+    The (scheme, N, K) grid is evaluated once by ``interlaced_sweep.sweep``
+    (in parallel, cached on disk); the plot and the printed table both read
+    the resulting distinct counts.
+
     Parameters
     ----------
     N_values : list of int or None
@@ -528,26 +368,17 @@ def plot_distinct_deltas_vs_N_K(
         Vertical jitter to separate overlapping lines.
         0.0 = no jitter (lines overlap when equal),
         1.0 = default separation (±0.15).
+    workers : int or None
+        Sweep processes (default: one per CPU).
     """
     if N_values is None:
         N_values = [10, 20, 50, 100, 200, 500, 1000]
     if K_values is None:
         K_values = [1, 2, 4, 8, 16]
 
-    schemes = {
-        "Equally Spaced": lambda N, K: compute_equally_spaced_multiturn_angles(
-            num_angles=N, K_interlace=K, rotation_start=0.0, rotation_stop=360.0,
-        ),
-        "Golden Angle": lambda N, K: compute_golden_angle_multiturn_angles(
-            num_angles=N, K_interlace=K, rotation_start=0.0,
-        ),
-        "Van der Corput": lambda N, K: compute_corput_multiturn_angles(
-            num_angles=N, K_interlace=K, rotation_start=0.0, rotation_stop=360.0,
-        ),
-        "TIMBIR": lambda N, K: compute_timbir_multiturn_angles(
-            num_angles=N, K_interlace=K, rotation_start=0.0,
-        ),
-    }
+    schemes = ["Equally Spaced", "Golden Angle", "Van der Corput", "TIMBIR"]
+    n_distinct = distinct_counts(sweep(
+        schemes, N_values, K_values, start=0.0, stop=360.0, workers=workers))
 
     markers = ["o", "s", "D", "^", "v", "P", "*", "X"]
     fig, axes = plt.subplots(1, len(schemes), figsize=(5 * len(schemes), 5))
@@ -563,21 +394,12 @@ def plot_distinct_deltas_vs_N_K(
     max_jitter = 0.15 * jitter
     jitter_offsets = np.linspace(-max_jitter, max_jitter, n_K)
 
-    for ax, (scheme_name, scheme_fn) in zip(axes, schemes.items()):
+    for ax, scheme_name in zip(axes, schemes):
         ax.set_title(scheme_name, fontsize=11, fontweight="bold")
 
         for ki, K in enumerate(K_values):
-            n_distinct_list = []
-            valid_N = []
-            for N in N_values:
-                try:
-                    angles_per_turn, _, _ = scheme_fn(N, K)
-                    delta = compute_delta_angles_acquisition_order(angles_per_turn)
-                    n_dist = count_distinct_deltas(delta)
-                    n_distinct_list.append(n_dist)
-                    valid_N.append(N)
-                except (ValueError, AssertionError):
-                    continue
+            valid_N = [N for N in N_values if (scheme_name, N, K) in n_distinct]
+            n_distinct_list = [n_distinct[(scheme_name, N, K)] for N in valid_N]
 
             if valid_N:
                 jittered = [v + jitter_offsets[ki] for v in n_distinct_list]
@@ -602,16 +424,11 @@ def plot_distinct_deltas_vs_N_K(
     # Print table
     print(f"\n{'Scheme':>20s} {'K':>4s} {'N':>6s} {'#distinct':>10s}")
     print("-" * 45)
-    for scheme_name, scheme_fn in schemes.items():
+    for scheme_name in schemes:
         for K in K_values:
             for N in N_values:
-                try:
-                    angles_per_turn, _, _ = scheme_fn(N, K)
-                    delta = compute_delta_angles_acquisition_order(angles_per_turn)
-                    n_dist = count_distinct_deltas(delta)
-                    print(f"{scheme_name:>20s} {K:4d} {N:6d} {n_dist:10d}")
-                except (ValueError, AssertionError):
-                    pass
+                if (scheme_name, N, K) in n_distinct:
+                    print(f"{scheme_name:>20s} {K:4d} {N:6d} {n_distinct[(scheme_name, N, K)]:10d}")
 
 def plot_blur_vs_angle(
     datasets,
@@ -773,22 +590,19 @@ def plot_equally_spaced_comparison(
         (ax_cnt_old, angles_old, all_deltas[0], "old: +k/K·step", 0),
         (ax_cnt_new, angles_new, all_deltas[1], "new: −k/K·step", 1),
     ]:
-        delta_rounded = np.round(delta, decimals=6)
-        unique_vals   = np.sort(np.unique(delta_rounded))
-        counts        = {v: int(np.sum(delta_rounded == v)) for v in unique_vals}
-        vals          = np.array(sorted(counts.keys()))
-        cnts          = np.array([counts[v] for v in vals])
+        stats = delta_stats(angles_per_turn)
+        vals  = stats["unique_dt"]
+        cnts  = stats["counts"]
 
         total_frames = N * K
-        total_angle  = float(angles_per_turn[-1][-1] - angles_per_turn[0][0])
+        total_angle  = stats["total_angle"]
 
         c = colors[ci % len(colors)]
         ml, sl, _ = ax_cnt.stem(vals, cnts, linefmt="-", markerfmt="o", basefmt=" ")
         ml.set_color(c); ml.set_markersize(6)
         sl.set_color(c); sl.set_linewidth(2)
 
-        for v, cnt in zip(vals, cnts):
-            collected = 1 + int(np.sum(delta_rounded >= v))
+        for v, cnt, collected in zip(vals, cnts, stats["collected"]):
             eff       = 100.0 * collected / total_frames
             lbl       = f"{v:.3f}{unit}\n(n={cnt})\n{eff:.1f}%"
             if frame_time is not None:
@@ -904,6 +718,33 @@ def compute_frame_time(
     return frame_time
 
 
+@functools.lru_cache(maxsize=64)
+def efficiency_curve(mode, N, K, start, stop):
+    """Distinct Δθ values of a scheme and the frames collected at each.
+
+    At stage velocity Δθᵢ / frame_time a frame is collected when the gap
+    preceding it is ≥ Δθᵢ (frame 0 always is). ``delta_stats`` sorts all
+    gaps once and reads the counts for every Δθᵢ off the first sorted index
+    of each distinct value (``np.unique(..., return_index=True)``),
+    O(NK log NK) instead of one pass over all gaps per distinct Δθ. Results
+    are cached, so repeated PV callbacks with unchanged inputs return at once.
+
+    Returns
+    -------
+    tuple
+        ``(unique_dt, collected, total_angle)``; the arrays are read-only.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown InterlacedMode={mode}")
+    if mode == 1 and not is_power_of_two(K):
+        raise ValueError(f"TIMBIR requires K to be a power of 2 (got K={K})")
+    stats = delta_stats(scheme_angles(MODES[mode], N, K, start, stop))
+    unique_dt, collected, total_angle = stats["unique_dt"], stats["collected"], stats["total_angle"]
+    unique_dt.flags.writeable = False
+    collected.flags.writeable = False
+    return unique_dt, collected, total_angle
+
+
 def pv_callback_efficiency(
     InterlacedRotationStart=0.0,
     InterlacedNumAngles=180,
@@ -990,55 +831,33 @@ def pv_callback_efficiency(
     # InterlacedPSOWindowStep — same formula as tomoScan (360 / N, or scaled range)
     pso_step = (stop - start) / N
 
-    # --- compute angles for the selected mode ---
     try:
-        if InterlacedMode == 0:
-            angles_per_turn, _, _ = compute_equally_spaced_multiturn_angles(
-                num_angles=N, K_interlace=K, rotation_start=start, rotation_stop=stop)
-        elif InterlacedMode == 1:
-            if not _is_power_of_two(K):
-                raise ValueError(f"TIMBIR requires K to be a power of 2 (got K={K})")
-            angles_per_turn, _, _ = compute_timbir_multiturn_angles(
-                num_angles=N, K_interlace=K, rotation_start=start)
-        elif InterlacedMode == 2:
-            angles_per_turn, _, _ = compute_golden_angle_multiturn_angles(
-                num_angles=N, K_interlace=K, rotation_start=start)
-        elif InterlacedMode == 3:
-            angles_per_turn, _, _ = compute_corput_multiturn_angles(
-                num_angles=N, K_interlace=K, rotation_start=start, rotation_stop=stop)
-        else:
-            raise ValueError(f"Unknown InterlacedMode={InterlacedMode}")
+        unique_dt, collected, total_angle = efficiency_curve(
+            InterlacedMode, N, K, start, stop)
     except (ValueError, AssertionError) as exc:
         print(f"[pv_callback_efficiency] Mode {InterlacedMode} not available: {exc}")
         return {}
 
-    delta         = compute_delta_angles_acquisition_order(angles_per_turn)
-    delta_rounded = np.round(delta, decimals=6)
-    unique_dt     = np.sort(np.unique(delta_rounded))
-    total_angle   = float(angles_per_turn[-1][-1] - angles_per_turn[0][0])
-
     # InterlacedScanTime — duration at minimum (slowest) velocity
     scan_time_min = total_angle * frame_time / float(unique_dt[0])
 
     # --- build efficiency rows ---
-    rows = []
-    for dt in unique_dt:
-        vel       = dt / frame_time
-        t_scan    = total_angle * frame_time / dt
-        collected = 1 + int(np.sum(delta_rounded >= dt))
-        dropped   = total_frames - collected
-        eff       = 100.0 * collected / total_frames
-        blur_px   = size_x * np.sin(np.radians(vel * exposure_time) / 2)
-        rows.append(dict(delta_theta=dt, velocity=vel, scan_time=t_scan,
-                         collected=collected, dropped=dropped, efficiency=eff,
-                         blur_px=blur_px))
+    vel       = unique_dt / frame_time
+    t_scan    = total_angle * frame_time / unique_dt
+    dropped   = total_frames - collected
+    eff       = 100.0 * collected / total_frames
+    blur_px   = size_x * np.sin(np.radians(vel * exposure_time) / 2)
+    rows = [dict(delta_theta=r[0], velocity=r[1], scan_time=r[2], collected=r[3],
+                 dropped=r[4], efficiency=r[5], blur_px=r[6])
+            for r in zip(unique_dt.tolist(), vel.tolist(), t_scan.tolist(),
+                         collected.tolist(), dropped.tolist(), eff.tolist(),
+                         blur_px.tolist())]
 
     # Last row whose efficiency meets or exceeds the requested value
+    # (efficiency never increases with Δθ)
     req = float(InterlacedEfficiencyRequested)
-    selected_idx = None
-    for i, row in enumerate(rows):
-        if row['efficiency'] >= req:
-            selected_idx = i
+    meets = np.flatnonzero(eff >= req)
+    selected_idx = int(meets[-1]) if len(meets) else None
 
     # --- print report ---
     W = 94
@@ -1124,7 +943,7 @@ def main(plot=False, efficiency=100):
         rotation_stop=rotation_stop,
         degrees=degrees,
     )
-    if _is_power_of_two(K_interlace):
+    if is_power_of_two(K_interlace):
         angles_tb, theta_tb, theta_tb_mono = compute_timbir_multiturn_angles(
             num_angles=num_angles,
             K_interlace=K_interlace,
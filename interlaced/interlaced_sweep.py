@@ -0,0 +1,169 @@
+"""
+Parallel, memoized parameter sweep of the interlaced acquisition schemes.
+
+``sweep`` evaluates every (scheme, N, K) point of a grid over a process pool
+and stores each point's Δθ statistics in an .npz file under ``cache_dir``,
+keyed by a hash of its parameters, so a point is computed once across runs.
+``sweep_table`` turns the results into a tidy table: one row per
+(scheme, N, K, distinct Δθ), i.e. per stage speed, with the number of
+distinct Δθ values, the efficiency at that speed, scan time and blur.
+``distinct_counts`` reads the number of distinct Δθ per grid point straight
+from the sweep results, which is all plot_distinct_deltas_vs_N_K in
+interlaced_delta_angle.py needs.
+
+Usage:
+    results = sweep(["Golden Angle", "TIMBIR"], N_values=[100, 1000], K_values=[4, 8])
+    rows = sweep_table(results, frame_time=0.01, exposure_time=0.01)
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from angle_sequences import SCHEMES
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sweep_cache")
+CACHE_VERSION = 1
+
+# InterlacedMode numbers used by the tomoScan PVs
+MODES = {0: "Equally Spaced", 1: "TIMBIR", 2: "Golden Angle", 3: "Van der Corput"}
+
+
+def scheme_angles(scheme, N, K, start=0.0, stop=360.0):
+    """angles_per_turn of one scheme; raises ValueError for invalid N, K."""
+    func = SCHEMES[scheme]
+    if scheme in ("Equally Spaced", "Van der Corput"):
+        angles_per_turn, _, _ = func(num_angles=N, K_interlace=K,
+                                     rotation_start=start, rotation_stop=stop)
+    else:
+        angles_per_turn, _, _ = func(num_angles=N, K_interlace=K, rotation_start=start)
+    return angles_per_turn
+
+
+def delta_stats(angles_per_turn, decimals=6):
+    """Δθ statistics of an acquisition-order angle sequence.
+
+    Gaps are rounded to ``decimals`` and sorted once; ``np.unique`` with
+    ``return_index`` gives the first sorted position of every distinct Δθ,
+    from which both the count of each value and the number of frames
+    collected at its speed (frames preceded by a gap ≥ Δθ, plus frame 0)
+    follow directly.
+
+    Returns
+    -------
+    dict
+        unique_dt, counts (gaps equal to each value), collected, and the
+        scalars total_frames, total_angle, min, max, mean, std, n_negative.
+    """
+    delta = np.diff(np.concatenate(angles_per_turn))
+    rounded = np.sort(np.round(delta, decimals=decimals))
+    unique_dt, first = np.unique(rounded, return_index=True)
+    counts = np.diff(np.append(first, len(rounded)))
+    collected = 1 + len(rounded) - first
+    return {
+        "unique_dt": unique_dt,
+        "counts": counts,
+        "collected": collected,
+        "total_frames": len(delta) + 1,
+        "total_angle": float(angles_per_turn[-1][-1] - angles_per_turn[0][0]),
+        "min": float(delta.min()) if len(delta) else 0.0,
+        "max": float(delta.max()) if len(delta) else 0.0,
+        "mean": float(delta.mean()) if len(delta) else 0.0,
+        "std": float(delta.std()) if len(delta) else 0.0,
+        "n_negative": int(np.sum(delta < 0)),
+    }
+
+
+def _key(params):
+    text = json.dumps(dict(params, version=CACHE_VERSION), sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _load(path):
+    with np.load(path, allow_pickle=False) as f:
+        stats = {k: f[k] for k in f.files}
+    for k, v in stats.items():
+        if v.ndim == 0:
+            stats[k] = v.item()
+    return stats
+
+
+def evaluate(params, cache_dir=CACHE_DIR):
+    """Statistics of one grid point, from the cache if present (worker entry)."""
+    path = os.path.join(cache_dir, _key(params) + ".npz") if cache_dir else None
+    if path and os.path.exists(path):
+        return dict(params, **_load(path))
+    try:
+        stats = delta_stats(scheme_angles(**params))
+    except (ValueError, AssertionError) as exc:
+        stats = {"error": str(exc)}
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + ".%d.tmp.npz" % os.getpid()
+        np.savez(tmp, **stats)
+        os.replace(tmp, path)
+    return dict(params, **stats)
+
+
+def sweep(schemes=None, N_values=(10, 20, 50, 100, 200, 500, 1000), K_values=(1, 2, 4, 8, 16),
+          start=0.0, stop=360.0, workers=None, cache_dir=CACHE_DIR):
+    """Evaluate the (scheme, N, K) grid over a process pool.
+
+    Returns
+    -------
+    list of dict
+        One result per grid point, in grid order (scheme, K, N); points a
+        scheme cannot generate (e.g. TIMBIR with K not a power of two)
+        carry an ``error`` message instead of statistics.
+    """
+    schemes = list(SCHEMES) if schemes is None else list(schemes)
+    grid = [dict(scheme=s, N=int(N), K=int(K), start=float(start), stop=float(stop))
+            for s in schemes for K in K_values for N in N_values]
+    workers = workers or min(len(grid), os.cpu_count() or 1)
+    if workers <= 1:
+        return [evaluate(p, cache_dir) for p in grid]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(evaluate, grid, [cache_dir] * len(grid),
+                             chunksize=max(1, len(grid) // (4 * workers))))
+
+
+def sweep_table(results, frame_time=None, exposure_time=None, size_x=2048):
+    """Tidy table of sweep results, one row per (scheme, N, K, distinct Δθ).
+
+    Velocity, scan time and blur are only filled when ``frame_time`` (and
+    ``exposure_time`` for the blur) is given. Failed grid points are left out.
+    """
+    rows = []
+    for r in results:
+        if "error" in r:
+            continue
+        unique_dt = np.asarray(r["unique_dt"])
+        collected = np.asarray(r["collected"])
+        eff = 100.0 * collected / r["total_frames"]
+        if frame_time is not None:
+            vel = unique_dt / frame_time
+            t_scan = r["total_angle"] * frame_time / unique_dt
+        else:
+            vel = t_scan = np.full(len(unique_dt), np.nan)
+        if frame_time is not None and exposure_time is not None:
+            blur = size_x * np.sin(np.radians(vel * exposure_time) / 2)
+        else:
+            blur = np.full(len(unique_dt), np.nan)
+        for i in range(len(unique_dt)):
+            rows.append(dict(
+                scheme=r["scheme"], N=r["N"], K=r["K"], start=r["start"], stop=r["stop"],
+                n_distinct=len(unique_dt), delta_theta=float(unique_dt[i]),
+                count=int(r["counts"][i]), collected=int(collected[i]),
+                dropped=int(r["total_frames"] - collected[i]), efficiency=float(eff[i]),
+                velocity=float(vel[i]), scan_time=float(t_scan[i]), blur_px=float(blur[i]),
+            ))
+    return rows
+
+
+def distinct_counts(results):
+    """``{(scheme, N, K): n_distinct}`` of sweep results; failed points are left out."""
+    return {(r["scheme"], r["N"], r["K"]): len(r["unique_dt"])
+            for r in results if "error" not in r}
@@ -0,0 +1,106 @@
+"""
+Timestamped ring buffer of rotation angles for the streaming reconstruction.
+
+The angle PV is monitored into the buffer; every detector frame then gets
+its angle by linear interpolation at the frame's ``timeStamp``, so the image
+callback never waits on a Channel Access round trip and frames are paired
+with the angle at exposure time rather than at callback time.
+
+Usage:
+    angles = AngleBuffer()
+    channeltheta = pva.Channel('2bma:m82.RBV', pva.CA)
+    channeltheta.monitor(angles.add_pv, 'field(value,timeStamp)')
+    ...
+    theta = angles.angle_at(pv_timestamp(frame_pv))
+"""
+
+import threading
+
+import numpy as np
+
+
+def pv_timestamp(pv, field='timeStamp'):
+    """POSIX time in seconds of a PV's timeStamp structure."""
+    ts = pv[field]
+    return ts['secondsPastEpoch'] + 1e-9 * ts['nanoseconds']
+
+
+class AngleBuffer:
+    """Ring buffer of (time, angle) samples with interpolation by time.
+
+    Parameters
+    ----------
+    size : int
+        Number of angle samples kept. At a 100 Hz motor readback the default
+        covers 40 s, far more than any frame can lag behind.
+    max_extrapolation : float
+        Frames up to this many seconds newer than the last angle sample are
+        extrapolated from the last two samples (constant rotation speed);
+        later or older frames are clamped to the nearest sample. Both cases
+        count as out of range.
+    """
+
+    def __init__(self, size=4096, max_extrapolation=0.5):
+        self.size = size
+        self.max_extrapolation = max_extrapolation
+        self._times = np.zeros(size, dtype=np.float64)
+        self._angles = np.zeros(size, dtype=np.float64)
+        self._count = 0
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.frames = 0
+        self.out_of_range = 0
+        self.extrapolated = 0
+        self.max_gap = 0.0
+
+    def add(self, t, angle):
+        """Store one angle sample; samples older than the newest are dropped."""
+        with self._lock:
+            if self._count and t <= self._times[(self._count - 1) % self.size]:
+                return
+            i = self._count % self.size
+            self._times[i] = t
+            self._angles[i] = angle
+            self._count += 1
+
+    def add_pv(self, pv):
+        """Monitor callback for the angle PV."""
+        self.add(pv_timestamp(pv), pv['value'])
+
+    def _ordered(self):
+        n = min(self._count, self.size)
+        start = self._count - n
+        idx = np.arange(start, start + n) % self.size
+        return self._times[idx], self._angles[idx]
+
+    def angle_at(self, t):
+        """Angle at time t, or None before the first angle sample arrived."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            times, angles = self._ordered()
+        self.frames += 1
+        if t < times[0]:
+            self.out_of_range += 1
+            return angles[0]
+        if t > times[-1]:
+            self.out_of_range += 1
+            if len(times) > 1 and t - times[-1] <= self.max_extrapolation:
+                self.extrapolated += 1
+                slope = (angles[-1] - angles[-2]) / (times[-1] - times[-2])
+                return angles[-1] + slope * (t - times[-1])
+            return angles[-1]
+        k = np.searchsorted(times, t)
+        if k == 0:
+            return angles[0]
+        t0, t1 = times[k - 1], times[k]
+        self.max_gap = max(self.max_gap, t1 - t0)
+        return angles[k - 1] + (angles[k] - angles[k - 1]) * (t - t0) / (t1 - t0)
+
+    def stats(self):
+        """Matching statistics since the last reset_stats."""
+        return {'frames': self.frames, 'samples': self._count,
+                'out_of_range': self.out_of_range, 'extrapolated': self.extrapolated,
+                'max_gap': self.max_gap}
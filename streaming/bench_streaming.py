@@ -0,0 +1,125 @@
+"""
+End-to-end benchmark of the streaming reconstruction against simdetector.py.
+
+Starts the simulated detector in a separate process and runs the shipped
+pipeline, ``teststreaming_real.streaming()`` (angle buffer, flat/dark
+correction, projection ring, orthoslice reconstruction and PVA publisher),
+against it for a fixed time, collecting timings through its ``probe``
+callbacks. Reports:
+
+- receive latency: frame timeStamp to monitor callback;
+- end-to-end latency: timeStamp of the newest frame of a reconstruction to
+  the moment its result is published;
+- dropped frames, from gaps in uniqueId;
+- sustained receive fps and reconstruction rate.
+
+Usage:
+    python bench_streaming.py --fps 100 --size 512 256 --duration 30 --nthetap 50
+"""
+
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+import pvaccess as pva
+
+from simdetector import SimDetector
+from teststreaming_real import streaming
+
+IMAGE_PV = 'SIM:Pva1:Image'
+ANGLE_PV = 'SIM:m82.RBV'
+
+
+def run_detector(args):
+    sim = SimDetector(IMAGE_PV, ANGLE_PV, args.size[0], args.size[1], 'uint8',
+                      args.fps, args.speed, args.jitter, args.drop)
+    sim.run(duration=args.duration + 5)
+
+
+def percentiles(values):
+    if not len(values):
+        return 'n/a'
+    p = np.percentile(np.asarray(values) * 1e3, (50, 90, 99, 100))
+    return 'p50 %.1f  p90 %.1f  p99 %.1f  max %.1f ms' % tuple(p)
+
+
+class Probe:
+    """Timing callbacks for ``streaming(probe=...)``."""
+
+    def __init__(self, nstamps):
+        self.stamps = np.zeros(nstamps)
+        self.recv_latency = []
+        self.e2e_latency = []
+        self.last_uid = None
+        self.received = 0
+        self.dropped = 0
+        self.reconstructions = 0
+        self.published = 0
+
+    def frame(self, pv, ts):
+        """Every frame, as the monitor callback receives it."""
+        now = time.time()
+        uid = pv['uniqueId']
+        if self.last_uid is not None and uid > self.last_uid + 1:
+            self.dropped += uid - self.last_uid - 1
+        self.last_uid = uid
+        self.received += 1
+        self.recv_latency.append(now - ts)
+
+    def pushed(self, seq, ts):
+        """A projection stored in the ring as frame number seq."""
+        self.stamps[seq % len(self.stamps)] = ts
+
+    def reconstructed(self, snap, published):
+        """A reconstruction of snap, published or skipped by the rate limit."""
+        self.reconstructions += 1
+        if published:
+            self.published += 1
+            newest = self.stamps[snap.seq.max() % len(self.stamps)]
+            self.e2e_latency.append(time.time() - newest)
+
+
+def bench(args):
+    probe = Probe(4 * args.nthetap)
+    t0 = time.perf_counter()
+    streaming(None, args.nthetap, max_rate=args.max_rate, dtype=args.pub_dtype,
+              image_pv=IMAGE_PV, angle_pv=ANGLE_PV, angle_provider=pva.PVA,
+              duration=args.duration, probe=probe)
+    elapsed = time.perf_counter() - t0
+
+    print(f'frames received: {probe.received}  dropped: {probe.dropped}  '
+          f'({probe.received / elapsed:.1f} fps sustained)')
+    print(f'reconstructions: {probe.reconstructions} '
+          f'({probe.reconstructions / elapsed:.1f} /s), published: {probe.published}')
+    print('receive latency:    ', percentiles(probe.recv_latency))
+    print('end-to-end latency: ', percentiles(probe.e2e_latency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, nargs=2, default=(512, 256), metavar=('N', 'NZ'),
+                        help='Image width and height')
+    parser.add_argument('--fps', type=float, default=50.0, help='Detector frame rate')
+    parser.add_argument('--speed', type=float, default=18.0, help='Rotation speed in deg/s')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Frame interval jitter in s')
+    parser.add_argument('--drop', type=float, default=0.0, help='Fraction of frames dropped at the source')
+    parser.add_argument('--nthetap', type=int, default=50, help='Projection ring length')
+    parser.add_argument('--max-rate', type=float, default=5.0, help='Maximum publish rate')
+    parser.add_argument('--pub-dtype', default=None, choices=('uint8', 'uint16'),
+                        help='Downcast published images')
+    parser.add_argument('--duration', type=float, default=20.0, help='Measurement time in s')
+    args = parser.parse_args()
+
+    detector = mp.Process(target=run_detector, args=(args,), daemon=True)
+    detector.start()
+    time.sleep(1)  # let the server come up
+    try:
+        bench(args)
+    finally:
+        detector.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""
+Multi-process fan-out of the detector PVA stream through a shared-memory ring.
+
+The receiver process only decodes NTNDArray frames (and their timestamped
+angle, see anglebuffer.py) into a ``ShmRing``; each worker runs in its own
+process with its own GIL and reads the ring by sequence number, so a slow
+reconstruction never stalls the receiver. The main process reports the
+receiver rate and the per-consumer lag.
+
+Workers:
+    stats   per-frame min/mean/max and the consumer rate
+    recon   flat/dark corrected orthoslice reconstruction published as 'AdImage'
+    record  raw frames with metadata saved to --record (.h5 or .zarr)
+
+Usage:
+    python fanout.py --workers stats recon
+    python fanout.py --workers recon record --record /data/scan.h5 --compression lzf
+    python fanout.py --image-pv 2bmbSP1:Pva1:Image --angle-pv SIM:m82.RBV --angle-provider pva
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+import pvaccess as pva
+
+from anglebuffer import AngleBuffer, pv_timestamp
+from flatfield import FlatDarkCorrector, frame_type, PROJECTION
+from shmring import ShmRing, RingReader
+
+FIELDS = {'ubyteValue': 'uint8', 'ushortValue': 'uint16', 'floatValue': 'float32'}
+PROVIDERS = {'ca': pva.CA, 'pva': pva.PVA}
+WORKERS = {}
+
+
+def worker(name):
+    """Register a worker function under name."""
+    def register(func):
+        WORKERS[name] = func
+        return func
+    return register
+
+
+def receiver(ring_name, image_pv, angle_pv, angle_provider, stop):
+    """Copy every frame of image_pv into the ring until stop is set."""
+    ring = ShmRing.attach(ring_name)
+    angles = AngleBuffer()
+    channeltheta = pva.Channel(angle_pv, PROVIDERS[angle_provider])
+    channeltheta.monitor(angles.add_pv, 'field(value,timeStamp)')
+    channeldata = pva.Channel(image_pv)
+
+    def addFrame(pv):
+        ts = pv_timestamp(pv)
+        value = pv['value'][0]
+        field = next(f for f in FIELDS if f in value)
+        theta = angles.angle_at(ts)
+        ring.write(value[field].reshape(ring.shape), pv['uniqueId'], ts,
+                   np.nan if theta is None else theta, frame_type(pv))
+
+    channeldata.monitor(addFrame, '')
+    stop.wait()
+    channeldata.stopMonitor()
+    channeltheta.stopMonitor()
+    ring.close()
+
+
+@worker('stats')
+def stats_worker(ring_name, cid, stop, args):
+    with RingReader(ring_name, consumer_id=cid) as reader:
+        t0 = time.perf_counter()
+        count = 0
+        while not stop.is_set():
+            if reader.read(timeout=0.5) is None:
+                continue
+            count += 1
+            dt = time.perf_counter() - t0
+            if dt > 5:
+                f = reader.frame
+                print(f'[stats] {count / dt:.1f} fps  min {f.min()} mean {f.mean():.1f} '
+                      f'max {f.max()}  lost {reader.lost}')
+                t0, count = time.perf_counter(), 0
+
+
+@worker('recon')
+def recon_worker(ring_name, cid, stop, args):
+    from projring import ProjectionRing
+    from pvpublish import RecPublisher
+    try:
+        from orthorec import OrthoRec
+        seq_arg = False
+    except ImportError:  # no GPU solver, use the incremental CPU backend
+        from orthorec_cpu import OrthoRec
+        seq_arg = True  # updates only the slots whose snapshot seq changed
+
+    with RingReader(ring_name, consumer_id=cid) as reader:
+        nz, n = reader.ring.shape
+        ring = ProjectionRing(args.nthetap, nz, n)
+        ffc = FlatDarkCorrector(nz, n)
+        pvrec = pva.NtNdArray()
+        pvrec['dimension'] = [{'size': 3 * n, 'fullSize': 3 * n, 'binning': 1},
+                              {'size': n, 'fullSize': n, 'binning': 1}]
+        server = pva.PvaServer('AdImage', pvrec)
+        pub = RecPublisher(pvrec, max_rate=args.max_rate)
+        recall = np.zeros([n, 3 * n], dtype='float32')
+        with OrthoRec(args.nthetap, n, nz) as slv:
+            while not stop.is_set():
+                # drain what arrived, then reconstruct once
+                got = reader.read(timeout=0.5)
+                while got is not None:
+                    meta = got[1]
+                    if meta['key'] != PROJECTION:
+                        ffc.process(reader.frame, meta['key'])
+                    elif np.isfinite(meta['theta']):
+                        ring.push(ffc.correct(reader.frame), meta['theta'])
+                    got = reader.read(timeout=0)
+                snap = ring.snapshot()
+                if snap is not None:
+                    recx, recy, recz = slv.rec_ortho(snap.data, snap.theta * np.pi / 180,
+                                                     n // 2, n // 2, n // 2, nz // 2,
+                                                     **({'seq': snap.seq} if seq_arg else {}))
+                    recall[:nz, :n] = recx
+                    recall[:nz, n:2 * n] = recy
+                    recall[:, 2 * n:] = recz
+                pub.publish(recall, changed=snap is not None)
+
+
+@worker('record')
+def record_worker(ring_name, cid, stop, args):
+    from recorder import StreamRecorder
+
+    with RingReader(ring_name, start='oldest', consumer_id=cid) as reader:
+        rec = StreamRecorder(args.record, reader.ring.shape, reader.ring.dtype,
+                             compression=args.compression).start()
+        t0 = time.perf_counter()
+        while not stop.is_set():
+            got = reader.read(timeout=0.5)
+            if got is not None:
+                meta = got[1]
+                rec.put(reader.frame, meta['uid'], meta['timestamp'], meta['theta'], meta['key'])
+            if time.perf_counter() - t0 > 5:
+                print(f'[record] {rec.stats()}  lost in ring {reader.lost}')
+                t0 = time.perf_counter()
+        rec.stop()
+        print(f'[record] {rec.stats()}  lost in ring {reader.lost}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image-pv', default='2bmbSP1:Pva1:Image', help='Detector NTNDArray PV')
+    parser.add_argument('--angle-pv', default='2bma:m82.RBV', help='Rotation angle PV')
+    parser.add_argument('--angle-provider', default='ca', choices=sorted(PROVIDERS))
+    parser.add_argument('--workers', nargs='+', default=['stats'], choices=sorted(WORKERS),
+                        help='Consumer processes to start')
+    parser.add_argument('--slots', type=int, default=256, help='Shared ring length in frames')
+    parser.add_argument('--nthetap', type=int, default=50, help='Reconstruction ring length')
+    parser.add_argument('--max-rate', type=float, default=5.0, help='Maximum publish rate')
+    parser.add_argument('--record', default='stream.h5', help='Output of the record worker')
+    parser.add_argument('--compression', default=None, choices=('auto', 'gzip', 'lzf', 'blosc'),
+                        help='Compression of the record worker output')
+    args = parser.parse_args()
+
+    pv = pva.Channel(args.image_pv).get('')
+    n, nz = pv['dimension'][0]['size'], pv['dimension'][1]['size']
+    field = next(f for f in FIELDS if f in pv['value'][0])
+    ring_name = f'fanout_{os.getpid()}'
+    ring = ShmRing.create(ring_name, args.slots, (nz, n), FIELDS[field],
+                          max_consumers=max(16, len(args.workers)))
+    print(f'ring {ring_name}: {args.slots} x {nz}x{n} {FIELDS[field]} '
+          f'({ring.shm.size / 1024**2:.0f} MB)')
+
+    # spawn, not fork: the pvAccess client context created above (and its
+    # threads) would be half copied into forked children
+    ctx = mp.get_context('spawn')
+    stop = ctx.Event()
+    procs = [ctx.Process(target=receiver, args=(ring_name, args.image_pv, args.angle_pv,
+                                                 args.angle_provider, stop))]
+    # consumer ids are assigned here, registering concurrently could collide
+    procs += [ctx.Process(target=WORKERS[w], args=(ring_name, cid, stop, args))
+              for cid, w in enumerate(args.workers)]
+    for p in procs:
+        p.start()
+    try:
+        last, t0 = ring.write_seq, time.perf_counter()
+        while True:
+            time.sleep(5)
+            w, t = ring.write_seq, time.perf_counter()
+            print(f'[receiver] {(w - last) / (t - t0):.1f} fps  lag per consumer: {ring.lags()}')
+            last, t0 = w, t
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for p in procs:
+            p.join(timeout=5)
+        ring.close()
+
+
+if __name__ == '__main__':
+    main()
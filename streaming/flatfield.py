@@ -0,0 +1,155 @@
+"""
+Online flat/dark correction of streamed projections.
+
+``FlatDarkCorrector`` keeps running averages of the dark and flat frames it
+is fed and corrects every projection as ``-log((p - d) / (f - d))`` into
+preallocated float32 buffers, so no memory is allocated per frame. Frames
+are classified with the NeXus ``image_key`` convention (0 projection,
+1 flat, 2 dark), taken from the detector's frame-type NDAttribute or from a
+monitored PV (``FrameTypeMonitor``).
+
+Usage:
+    ffc = FlatDarkCorrector(nz, n)
+    key = frame_type(pv)            # or FrameTypeMonitor('2bma:TomoScan:FrameType').key
+    out = ffc.process(frame, key)   # None for flats/darks, corrected view otherwise
+    print(ffc.stats())
+"""
+
+import time
+
+import numpy as np
+
+PROJECTION, FLAT, DARK = 0, 1, 2
+
+# TomoScan FrameType strings and enum indices onto image_key...
+FRAME_TYPES = {
+    'projection': PROJECTION, 'flatfield': FLAT, 'darkfield': DARK,
+    'data': PROJECTION, 'flat': FLAT, 'dark': DARK, 'white': FLAT,
+}
+
+
+def to_image_key(value):
+    """image_key of a frame-type value (string, TomoScan enum or image_key)."""
+    if isinstance(value, bytes):
+        value = value.decode()
+    if isinstance(value, str):
+        return FRAME_TYPES.get(value.strip().lower(), PROJECTION)
+    # TomoScan FrameType enum: 0 Projection, 1 FlatField, 2 DarkField
+    return int(value) if int(value) in (PROJECTION, FLAT, DARK) else PROJECTION
+
+
+def frame_type(pv, name='FrameType'):
+    """image_key from the NDAttribute name of an NTNDArray, PROJECTION if absent."""
+    for attr in pv['attribute']:
+        if attr['name'] == name:
+            value = attr['value']
+            # 'any' fields come back wrapped as a single-item list or dict...
+            if isinstance(value, (list, tuple)):
+                value = value[0]
+            if isinstance(value, dict):
+                value = next(iter(value.values()))
+            return to_image_key(value)
+    return PROJECTION
+
+
+class FrameTypeMonitor:
+    """Latest image_key from a frame-type PV, for detectors without the attribute."""
+
+    def __init__(self, pvname, provider=None):
+        import pvaccess as pva
+        self.key = PROJECTION
+        self.channel = pva.Channel(pvname, provider or pva.CA)
+        self.channel.monitor(self._update, 'field(value)')
+
+    def _update(self, pv):
+        self.key = to_image_key(pv['value'])
+
+
+class FlatDarkCorrector:
+    """Running dark/flat averages and -log flat/dark correction.
+
+    Parameters
+    ----------
+    nz, n : int
+        Frame shape.
+    window : int
+        Averages are plain means over the first window frames of a kind and
+        exponential moving averages with weight 1/window afterwards, so they
+        follow slow beam drifts.
+    eps : float
+        Floor of the denominator and of the normalized intensity.
+    """
+
+    def __init__(self, nz, n, window=20, eps=1e-3):
+        self.window = window
+        self.eps = eps
+        self.dark = np.zeros([nz, n], dtype='float32')
+        self.flat = np.ones([nz, n], dtype='float32')
+        self.denom = np.ones([nz, n], dtype='float32')
+        self.out = np.empty([nz, n], dtype='float32')
+        self._tmp = np.empty([nz, n], dtype='float32')
+        self.ndark = 0
+        self.nflat = 0
+        self.frames = 0
+        self.seconds = 0.0
+
+    @property
+    def ready(self):
+        """True once at least one flat has been averaged."""
+        return self.nflat > 0
+
+    def _accumulate(self, avg, frame, count):
+        # avg += (frame - avg) * w, in place
+        w = 1.0 / min(count + 1, self.window)
+        np.subtract(frame, avg, out=self._tmp, casting='unsafe')
+        self._tmp *= w
+        avg += self._tmp
+
+    def _update_denom(self):
+        np.subtract(self.flat, self.dark, out=self.denom)
+        np.maximum(self.denom, self.eps, out=self.denom)
+
+    def add_dark(self, frame):
+        self._accumulate(self.dark, frame, self.ndark)
+        self.ndark += 1
+        self._update_denom()
+
+    def add_flat(self, frame):
+        self._accumulate(self.flat, frame, self.nflat)
+        self.nflat += 1
+        self._update_denom()
+
+    def correct(self, frame, out=None):
+        """-log((frame - dark) / (flat - dark)) into out (default self.out).
+
+        Before the first flat arrives the frame is only converted to float32.
+        """
+        t0 = time.perf_counter()
+        out = self.out if out is None else out
+        if not self.ready:
+            np.copyto(out, frame, casting='unsafe')
+        else:
+            np.subtract(frame, self.dark, out=out, casting='unsafe')
+            out /= self.denom
+            np.maximum(out, self.eps, out=out)
+            np.log(out, out=out)
+            np.negative(out, out=out)
+        self.seconds += time.perf_counter() - t0
+        self.frames += 1
+        return out
+
+    def process(self, frame, key=PROJECTION):
+        """Average flats/darks (returns None) or correct a projection."""
+        if key == DARK:
+            self.add_dark(frame)
+            return None
+        if key == FLAT:
+            self.add_flat(frame)
+            return None
+        return self.correct(frame)
+
+    def stats(self):
+        """Correction throughput since start."""
+        fps = self.frames / self.seconds if self.seconds else 0.0
+        return {'frames': self.frames, 'darks': self.ndark, 'flats': self.nflat,
+                'fps': fps, 'MB/s': fps * self.out.nbytes / 1024**2}
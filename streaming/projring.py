@@ -0,0 +1,140 @@
+"""
+Single-producer/single-consumer projection ring with double buffering.
+
+The detector monitor callback (producer) writes frames into the back
+generation of the ring; the reconstruction loop (consumer) reads a front
+generation that the producer never touches. A ``snapshot`` call hands the
+current front back and asks the producer for a new one; the producer swaps
+generations between two frames, so the consumer can never see a torn frame,
+and then brings the new back generation up to date by copying only the
+slots written since the last swap instead of the whole buffer.
+
+When the producer is idle (stream paused or ended) the consumer swaps
+itself, so the last frames are not held back until the next push. A lock
+held for the duration of each push keeps it from swapping in the middle of
+a frame; it is only contended while the consumer swaps.
+
+Usage:
+    ring = ProjectionRing(nthetap, nz, n)
+
+    def addProjection(pv):                       # producer (monitor thread)
+        ring.push(pv['value'][0]['ubyteValue'].reshape(nz, n), theta)
+
+    while True:                                  # consumer (main loop)
+        snap = ring.snapshot(timeout=0.2)
+        if snap is not None:
+            slv.rec_ortho(snap.data, snap.theta, ...)
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+Snapshot = namedtuple('Snapshot', ['data', 'theta', 'seq', 'count'])
+Snapshot.__doc__ = """Read-only view of one ring generation.
+
+data, theta : read-only views of the [nslots, nz, n] frames and their angles
+seq : sequence number of the frame stored in every slot (-1 if empty)
+count : number of frames pushed when the generation was published
+"""
+
+
+class ProjectionRing:
+    """Double-buffered ring of nslots projections of shape (nz, n).
+
+    Parameters
+    ----------
+    nslots, nz, n : int
+        Ring length and frame size.
+    dtype : dtype
+        Frame dtype of the ring (input frames are cast on copy).
+    """
+
+    def __init__(self, nslots, nz, n, dtype='float32'):
+        self.nslots = nslots
+        self._data = [np.zeros([nslots, nz, n], dtype=dtype) for _ in range(2)]
+        self._theta = [np.zeros(nslots, dtype='float32') for _ in range(2)]
+        self._seq = [np.full(nslots, -1, dtype=np.int64) for _ in range(2)]
+        self._back = 0
+        self._dirty = []
+        self._requested = 0
+        self._published = 0
+        self._taken = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self.count = 0
+        self.slot = -1
+        self.last_theta = None
+        self.synced_slots = 0
+
+    # Producer side...
+
+    def push(self, frame, theta, slot=None):
+        """Store one frame; slot defaults to the next one round robin."""
+        if slot is None:
+            slot = (self.slot + 1) % self.nslots
+        with self._lock:
+            b = self._back
+            np.copyto(self._data[b][slot], frame, casting='unsafe')
+            self._theta[b][slot] = theta
+            self._seq[b][slot] = self.count
+            if self._dirty is not None:
+                self._dirty.append(slot)
+                if len(self._dirty) >= self.nslots:
+                    self._dirty = None  # every slot may have changed
+            self.count += 1
+            self.slot = slot
+            self.last_theta = theta
+            if self._requested != self._published:
+                self._publish()
+
+    def _publish(self):
+        """Make the back generation the front one and resync the other."""
+        front = self._back
+        back = 1 - front
+        self._count = self.count
+        self._back = back
+        self._published = self._requested
+        # The consumer released the old front when it asked for a new one...
+        slots = slice(None) if self._dirty is None else np.unique(self._dirty)
+        self._data[back][slots] = self._data[front][slots]
+        self._theta[back][slots] = self._theta[front][slots]
+        self._seq[back][slots] = self._seq[front][slots]
+        self.synced_slots += self.nslots if isinstance(slots, slice) else len(slots)
+        self._dirty = []
+
+    # Consumer side...
+
+    def snapshot(self, timeout=0.0):
+        """Release the previous snapshot and return a newer one.
+
+        Frames pushed since the last snapshot are published right away if
+        the producer is not in the middle of a push; otherwise waits up to
+        timeout seconds for it. Returns None if no frame arrived in time
+        (the previous snapshot must not be used any more once this is
+        called).
+        """
+        if self._requested == self._published and self._taken == self._published:
+            self._requested += 1
+        deadline = time.perf_counter() + timeout
+        while self._requested != self._published:
+            if self.count != self._count and self._lock.acquire(blocking=False):
+                try:
+                    if self._requested != self._published:
+                        self._publish()
+                finally:
+                    self._lock.release()
+                continue
+            if time.perf_counter() >= deadline:
+                return None
+            time.sleep(0.001)
+        self._taken = self._published
+        front = 1 - self._back
+        data = self._data[front].view()
+        theta = self._theta[front].view()
+        seq = self._seq[front].view()
+        for a in (data, theta, seq):
+            a.flags.writeable = False
+        return Snapshot(data, theta, seq, self._count)
@@ -0,0 +1,227 @@
+"""
+Asynchronous HDF5/Zarr recorder for the PVA image stream.
+
+``StreamRecorder.put`` only copies the frame into a bounded queue and never
+blocks, so it is safe to call from the pvaccess monitor callback; a
+background thread collects the frames into chunk-sized batches and appends
+them, with uniqueId, timestamp, angle and image_key, to a chunked and
+optionally compressed file:
+
+    /exchange/data        [nframes, nz, n]
+    /exchange/theta       [nframes]  degrees (NaN if unknown)
+    /exchange/image_key   [nframes]  0 projection, 1 flat, 2 dark
+    /exchange/uniqueId    [nframes]
+    /exchange/timestamp   [nframes]  POSIX seconds
+
+When the writer cannot keep up the queue fills and further frames are
+dropped (and counted) instead of back-pressuring the monitor. ``stats``
+reports the queue high-water mark, drops, write rate and the writer error,
+if any.
+
+Usage:
+    rec = StreamRecorder('scan.h5', (nz, n), 'uint8', compression='auto')
+    rec.start()
+    ...
+    rec.put(frame, pv['uniqueId'], pv_timestamp(pv), theta, key)   # in the callback
+    ...
+    rec.stop()
+    print(rec.stats())
+"""
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+META = (('theta', 'float64'), ('image_key', 'uint8'), ('uniqueId', 'int64'),
+        ('timestamp', 'float64'))
+
+# compression='auto': a fast codec each file format supports
+AUTO_COMPRESSION = {'h5': 'lzf', 'zarr': 'blosc'}
+
+
+def is_zarr(path):
+    return path.rstrip('/').endswith('.zarr')
+
+
+class _H5Sink:
+    def __init__(self, path, shape, dtype, chunk, compression, level):
+        import h5py
+        self.f = h5py.File(path, 'w')
+        opts = {}
+        if compression in ('gzip', 'lzf'):
+            opts['compression'] = compression
+            if compression == 'gzip' and level is not None:
+                opts['compression_opts'] = level
+        elif compression is not None:
+            raise ValueError(f'Unsupported HDF5 compression {compression}')
+        grp = self.f.require_group('exchange')
+        self.data = grp.create_dataset('data', shape=(0,) + shape, dtype=dtype,
+                                       maxshape=(None,) + shape, chunks=(chunk,) + shape, **opts)
+        self.meta = {name: grp.create_dataset(name, shape=(0,), dtype=dt, maxshape=(None,),
+                                              chunks=(max(chunk, 1024),))
+                     for name, dt in META}
+
+    def append(self, data, meta):
+        n0, k = self.data.shape[0], len(data)
+        self.data.resize(n0 + k, axis=0)
+        self.data[n0:] = data
+        for name, dset in self.meta.items():
+            dset.resize(n0 + k, axis=0)
+            dset[n0:] = meta[name]
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class _ZarrSink:
+    def __init__(self, path, shape, dtype, chunk, compression, level):
+        import zarr
+        from numcodecs import Blosc, Zlib
+        if compression is None:
+            compressor = None
+        elif compression == 'blosc':
+            compressor = Blosc(cname='lz4', clevel=5 if level is None else level,
+                               shuffle=Blosc.BITSHUFFLE)
+        elif compression == 'gzip':
+            compressor = Zlib(level=6 if level is None else level)
+        else:
+            raise ValueError(f'Unsupported Zarr compression {compression}')
+        grp = zarr.open_group(path, mode='w').require_group('exchange')
+        self.data = grp.create_dataset('data', shape=(0,) + shape, dtype=dtype,
+                                       chunks=(chunk,) + shape, compressor=compressor)
+        self.meta = {name: grp.create_dataset(name, shape=(0,), dtype=dt, chunks=(max(chunk, 1024),))
+                     for name, dt in META}
+
+    def append(self, data, meta):
+        self.data.append(data, axis=0)
+        for name, arr in self.meta.items():
+            arr.append(meta[name])
+
+    def close(self):
+        pass
+
+
+class StreamRecorder:
+    """Record streamed frames in a background thread.
+
+    Parameters
+    ----------
+    path : str
+        Output file (.h5/.hdf5) or Zarr directory (.zarr).
+    shape : tuple
+        Frame shape (nz, n).
+    dtype : str
+        Frame dtype.
+    chunk : int
+        Frames per chunk along axis 0, also the write batch size.
+    compression : str, optional
+        'gzip' or 'lzf' (HDF5), 'blosc' or 'gzip' (Zarr), or 'auto' for
+        lzf (HDF5) or blosc (Zarr).
+    level : int, optional
+        Compression level.
+    queue_size : int
+        Frames held in memory before frames are dropped.
+    """
+
+    def __init__(self, path, shape, dtype, chunk=16, compression=None, level=None,
+                 queue_size=256):
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk = chunk
+        if compression == 'auto':
+            compression = AUTO_COMPRESSION['zarr' if is_zarr(path) else 'h5']
+        self.sink_args = (path, self.shape, self.dtype, chunk, compression, level)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.error = None
+        self.received = 0
+        self.dropped = 0
+        self.written = 0
+        self.high_water = 0
+        self.write_seconds = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='StreamRecorder', daemon=True)
+        self.thread.start()
+        return self
+
+    def put(self, frame, uid=0, timestamp=0.0, theta=np.nan, key=0):
+        """Queue one frame without blocking; returns False if it was dropped."""
+        self.received += 1
+        try:
+            self.queue.put_nowait((np.array(frame, dtype=self.dtype, copy=True),
+                                   theta, key, uid, timestamp))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.high_water = max(self.high_water, self.queue.qsize())
+        return True
+
+    def stop(self):
+        """Write what is queued, then close the file."""
+        if self.thread is not None:
+            while self.thread.is_alive():
+                try:
+                    self.queue.put(None, timeout=0.1)
+                    break
+                except queue.Full:  # writer still busy, or died on an error
+                    continue
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            raise self.error
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        sink_cls = _ZarrSink if is_zarr(self.path) else _H5Sink
+        try:
+            sink = sink_cls(*self.sink_args)
+        except Exception as exc:
+            self.error = exc
+            while self.queue.get() is not None:  # keep the producer unblocked
+                self.dropped += 1
+            return
+        batch = np.empty((self.chunk,) + self.shape, dtype=self.dtype)
+        meta = {name: np.empty(self.chunk, dtype=dt) for name, dt in META}
+        k = 0
+        done = False
+        try:
+            while not done:
+                item = self.queue.get()
+                if item is None:
+                    done = True
+                else:
+                    frame, *values = item
+                    batch[k] = frame
+                    for (name, _), v in zip(META, values):
+                        meta[name][k] = v
+                    k += 1
+                if k == self.chunk or (done and k):
+                    t0 = time.perf_counter()
+                    sink.append(batch[:k], {name: a[:k] for name, a in meta.items()})
+                    self.write_seconds += time.perf_counter() - t0
+                    self.written += k
+                    k = 0
+        except Exception as exc:
+            self.error = exc
+        finally:
+            sink.close()
+
+    def stats(self):
+        """Queue and write statistics, with the writer error if it failed."""
+        rate = self.written * self.dtype.itemsize * int(np.prod(self.shape))
+        rate = rate / self.write_seconds / 1024**2 if self.write_seconds else 0.0
+        return {'received': self.received, 'written': self.written,
+                'dropped': self.dropped, 'queued': self.queue.qsize(),
+                'high_water': self.high_water, 'queue_size': self.queue.maxsize,
+                'write MB/s': rate,
+                'error': None if self.error is None else repr(self.error)}
@@ -0,0 +1,221 @@
+"""
+Shared-memory frame ring for fanning the detector stream out to processes.
+
+One receiver process writes every NTNDArray frame into a ring of slots in a
+``multiprocessing.shared_memory`` block; any number of consumer processes
+(flat-field correction, reconstruction, statistics, recording) attach to the
+ring by name and read frames by sequence number. The writer never waits for
+readers: a consumer that falls more than a ring length behind skips ahead
+and counts the frames it lost. Every slot carries its sequence number, which
+the writer invalidates before and sets after copying a frame, so readers
+detect (and skip) a slot overwritten while they copied it.
+
+Each consumer publishes the next sequence number it will read, so the
+receiver can report per-consumer lag. Finding a free consumer slot is not
+atomic across processes, so a parent that starts several consumers at once
+should hand each one its own ``consumer_id``.
+
+Layout of the block: control words, consumer positions, slot sequence
+numbers, slot metadata (uniqueId, timeStamp, angle, image_key) and the
+frames.
+"""
+
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DTYPES = ('uint8', 'uint16', 'float32')
+# control words
+WRITE_SEQ, NSLOTS, MAX_CONSUMERS, NZ, N, DTYPE = range(6)
+NCTRL = 8
+META = ('uid', 'timestamp', 'theta', 'key')
+
+
+def _align(nbytes, to=64):
+    return (nbytes + to - 1) // to * to
+
+
+class ShmRing:
+    """Ring of nslots (nz, n) frames in shared memory.
+
+    Use ``ShmRing.create`` in the process that owns the ring and
+    ``ShmRing.attach`` everywhere else.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        buf = shm.buf
+        self.ctrl = np.ndarray(NCTRL, dtype=np.int64, buffer=buf)
+        nslots, ncons = int(self.ctrl[NSLOTS]), int(self.ctrl[MAX_CONSUMERS])
+        self.nslots = nslots
+        self.shape = (int(self.ctrl[NZ]), int(self.ctrl[N]))
+        self.dtype = np.dtype(DTYPES[self.ctrl[DTYPE]])
+        offset = NCTRL * 8
+        self.positions = np.ndarray(ncons, dtype=np.int64, buffer=buf, offset=offset)
+        offset += ncons * 8
+        self.slot_seq = np.ndarray(nslots, dtype=np.int64, buffer=buf, offset=offset)
+        offset += nslots * 8
+        self.meta = np.ndarray((nslots, len(META)), dtype=np.float64, buffer=buf, offset=offset)
+        offset = _align(offset + self.meta.nbytes)
+        self.frames = np.ndarray((nslots,) + self.shape, dtype=self.dtype, buffer=buf, offset=offset)
+
+    @staticmethod
+    def nbytes(nslots, shape, dtype, max_consumers):
+        head = (NCTRL + max_consumers + nslots) * 8 + nslots * len(META) * 8
+        return _align(head) + nslots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+    @classmethod
+    def create(cls, name, nslots, shape, dtype='uint8', max_consumers=16):
+        dtype = np.dtype(dtype).name
+        if dtype not in DTYPES:
+            raise ValueError(f'Unsupported frame dtype {dtype}')
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=cls.nbytes(nslots, shape, dtype, max_consumers))
+        ctrl = np.ndarray(NCTRL, dtype=np.int64, buffer=shm.buf)
+        ctrl[:] = 0
+        ctrl[NSLOTS], ctrl[MAX_CONSUMERS] = nslots, max_consumers
+        ctrl[NZ], ctrl[N], ctrl[DTYPE] = shape[0], shape[1], DTYPES.index(dtype)
+        ring = cls(shm, owner=True)
+        ring.positions[:] = -1
+        ring.slot_seq[:] = -1
+        return ring
+
+    @classmethod
+    def attach(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)  # Python >= 3.13
+        except TypeError:
+            # Only the owner may unlink the block, so it must stay the only
+            # registration: forked readers share the owner's resource
+            # tracker and unregistering would drop the owner's entry...
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    def close(self):
+        for name in ('ctrl', 'positions', 'slot_seq', 'meta', 'frames'):
+            setattr(self, name, None)
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    # Writer side...
+
+    @property
+    def write_seq(self):
+        """Sequence number of the next frame to be written."""
+        return int(self.ctrl[WRITE_SEQ])
+
+    def write(self, frame, uid=0, timestamp=0.0, theta=np.nan, key=0):
+        """Copy one frame into the next slot (single writer only)."""
+        seq = int(self.ctrl[WRITE_SEQ])
+        k = seq % self.nslots
+        self.slot_seq[k] = -1
+        np.copyto(self.frames[k], frame, casting='unsafe')
+        self.meta[k] = (uid, timestamp, theta, key)
+        self.slot_seq[k] = seq
+        self.ctrl[WRITE_SEQ] = seq + 1
+        return seq
+
+    def register(self, cid=None):
+        """Reserve a consumer slot; returns its id.
+
+        With ``cid`` None the first free slot is taken, which can race with
+        other processes registering at the same time; pass distinct ids
+        assigned by the parent process instead.
+        """
+        if cid is None:
+            free = np.flatnonzero(self.positions == -1)
+            if not len(free):
+                raise RuntimeError('No free consumer slot in the ring')
+            cid = int(free[0])
+        elif not 0 <= cid < len(self.positions):
+            raise ValueError(f'Consumer id {cid} out of range 0..{len(self.positions) - 1}')
+        elif self.positions[cid] != -1:
+            raise RuntimeError(f'Consumer slot {cid} is already in use')
+        self.positions[cid] = self.write_seq
+        return cid
+
+    def lags(self):
+        """Frames each registered consumer is behind the writer."""
+        w = self.write_seq
+        return {i: w - int(p) for i, p in enumerate(self.positions) if p >= 0}
+
+
+class RingReader:
+    """Consumer of a ShmRing.
+
+    Parameters
+    ----------
+    name : str
+        Shared memory name of the ring.
+    start : {'latest', 'oldest'}
+        Start at the next frame written or at the oldest frame in the ring.
+    consumer_id : int, optional
+        Consumer slot assigned by the parent process; the first free slot
+        if None.
+    """
+
+    def __init__(self, name, start='latest', consumer_id=None):
+        self.ring = ShmRing.attach(name)
+        self.id = self.ring.register(consumer_id)
+        w = self.ring.write_seq
+        self.pos = w if start == 'latest' else max(0, w - self.ring.nslots + 1)
+        self.ring.positions[self.id] = self.pos
+        self.frame = np.empty(self.ring.shape, dtype=self.ring.dtype)
+        self.lost = 0
+        self.read_count = 0
+
+    def close(self):
+        self.ring.positions[self.id] = -1
+        self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, timeout=None):
+        """Copy the next frame into ``self.frame``.
+
+        Returns
+        -------
+        tuple or None
+            ``(seq, meta)`` with meta a dict of uid, timestamp, theta and key, or
+            None on timeout. The frame buffer is reused by the next read.
+        """
+        ring = self.ring
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            w = ring.write_seq
+            if self.pos >= w:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return None
+                time.sleep(0.0005)
+                continue
+            # Too far behind: skip to the oldest frame that cannot be
+            # overwritten before we are done copying it...
+            oldest = w - ring.nslots + 1
+            if self.pos < oldest:
+                self.lost += oldest - self.pos
+                self.pos = oldest
+            seq = self.pos
+            k = seq % ring.nslots
+            if ring.slot_seq[k] == seq:
+                np.copyto(self.frame, ring.frames[k])
+                meta = dict(zip(META, ring.meta[k].tolist()))
+                if ring.slot_seq[k] == seq:
+                    self.pos += 1
+                    ring.positions[self.id] = self.pos
+                    self.read_count += 1
+                    return seq, meta
+            # Overwritten while copying...
+            self.lost += 1
+            self.pos += 1
@@ -0,0 +1,182 @@
+"""
+Local stand-in for the areaDetector PVA stream used by the streaming scripts.
+
+Serves a rotating 3D ellipsoid phantom as NTNDArray frames on a PvaServer
+record (default '2bmbSP1:Pva1:Image') together with the rotation angle
+(default 'SIM:m82.RBV', served over PVA since pvaccess cannot host CA
+records), so the streaming pipeline can be run and tuned without a
+beamline. Frames carry uniqueId and timeStamp like the real detector.
+
+Usage:
+    python simdetector.py --fps 100 --size 512 256 --dtype uint8 --jitter 0.002
+
+    # then point the consumers at it, e.g.
+    streaming(theta, nthetap, angle_pv='SIM:m82.RBV', angle_provider=pva.PVA)
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pvaccess as pva
+
+# (x0, y0, z0, a, b, c, density) in units of half the image width...
+PHANTOM = [
+    (0.0, 0.0, 0.0, 0.69, 0.92, 0.90, 1.0),
+    (0.0, -0.0184, 0.0, 0.6624, 0.874, 0.88, -0.8),
+    (0.22, 0.0, 0.0, 0.11, 0.31, 0.5, -0.2),
+    (-0.22, 0.0, 0.0, 0.16, 0.41, 0.6, -0.2),
+    (0.0, 0.35, -0.15, 0.21, 0.25, 0.3, 0.1),
+    (0.0, 0.1, 0.25, 0.046, 0.046, 0.046, 0.1),
+    (-0.08, -0.605, 0.0, 0.046, 0.023, 0.2, 0.1),
+    (0.06, -0.605, 0.1, 0.023, 0.046, 0.2, 0.1),
+]
+
+
+def project_phantom(theta, n, nz, phantom=PHANTOM):
+    """Analytic parallel-beam projection [nz, n] of the ellipsoid phantom.
+
+    Every z section of an ellipsoid is an ellipse whose projection at angle
+    theta (radians) is known in closed form.
+    """
+    s = (np.arange(n) - n / 2 + 0.5) / (n / 2)
+    z = (np.arange(nz) - nz / 2 + 0.5) / (n / 2)
+    c, sn = np.cos(theta), np.sin(theta)
+    proj = np.zeros([nz, n])
+    for x0, y0, z0, a, b, cz, rho in phantom:
+        scale = 1 - ((z - z0) / cz) ** 2
+        rows = scale > 0
+        if not rows.any():
+            continue
+        shrink = np.sqrt(scale[rows])[:, None]
+        a2, b2 = a * shrink, b * shrink
+        r2 = (a2 * c) ** 2 + (b2 * sn) ** 2
+        t = s[None, :] - (x0 * c + y0 * sn)
+        inside = np.clip(r2 - t ** 2, 0, None)
+        proj[rows] += 2 * rho * a2 * b2 * np.sqrt(inside) / r2
+    return proj * (n / 2)
+
+
+class SimDetector:
+    """Publish phantom projections on a PvaServer at a fixed frame rate.
+
+    Parameters
+    ----------
+    image_pv, angle_pv : str
+        Names of the served NTNDArray and angle records.
+    n, nz : int
+        Image width and height.
+    dtype : str
+        'uint8', 'uint16' or 'float32'.
+    fps : float
+        Frame rate.
+    speed : float
+        Rotation speed in degrees per second.
+    jitter : float
+        Standard deviation in seconds added to every frame interval.
+    drop : float
+        Fraction of frames skipped (their uniqueId is not published), to
+        exercise the drop accounting of the consumers.
+    nangles : int
+        Projections are precomputed at this many angles over 360 degrees.
+    """
+
+    FIELDS = {'uint8': 'ubyteValue', 'uint16': 'ushortValue', 'float32': 'floatValue'}
+
+    def __init__(self, image_pv='2bmbSP1:Pva1:Image', angle_pv='SIM:m82.RBV',
+                 n=512, nz=256, dtype='uint8', fps=50.0, speed=18.0,
+                 jitter=0.0, drop=0.0, nangles=720, seed=0):
+        if dtype not in self.FIELDS:
+            raise ValueError(f'Unsupported dtype {dtype}')
+        self.n, self.nz, self.dtype = n, nz, dtype
+        self.fps, self.speed, self.jitter, self.drop = fps, speed, jitter, drop
+        self.nangles = nangles
+        self.rng = np.random.default_rng(seed)
+        self._cache = {}
+
+        self.frame = pva.NtNdArray()
+        self.frame['dimension'] = [{'size': n, 'fullSize': n, 'binning': 1},
+                                   {'size': nz, 'fullSize': nz, 'binning': 1}]
+        self.frame['value'] = ({self.FIELDS[dtype]: self._image(0)},)
+        self.angle = pva.PvObject({'value': pva.DOUBLE,
+                                   'timeStamp': {'secondsPastEpoch': pva.LONG,
+                                                 'nanoseconds': pva.INT}})
+        self.angle['value'] = 0.0
+        self.server = pva.PvaServer()
+        self.server.addRecord(image_pv, self.frame)
+        self.server.addRecord(angle_pv, self.angle)
+        self.image_pv, self.angle_pv = image_pv, angle_pv
+
+    def _image(self, angle):
+        k = int(round(angle / 360 * self.nangles)) % self.nangles
+        if k not in self._cache:
+            proj = project_phantom(2 * np.pi * k / self.nangles, self.n, self.nz)
+            if self.dtype == 'float32':
+                img = proj.astype('float32')
+            else:
+                top = np.iinfo(self.dtype).max
+                img = (np.exp(-proj / (0.5 * self.n)) * top).astype(self.dtype)
+            self._cache[k] = img.ravel()
+        return self._cache[k]
+
+    @staticmethod
+    def _stamp(t):
+        sec = int(t)
+        return {'secondsPastEpoch': sec, 'nanoseconds': int((t - sec) * 1e9)}
+
+    def run(self, nframes=None, duration=None):
+        """Publish frames until nframes or duration is reached (forever if both None).
+
+        Returns the number of frames published.
+        """
+        t0 = time.time()
+        tnext = time.perf_counter()
+        uid = 0
+        sent = 0
+        while (nframes is None or uid < nframes) and (duration is None or time.time() - t0 < duration):
+            tnext += 1 / self.fps + (self.rng.normal(0, self.jitter) if self.jitter else 0)
+            delay = tnext - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            uid += 1
+            now = time.time()
+            # continuous motor position, like a rotary stage readback
+            angle = (now - t0) * self.speed
+            self.angle['value'] = angle
+            self.angle['timeStamp'] = self._stamp(now)
+            self.server.update(self.angle_pv, self.angle)
+            if self.drop and self.rng.random() < self.drop:
+                continue
+            self.frame['value'] = ({self.FIELDS[self.dtype]: self._image(angle)},)
+            self.frame['uniqueId'] = uid
+            self.frame['timeStamp'] = self._stamp(now)
+            self.server.update(self.image_pv, self.frame)
+            sent += 1
+        return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--image-pv', default='2bmbSP1:Pva1:Image', help='NTNDArray record name')
+    parser.add_argument('--angle-pv', default='SIM:m82.RBV', help='Rotation angle record name')
+    parser.add_argument('--size', type=int, nargs=2, default=(512, 256), metavar=('N', 'NZ'),
+                        help='Image width and height')
+    parser.add_argument('--dtype', default='uint8', choices=sorted(SimDetector.FIELDS))
+    parser.add_argument('--fps', type=float, default=50.0, help='Frame rate')
+    parser.add_argument('--speed', type=float, default=18.0, help='Rotation speed in deg/s')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Frame interval jitter in s')
+    parser.add_argument('--drop', type=float, default=0.0, help='Fraction of frames dropped')
+    parser.add_argument('--duration', type=float, default=None, help='Run time in s (default: forever)')
+    args = parser.parse_args()
+
+    sim = SimDetector(args.image_pv, args.angle_pv, args.size[0], args.size[1], args.dtype,
+                      args.fps, args.speed, args.jitter, args.drop)
+    print(f'Serving {args.image_pv} ({args.size[0]}x{args.size[1]} {args.dtype} at '
+          f'{args.fps} fps) and {args.angle_pv}')
+    sent = sim.run(duration=args.duration)
+    print(f'{sent} frames published')
+
+
+if __name__ == '__main__':
+    main()
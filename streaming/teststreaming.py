@@ -1,8 +1,19 @@
+import os
+import sys
 import time
 import numpy as np
-from orthorec import *
+try:
+    from orthorec import OrthoRec
+    SEQ_ARG = False
+except ImportError:  # no GPU solver, use the incremental CPU backend
+    from orthorec_cpu import OrthoRec
+    SEQ_ARG = True  # updates only the slots whose snapshot seq changed
 import pvaccess as pva
 import threading
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'interlaced'))
+from angle_sequences import prime_vdc_angles
+from pvpublish import RecPublisher
+from projring import ProjectionRing
 
 
 def genang(numproj, nProj_per_rot):
@@ -14,37 +25,18 @@ numproj : int
 nmodes : int
     Number of projections per rotation.
     """
-    prime = 3
-    pst = 0
-    pend = 360
-    seq = []
-    i = 0
-    while len(seq) < numproj:
-        b = i
-        i += 1
-        r = 0
-        q = 1 / prime
-        while (b != 0):
-            a = np.mod(b, prime)
-            r += (a * q)
-            q /= prime
-            b = np.floor(b / prime)
-        r *= ((pend-pst) / nProj_per_rot)
-        k = 0
-        while (np.logical_and(len(seq) < numproj, k < nProj_per_rot)):
-            seq.append((pst + (r + k * (pend-pst) / nProj_per_rot))/180*np.pi)
-            k += 1
-    return seq
-
-
-def streaming(theta, nthetap):
+    seq = prime_vdc_angles(numproj, nProj_per_rot, 3, continuous_angle=False)
+    return (seq/180*np.pi).tolist()
+
+
+def streaming(theta, nthetap, max_rate=5, dtype=None, image_pv='2bmbSP1:Pva1:Image'):
     """
     Main computational function, take data from pvdata ('2bmbSP1:Pva1:Image'),
     reconstruct orthogonal slices and write the result to pvrec ('AdImage')
     """
 
     # init streaming pv for the detector
-    c = pva.Channel('2bmbSP1:Pva1:Image')
+    c = pva.Channel(image_pv)
     pvdata = c.get('')
     # take dimensions
     n = pvdata['dimension'][0]['size']
@@ -57,6 +49,9 @@ def streaming(theta, nthetap):
     pvrec['dimension'] = [{'size': 3*n, 'fullSize': 3*n, 'binning': 1},
                           {'size': n, 'fullSize': n, 'binning': 1}]
     s = pva.PvaServer('AdImage', pvrec)
+    # publish only new results, at most max_rate per second, optionally
+    # downcast to dtype ('uint8' or 'uint16') for preview clients
+    pub = RecPublisher(pvrec, max_rate=max_rate, dtype=dtype)
 
     # init with slices through the middle
     ix = n//2
@@ -66,15 +61,13 @@ def streaming(theta, nthetap):
     # I suggest using buffers that has only certain number of angles,
     # e.g. nhetap=50, this buffer is continuously update with monitoring
     # the detector pv (function addProjection), called inside pv monitor
-    databuffer = np.zeros([nthetap, nz, n], dtype='float32')
-    thetabuffer = np.zeros(nthetap, dtype='float32')
+    ring = ProjectionRing(nthetap, nz, n)
 
     def addProjection(pv):
         curid = pv['uniqueId']
-        databuffer[np.mod(curid, nthetap)] = pv['value'][0]['ubyteValue'].reshape(
-            nz, n).astype('float32')
-        thetabuffer[np.mod(curid, nthetap)] = theta[np.mod(
-            curid, ntheta)]  # take some theta with respect to id
+        ring.push(pv['value'][0]['ubyteValue'].reshape(nz, n),
+                  theta[np.mod(curid, ntheta)],  # take some theta with respect to id
+                  slot=np.mod(curid, nthetap))
     c.monitor(addProjection, '')
 
     # solver class on gpu
@@ -97,28 +90,28 @@ def streaming(theta, nthetap):
                     iz = newz
                     flgz = 1
 
-            # take interlaced projections and corresponding angles
-            # I guess there should be read/write locks here.
-            datap = databuffer.copy()
-            thetap = thetabuffer.copy()
-
-            print('data partition norm:', np.linalg.norm(datap))
-            print('partition angles:', thetap)
+            # take a consistent generation of interlaced projections and
+            # corresponding angles, the monitor keeps filling the other one
+            snap = ring.snapshot(timeout=1)
+            if snap is not None:
+                print('data partition norm:', np.linalg.norm(snap.data))
+                print('partition angles:', snap.theta)
 
-            # recover 3 ortho slices
-            recx, recy, recz = slv.rec_ortho(
-                datap, thetap, n//2, ix, iy, iz, flgx, flgy, flgz)
+                # recover 3 ortho slices
+                recx, recy, recz = slv.rec_ortho(
+                    snap.data, snap.theta, n//2, ix, iy, iz, flgx, flgy, flgz,
+                    **({'seq': snap.seq} if SEQ_ARG else {}))
 
-            # concatenate (supposing nz<n)
-            recall[:nz, :n] = recx
-            recall[:nz, n:2*n] = recy
-            recall[:, 2*n:] = recz
+                # concatenate (supposing nz<n)
+                recall[:nz, :n] = recx
+                recall[:nz, n:2*n] = recy
+                recall[:, 2*n:] = recz
 
             # 1s reconstruction rate
             time.sleep(1)
 
-            # write to pv
-            pvrec['value'] = ({'floatValue': recall.flatten()},)
+            # write to pv if there is something new
+            pub.publish(recall, changed=snap is not None)
 
 
 if __name__ == "__main__":
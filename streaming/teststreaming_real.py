@@ -1,8 +1,24 @@
+import os
+import sys
 import time
 import numpy as np
-from orthorec import *
+try:
+	from orthorec import OrthoRec
+	SEQ_ARG = False
+except ImportError:  # no GPU solver, use the incremental CPU backend
+	from orthorec_cpu import OrthoRec
+	SEQ_ARG = True  # updates only the slots whose snapshot seq changed
 import pvaccess as pva
 import threading
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'interlaced'))
+from angle_sequences import prime_vdc_angles
+from pvpublish import RecPublisher
+from anglebuffer import AngleBuffer, pv_timestamp
+from projring import ProjectionRing
+from flatfield import FlatDarkCorrector, frame_type, PROJECTION
+from recorder import StreamRecorder
+import atexit
+import argparse
 
 def genang(numproj, nProj_per_rot):
 	"""Interlaced angles generator
@@ -13,47 +29,34 @@ def genang(numproj, nProj_per_rot):
 	nmodes : int
 	Number of projections per rotation.
 	"""
-	prime = 3
-	pst = 0
-	pend = 360
-	seq = []
-	i = 0
-	while len(seq) < numproj:
-		b = i
-		i += 1
-		r = 0
-		q = 1 / prime
-		while (b != 0):
-			a = np.mod(b, prime)
-			r += (a * q)
-			q /= prime
-			b = np.floor(b / prime)
-		r *= ((pend-pst) / nProj_per_rot)
-		k = 0
-		while (np.logical_and(len(seq) < numproj, k < nProj_per_rot)):
-			seq.append((pst + (r + k * (pend-pst) / nProj_per_rot))/180*np.pi)
-			k += 1
-	return seq
+	seq = prime_vdc_angles(numproj, nProj_per_rot, 3, continuous_angle=False)
+	return (seq/180*np.pi).tolist()
 
 
-def streaming(theta, nthetap):
+def streaming(theta, nthetap, max_rate=5, dtype=None, image_pv='2bmbSP1:Pva1:Image',
+			  angle_pv='2bma:m82.RBV', angle_provider=pva.CA, record=None,
+			  duration=None, probe=None):
 	"""
 	Main computational function, take data from pvdata ('2bmbSP1:Pva1:Image'),
 	reconstruct orthogonal slices and write the result to pvrec ('AdImage')
+	(use angle_pv='SIM:m82.RBV', angle_provider=pva.PVA with simdetector.py)
+	and, if record is a .h5 or .zarr path, save all raw frames there.
+	Runs forever, or for duration seconds; probe gets timing callbacks
+	(see bench_streaming.py)
 	"""
 
 	# init streaming pv for the detector
-	channeldata = pva.Channel('2bmbSP1:Pva1:Image')
+	channeldata = pva.Channel(image_pv)
 	pvdata = channeldata.get('')
 	# take dimensions
 	n = pvdata['dimension'][0]['size']
 	nz = pvdata['dimension'][1]['size']
 
-	# init streaming pv for the angle
-	channeltheta = pva.Channel('2bma:m82.RBV', pva.CA)
-	# in contrast to pva.PVA interface, in the pva.CA the next call should 
-	# be run all the time before reading value
-	# pvtheta = channeltheta.get('value')	
+	# init streaming pv for the angle, monitored into a timestamped buffer
+	# so frames get the angle at their own timeStamp without a CA round trip
+	channeltheta = pva.Channel(angle_pv, angle_provider)
+	angles = AngleBuffer()
+	channeltheta.monitor(angles.add_pv, 'field(value,timeStamp)')
 		
 	# init streaming pv for reconstrucion with copuing dictionary from pvdata
 	pvdict = pvdata.getStructureDict()
@@ -62,6 +65,9 @@ def streaming(theta, nthetap):
 	pvrec['dimension'] = [{'size': 3*n, 'fullSize': 3*n, 'binning': 1},
 						  {'size': n, 'fullSize': n, 'binning': 1}]
 	s = pva.PvaServer('AdImage', pvrec)
+	# publish only new results, at most max_rate per second, optionally
+	# downcast to dtype ('uint8' or 'uint16') for preview clients
+	pub = RecPublisher(pvrec, max_rate=max_rate, dtype=dtype)
 
 	# init with slices through the middle
 	ix = n//2
@@ -71,22 +77,35 @@ def streaming(theta, nthetap):
 	# I suggest using buffers that has only certain number of angles,
 	# e.g. nhetap=50, this buffer is continuously update with monitoring
 	# the detector pv (function addProjection), called inside pv monitor
-	databuffer = np.zeros([nthetap, nz, n], dtype='float32')
-	thetabuffer = np.zeros(nthetap, dtype='float32')
-	bufferid = np.zeros([1], dtype='int32')
-	flgrecompute = np.zeros([1], dtype='bool')
-	
+	ring = ProjectionRing(nthetap, nz, n)
+	# running dark/flat averages, projections are corrected before buffering
+	ffc = FlatDarkCorrector(nz, n)
+	# raw frames are saved by a background thread, never blocking the monitor
+	recorder = None
+	if record is not None:
+		recorder = StreamRecorder(record, (nz, n), 'uint8', compression='auto').start()
+		atexit.register(recorder.stop)
 	
 	def addProjection(pv):
 		#curid = pv['uniqueId']
-		lasttheta = thetabuffer[bufferid[0]]
-		curtheta = channeltheta.get('value')['value']
-		if(np.abs(curtheta-lasttheta)>1e-3):
-			bufferid[0] = np.mod(bufferid[0]+1,nthetap)			
-			databuffer[bufferid[0]] = pv['value'][0]['ubyteValue'].reshape(nz, n).astype('float32')
-			thetabuffer[bufferid[0]] = curtheta
-			# do reconstrcution
-			flgrecompute[0] = True
+		frame = pv['value'][0]['ubyteValue'].reshape(nz, n)
+		key = frame_type(pv)
+		ts = pv_timestamp(pv)
+		if probe is not None:
+			probe.frame(pv, ts)
+		curtheta = angles.angle_at(ts)
+		if recorder is not None:
+			recorder.put(frame, pv['uniqueId'], ts, np.nan if curtheta is None else curtheta, key)
+		if key != PROJECTION:
+			ffc.process(frame, key)
+			return
+		lasttheta = ring.last_theta
+		if curtheta is None:
+			return
+		if(lasttheta is None or np.abs(curtheta-lasttheta)>1e-3):
+			ring.push(ffc.correct(frame), curtheta)
+			if probe is not None:
+				probe.pushed(ring.count - 1, ts)
 			
 	channeldata.monitor(addProjection, '')
 	
@@ -95,7 +114,8 @@ def streaming(theta, nthetap):
 	with OrthoRec(nthetap, n, nz) as slv:
 		# memory for result slices
 		recall = np.zeros([n, 3*n], dtype='float32')
-		while(True):  # infinite loop over angular partitions
+		t0 = time.perf_counter()
+		while duration is None or time.perf_counter() - t0 < duration:  # loop over angular partitions
 			flgx, flgy, flgz = 0, 0, 0 # recompute slice from 0 or not
 
 			# new = take ix,iy,iz from gui
@@ -112,18 +132,16 @@ def streaming(theta, nthetap):
 					iz = newz
 					flgz = 1
 
-			# if the last angle in buffer has been change then recompute
-			if(flgrecompute[0]):
-				# take interlaced projections and corresponding angles
-				# I guess there should be read/write locks here.			
-				datap = databuffer.copy()
-				thetap = thetabuffer.copy()
-				
-				# print('data partition norm:', np.linalg.norm(datap))
-				# print('partition angles:', thetap)
+			# if new projections came in then recompute on a consistent
+			# generation of the ring, the monitor keeps filling the other one
+			snap = ring.snapshot()
+			if(snap is not None):
+				# print('data partition norm:', np.linalg.norm(snap.data))
+				# print('partition angles:', snap.theta)
 				# recover 3 ortho slices
 				recx, recy, recz = slv.rec_ortho(
-					datap, thetap*np.pi/180, n//2, ix, iy, iz, flgx, flgy, flgz)
+					snap.data, snap.theta*np.pi/180, n//2, ix, iy, iz, flgx, flgy, flgz,
+					**({'seq': snap.seq} if SEQ_ARG else {}))
 
 				# concatenate (supposing nz<n)
 				recall[:nz, :n] = recx
@@ -132,19 +150,33 @@ def streaming(theta, nthetap):
 				# divide by the ttal number of recon to have the same amplitude
 				irec+=1	
 				recall/=(irec)
-				
-				flgrecompute[0] = False		
+				if irec % 50 == 0:
+					print('angle matching:', angles.stats())
+					print('flat/dark correction:', ffc.stats())
+					if recorder is not None:
+						print('recorder:', recorder.stats())
+						if recorder.error is not None:
+							print('ERROR: recording stopped:', recorder.error)
 				
 			# 1s reconstruction rate
 			time.sleep(0.2)
 
-			# write to pv
-			pvrec['value'] = ({'floatValue': recall.flatten()},)
+			# write to pv if there is something new
+			published = pub.publish(recall, changed=snap is not None)
+			if probe is not None and snap is not None:
+				probe.reconstructed(snap, published)
+	channeldata.stopMonitor()
+	channeltheta.stopMonitor()
 
 
 if __name__ == "__main__":
 
+	parser = argparse.ArgumentParser(description='Streaming orthoslice reconstruction.')
+	parser.add_argument('--record', default=None,
+						help='Save the raw frames to this .h5 file or .zarr directory')
+	args = parser.parse_args()
+
 	ntheta = 1500
 	nthetap = 50  # buffer size, and number of angles per rotation
 	theta = np.array(genang(ntheta, nthetap), dtype='float32')
-	streaming(theta, nthetap)
+	streaming(theta, nthetap, record=args.record)
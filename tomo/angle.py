@@ -1,8 +1,12 @@
+import os
 import sys
 import argparse
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'interlaced'))
+from angle_sequences import prime_vdc_angles
+
 
 def interlaced_angle_sequence(nproj_total, nproj_per_rot, prime, continuous_angle=True):
     """Generate a sequence of interlaced angled
@@ -22,40 +26,7 @@ def interlaced_angle_sequence(nproj_total, nproj_per_rot, prime, continuous_angl
         1D numpy array containing the interlaced rotation angles
     """
 
-
-
-    seq = []
-    i = 0
-
-    while len(seq) < nproj_total:
-
-        b = i
-        i += 1
-        r = 0
-        q = 1 / prime
-
-        while (b != 0):
-            a = np.mod(b, prime)
-            r += (a * q)
-            q /= prime
-            b = np.floor(b / prime)
-        r *= (360.0 / nproj_per_rot)
-
-        k = 0
-        while (np.logical_and(len(seq) < nproj_total, k < nproj_per_rot)):
-            seq.append(r + k * 360.0 / nproj_per_rot )
-            k += 1
-
-    if continuous_angle:
-        j = 0
-        for x in range(len(seq)):       
-            if (x%nproj_per_rot == 0):
-                for y in range(nproj_per_rot):
-                    if (x+y) < len(seq):
-                        seq[x+y] += j*360.0
-                j += 1
-
-    return np.array(seq)
+    return prime_vdc_angles(nproj_total, nproj_per_rot, prime, continuous_angle)
 
 def main(arg):
 
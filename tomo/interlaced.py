@@ -1,3 +1,4 @@
+import os
 import sys
 import math
 import argparse
@@ -5,6 +6,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 import log
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'interlaced'))
+from angle_sequences import prime_vdc_angles
+
 
 def _compute_senses():
     '''Computes whether this motion will be increasing or decreasing encoder counts.
@@ -62,42 +66,7 @@ def compute_positions_PSO(rotation_start, rotation_step, num_angles, PSOCountsPe
 
 def sequence(nproj_total, nproj_per_rot, prime, continuous_angle=True):
 
-    # seq = np.array((nproj_total * nproj_per_rot))
-    seq = []
-    # nproj_per_rot = int(nproj_per_rot)
-    # print (len(seq))
-    i = 0
-
-    while len(seq) < nproj_total:
-
-        b = i
-        i += 1
-        r = 0
-        q = 1 / prime
-
-        while (b != 0):
-            a = np.mod(b, prime)
-            r += (a * q)
-            # print (b, r, a, q)
-            q /= prime
-            b = np.floor(b / prime)
-        r *= (360.0 / nproj_per_rot)
-
-        k = 0
-        while (np.logical_and(len(seq) < nproj_total, k < nproj_per_rot)):
-            seq.append(r + k * 360.0 / nproj_per_rot )
-            k += 1
-
-    if continuous_angle:
-        j = 0
-        for x in range(len(seq)):       
-            if (x%nproj_per_rot == 0):
-                for y in range(nproj_per_rot):
-                    if (x+y) < len(seq):
-                        seq[x+y] += j*360.0
-                j += 1
-
-    return seq
+    return prime_vdc_angles(nproj_total, nproj_per_rot, prime, continuous_angle).tolist()
 
 def main(arg):
 
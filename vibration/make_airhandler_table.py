@@ -4,12 +4,16 @@ Generate an RST table summarizing runs and air handler status from a folder of H
 
 Usage:
     python make_airhandler_table.py /path/to/folder > airhandler_table.rst
+
+The metadata is read through the folder's metadata catalog (see
+meta_catalog.py), so only new or modified files are opened.
 """
 
 import os
 import sys
 
 from meta.read_meta import Hdf5MetadataReader
+from meta_catalog import CATALOG_NAME, MetaCatalog
 
 # ----------------------------------------------------------------------
 # Configuration
@@ -113,15 +117,18 @@ def _normalize_start_time(v):
     return str(v).strip()
 
 
-def collect_row_for_file(path: str):
+def collect_row_for_file(path: str, meta_dict=None):
     """
     Given the path to an HDF5 file, extract:
         - start_time
         - run (from file name)
         - fps_str (from file name)
         - air handler status list (in order of AIR_HANDLER_KEYS)
+
+    meta_dict, if given, is used instead of reading the file.
     """
-    meta_dict = read_metadata(path)
+    if meta_dict is None:
+        meta_dict = read_metadata(path)
 
     raw_start_time = get_meta_value(meta_dict, START_DATE_KEY, "")
     start_time = _normalize_start_time(raw_start_time)
@@ -210,7 +217,7 @@ def format_table_row(start_time, run, fps_str, air_values,
 # ----------------------------------------------------------------------
 def main(folder):
     files = [
-        os.path.join(folder, f)
+        os.path.abspath(os.path.join(folder, f))
         for f in sorted(os.listdir(folder))
         if f.lower().endswith(".h5")
     ]
@@ -219,6 +226,13 @@ def main(folder):
         print(f"No .h5 files found in {folder}", file=sys.stderr)
         sys.exit(1)
 
+    keys = [START_DATE_KEY] + AIR_HANDLER_KEYS
+    with MetaCatalog(os.path.join(folder, CATALOG_NAME), keys) as cat:
+        # the exact file list: refresh() globs case-sensitively and would miss .H5
+        cat.update(files)
+        catalog = cat.query(keys, root=folder)
+        errors = cat.errors()
+
     header_lines, w_start, w_run, w_fps, w_ah, border = make_table_header()
 
     print("Vibration runs and air handler configuration")
@@ -234,11 +248,13 @@ def main(folder):
 
     # Rows
     for path in files:
-        try:
-            start_time, run, fps_str, air_values = collect_row_for_file(path)
-        except Exception as exc:
-            print(f"# WARNING: could not read metadata for {path}: {exc}", file=sys.stderr)
+        if path in errors:
+            print(f"# WARNING: could not read metadata for {path}: {errors[path]}", file=sys.stderr)
             continue
+        if path not in catalog:
+            print(f"# WARNING: no cataloged metadata for {path}", file=sys.stderr)
+        start_time, run, fps_str, air_values = collect_row_for_file(
+            path, catalog.get(path, {}))
 
         row = format_table_row(start_time, run, fps_str, air_values,
                                w_start, w_run, w_fps, w_ah)
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Persistent SQLite catalog of selected HDF5 metadata for all files under a folder.
+
+Opening every HDF5 file of a folder just to pull a few metadata keys takes
+minutes on big folders. The catalog keeps those keys in an SQLite database
+(by default ``.meta_catalog.sqlite`` in the folder), re-reads only files whose
+size or modification time changed since the last refresh, spreads the reads
+over a process pool, and answers queries from the database.
+
+Usage:
+    # Index (or refresh) and print start_date and AirHandlerS01 for all files
+    python meta_catalog.py /path/to/folder \\
+        --key /process/acquisition/start_date --key /air_handlers/AirHandlerS01
+
+    # Same as library
+    with MetaCatalog('/path/to/folder/.meta_catalog.sqlite', keys) as cat:
+        cat.refresh('/path/to/folder')
+        rows = cat.query(keys)
+"""
+
+import argparse
+import glob
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from meta.read_meta import Hdf5MetadataReader
+
+CATALOG_NAME = ".meta_catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path   TEXT PRIMARY KEY,
+    size   INTEGER,
+    mtime  REAL,
+    keyset TEXT,
+    error  TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    path  TEXT,
+    key   TEXT,
+    value TEXT,
+    unit  TEXT,
+    PRIMARY KEY (path, key)
+);
+CREATE INDEX IF NOT EXISTS meta_key ON meta (key);
+"""
+
+
+def _to_python(v):
+    """Make a metadata value JSON serializable."""
+    if isinstance(v, bytes):
+        return v.decode("utf-8", "replace")
+    if hasattr(v, "tolist"):
+        v = v.tolist()
+    if isinstance(v, bytes):
+        return v.decode("utf-8", "replace")
+    if isinstance(v, (list, tuple)):
+        return [_to_python(x) for x in v]
+    return v
+
+
+def read_file_meta(path, keys=None):
+    """Read the selected metadata keys of one file (runs in a worker process).
+
+    Returns
+    -------
+    tuple
+        ``(path, {key: (value, unit)}, error)``; ``error`` is ``None`` on success.
+    """
+    try:
+        mp = Hdf5MetadataReader(path)
+        meta_dict = mp.readMetadata()
+        mp.close()
+    except Exception as exc:
+        return path, {}, str(exc)
+    if keys is not None:
+        meta_dict = {k: meta_dict[k] for k in keys if k in meta_dict}
+    out = {}
+    for key, v in meta_dict.items():
+        if isinstance(v, (list, tuple)) and len(v) == 2:
+            value, unit = v
+        else:
+            value, unit = v, None
+        out[key] = (_to_python(value), _to_python(unit))
+    return path, out, None
+
+
+class MetaCatalog:
+    """SQLite-backed metadata catalog.
+
+    Parameters
+    ----------
+    db_path : str
+        SQLite database file; created if missing.
+    keys : list of str, optional
+        Metadata keys to index. All keys if ``None``.
+    """
+
+    def __init__(self, db_path, keys=None):
+        self.db_path = db_path
+        self.keys = sorted(keys) if keys is not None else None
+        self._db = sqlite3.connect(db_path)
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def stale_files(self, paths):
+        """Files that need reading, with the keys to read.
+
+        A file is fresh when its size and mtime match the catalog and the
+        keys read from it so far cover the requested ones, so tools asking
+        for different keys share one catalog without re-reading each other's
+        files.
+
+        Returns
+        -------
+        dict
+            ``{path: (keys, changed)}`` where ``keys`` are the keys to read
+            (``None`` for all) and ``changed`` tells whether the file itself
+            changed, making every cataloged value of it stale.
+        """
+        known = {p: (s, m, k) for p, s, m, k in
+                 self._db.execute("SELECT path, size, mtime, keyset FROM files")}
+        stale = {}
+        for path in paths:
+            st = os.stat(path)
+            entry = known.get(path)
+            if entry is None or entry[:2] != (st.st_size, st.st_mtime):
+                stale[path] = (self.keys, True)
+                continue
+            have = json.loads(entry[2])
+            if have is None:
+                continue
+            if self.keys is None:
+                stale[path] = (None, False)
+                continue
+            missing = sorted(set(self.keys) - set(have))
+            if missing:
+                stale[path] = (missing, False)
+        return stale
+
+    def refresh(self, root, pattern="*.h5", recursive=True, workers=None):
+        """Bring the catalog up to date with the files under ``root``.
+
+        Returns
+        -------
+        tuple
+            Number of files (re)read and number of files dropped because they
+            no longer exist.
+        """
+        if recursive:
+            paths = glob.glob(os.path.join(root, "**", pattern), recursive=True)
+        else:
+            paths = glob.glob(os.path.join(root, pattern))
+        paths = sorted(os.path.abspath(p) for p in paths)
+
+        present = set(paths)
+        prefix = os.path.join(os.path.abspath(root), "")
+        gone = [p for (p,) in self._db.execute("SELECT path FROM files")
+                if p.startswith(prefix) and p not in present]
+        with self._db:
+            self._db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in gone])
+            self._db.executemany("DELETE FROM meta WHERE path = ?", [(p,) for p in gone])
+        return self.update(paths, workers), len(gone)
+
+    def update(self, paths, workers=None):
+        """Read the requested keys of the given files where the catalog lacks them.
+
+        Returns
+        -------
+        int
+            Number of files read.
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        stale = self.stale_files(paths)
+        if not stale:
+            return 0
+        stats = {p: os.stat(p) for p in stale}
+        known = dict(self._db.execute("SELECT path, keyset FROM files"))
+        todo = sorted(stale)
+
+        workers = workers or min(len(todo), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(read_file_meta, todo, [stale[p][0] for p in todo],
+                               chunksize=max(1, len(todo) // (4 * workers)))
+            with self._db:
+                for path, meta, error in results:
+                    st = stats[path]
+                    keys, changed = stale[path]
+                    if changed or keys is None:
+                        self._db.execute("DELETE FROM meta WHERE path = ?", (path,))
+                        keyset = keys
+                    else:
+                        self._db.executemany(
+                            "DELETE FROM meta WHERE path = ? AND key = ?",
+                            [(path, k) for k in keys])
+                        keyset = sorted(set(json.loads(known[path])) | set(keys))
+                    self._db.executemany(
+                        "INSERT INTO meta (path, key, value, unit) VALUES (?, ?, ?, ?)",
+                        [(path, k, json.dumps(v), u if u is None else json.dumps(u))
+                         for k, (v, u) in meta.items()])
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO files (path, size, mtime, keyset, error) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (path, st.st_size, st.st_mtime, json.dumps(keyset), error))
+        return len(todo)
+
+    def query(self, keys, root=None):
+        """Values of ``keys`` for every cataloged file.
+
+        Returns
+        -------
+        dict
+            ``{path: {key: value}}`` ordered by path; missing keys are absent.
+        """
+        sql = ("SELECT path, key, value FROM meta WHERE key IN (%s)"
+               % ",".join("?" * len(keys)))
+        args = list(keys)
+        if root is not None:
+            # LIKE is case-insensitive and treats _ and % as wildcards...
+            prefix = os.path.join(os.path.abspath(root), "")
+            sql += " AND substr(path, 1, ?) = ?"
+            args += [len(prefix), prefix]
+        rows = {}
+        for path, key, value in self._db.execute(sql + " ORDER BY path", args):
+            rows.setdefault(path, {})[key] = json.loads(value)
+        return rows
+
+    def errors(self):
+        """Files that could not be read, with the error message."""
+        return dict(self._db.execute(
+            "SELECT path, error FROM files WHERE error IS NOT NULL ORDER BY path"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Folder to index")
+    parser.add_argument("--db", help=f"Catalog file (default: <folder>/{CATALOG_NAME})")
+    parser.add_argument("--key", action="append", dest="keys",
+                        help="Metadata key to index (repeat); all keys if omitted")
+    parser.add_argument("--pattern", default="*.h5", help="File name pattern")
+    parser.add_argument("--workers", type=int, default=None, help="Reader processes")
+    args = parser.parse_args()
+
+    db = args.db or os.path.join(args.folder, CATALOG_NAME)
+    with MetaCatalog(db, args.keys) as cat:
+        t0 = time.perf_counter()
+        nread, ngone = cat.refresh(args.folder, args.pattern, workers=args.workers)
+        t1 = time.perf_counter()
+        print(f"Refreshed {nread} files ({ngone} removed) in {t1 - t0:.2f} s",
+              file=sys.stderr)
+        for path, error in cat.errors().items():
+            print(f"# WARNING: could not read metadata for {path}: {error}", file=sys.stderr)
+        if args.keys:
+            rows = cat.query(args.keys, root=args.folder)
+            print(f"Query: {len(rows)} files in {(time.perf_counter() - t1) * 1e3:.1f} ms",
+                  file=sys.stderr)
+            for path, values in rows.items():
+                print(os.path.basename(path), *[values.get(k, "") for k in args.keys], sep="\t")
+
+
+if __name__ == "__main__":
+    main()
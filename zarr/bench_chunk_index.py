@@ -0,0 +1,109 @@
+"""
+bench_chunk_index.py — compare per-chunk and bulk HDF5 chunk-index extraction.
+
+Writes a synthetic chunked HDF5 file (10^6 chunks by default) and times
+
+  * the original ``Hdf5ToZarr.storage_info`` loop: one ``get_chunk_info``
+    call and one dict per chunk, and
+  * ``ChunkIndex.from_dataset``: a single chunk B-tree walk filling NumPy
+    arrays.
+
+Usage
+-----
+    python bench_chunk_index.py                      # 1000 x 1000 x 16 data, 1 x 1 x 16 chunks
+    python bench_chunk_index.py --nproj 100 --keep /tmp/bench.h5
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import h5py
+import numpy as np
+
+from chunk_index import ChunkIndex
+
+
+def legacy_storage_info(dset):
+    """The original per-chunk loop of ``Hdf5ToZarr.storage_info``."""
+    dsid = dset.id
+    stinfo = dict()
+    chunk_size = dset.chunks
+    for index in range(dsid.get_num_chunks()):
+        blob = dsid.get_chunk_info(index)
+        key = tuple(
+            [a // b for a, b in zip(blob.chunk_offset, chunk_size)])
+        stinfo[key] = {'offset': blob.byte_offset,
+                       'size': blob.size}
+    return stinfo
+
+
+def make_file(fname, nproj, ny, nx, chunks):
+    """Write a uint8 dataset with one small chunk per (chunks) block."""
+    with h5py.File(fname, 'w') as f:
+        dset = f.create_dataset('exchange/data', shape=(nproj, ny, nx),
+                                dtype=np.uint8, chunks=chunks)
+        for start in range(0, nproj, chunks[0] * 100):
+            stop = min(start + chunks[0] * 100, nproj)
+            dset[start:stop] = (np.arange(stop - start, dtype=np.uint8)
+                                [:, None, None])
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def bench(fname, args):
+    """Time both extractions on fname, writing it first if it does not exist."""
+    if not os.path.exists(fname):
+        print(f'Writing synthetic file {fname} ...', flush=True)
+        make_file(fname, args.nproj, args.ny, args.nx, tuple(args.chunks))
+
+    with h5py.File(fname, 'r') as f:
+        dset = f['exchange/data']
+        num_chunks = dset.id.get_num_chunks()
+        print(f'{dset.shape} chunks={dset.chunks}: {num_chunks} chunks')
+        print(f'chunk_iter available: {hasattr(dset.id, "chunk_iter")}')
+
+        t_legacy, t_bulk, t_lazy = [], [], []
+        for _ in range(args.repeat):
+            legacy, dt = timed(legacy_storage_info, dset)
+            t_legacy.append(dt)
+            index, dt = timed(ChunkIndex.from_dataset, dset)
+            t_bulk.append(dt)
+            _, dt = timed(index.as_dict)
+            t_lazy.append(dt)
+
+    if legacy != index.as_dict():
+        raise RuntimeError('Bulk index does not match the per-chunk loop')
+
+    print(f'{"per-chunk loop":<24} {min(t_legacy):8.3f} s')
+    print(f'{"bulk index":<24} {min(t_bulk):8.3f} s'
+          f'  ({min(t_legacy) / min(t_bulk):.1f}x)')
+    print(f'{"bulk index + dict":<24} {min(t_bulk) + min(t_lazy):8.3f} s')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--nproj', type=int, default=1000, help='Number of projections')
+    ap.add_argument('--ny', type=int, default=1000, help='Rows per projection')
+    ap.add_argument('--nx', type=int, default=16, help='Columns per projection')
+    ap.add_argument('--chunks', type=int, nargs=3, default=(1, 1, 16),
+                    help='HDF5 chunk shape (default: 1 1 16)')
+    ap.add_argument('--repeat', type=int, default=3, help='Timing repeats')
+    ap.add_argument('--keep', metavar='FILE', help='Write (or reuse) the synthetic file here')
+    args = ap.parse_args()
+
+    if args.keep:
+        bench(args.keep, args)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            bench(os.path.join(tmp, 'bench_chunk_index.h5'), args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+# Requirements:
+# hdf5>=1.10.5
+# h5py>=3.0 (h5py>=3.8 built against hdf5>=1.12.3 for the single-pass walk)
+
+import io
+import json
+import logging
+import os
+from collections.abc import Mapping
+import numpy as np
+
+lggr = logging.getLogger('h5-to-zarr')
+lggr.addHandler(logging.NullHandler())
+
+
+def read_chunk_index(dsid, chunks, num_chunks=None):
+    """Read the storage location of every chunk of a chunked HDF5 dataset.
+
+    The chunk B-tree is walked once with ``H5Dchunk_iter`` when the h5py/HDF5
+    build provides it; otherwise every chunk is queried with
+    ``H5Dget_chunk_info``. Either way the results go straight into
+    preallocated NumPy arrays.
+
+    Parameters
+    ----------
+    dsid : h5py.h5d.DatasetID
+        Low-level identifier of the HDF5 dataset.
+    chunks : tuple of int
+        Chunk shape of the HDF5 dataset.
+    num_chunks : int, optional
+        Number of allocated chunks. Queried from ``dsid`` if not given.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Chunk grid coordinates (``num_chunks`` x rank), file byte offsets,
+        stored sizes and filter masks. All ``int64`` except the filter masks
+        (``uint32``).
+    """
+    if num_chunks is None:
+        num_chunks = dsid.get_num_chunks()
+    rank = len(chunks)
+    coords = np.empty((num_chunks, rank), dtype=np.int64)
+    offsets = np.empty(num_chunks, dtype=np.int64)
+    sizes = np.empty(num_chunks, dtype=np.int64)
+    masks = np.empty(num_chunks, dtype=np.uint32)
+
+    if hasattr(dsid, 'chunk_iter'):
+        count = 0
+
+        def visit(blob):
+            nonlocal count
+            coords[count] = blob.chunk_offset
+            offsets[count] = blob.byte_offset
+            sizes[count] = blob.size
+            masks[count] = blob.filter_mask
+            count += 1
+
+        dsid.chunk_iter(visit)
+        if count != num_chunks:
+            raise RuntimeError(
+                f'Chunk walk visited {count} of {num_chunks} chunks')
+    else:
+        lggr.debug('H5Dchunk_iter not available, querying chunks one by one')
+        for index in range(num_chunks):
+            blob = dsid.get_chunk_info(index)
+            coords[index] = blob.chunk_offset
+            offsets[index] = blob.byte_offset
+            sizes[index] = blob.size
+            masks[index] = blob.filter_mask
+
+    # Element offsets -> chunk grid coordinates...
+    coords //= np.asarray(chunks, dtype=np.int64)
+    return coords, offsets, sizes, masks
+
+
+class ChunkIndex(Mapping):
+    """Array-backed storage information of one HDF5 dataset.
+
+    Behaves as a read-only mapping from chunk grid coordinates (tuples) to
+    ``{'offset': ..., 'size': ...}`` dicts, the same layout
+    ``Hdf5ToZarr.storage_info`` has always returned. The per-chunk dicts are
+    only built the first time a mapping lookup needs them; bulk consumers
+    should use the ``coords``, ``offsets`` and ``sizes`` arrays directly.
+
+    Parameters
+    ----------
+    coords : numpy.ndarray
+        Chunk grid coordinates, one row per chunk.
+    offsets : numpy.ndarray
+        File byte offset of every chunk.
+    sizes : numpy.ndarray
+        Stored (filtered) size of every chunk in bytes.
+    masks : numpy.ndarray, optional
+        HDF5 filter mask of every chunk. Non-zero means some optional filter
+        was skipped for that chunk.
+    """
+
+    def __init__(self, coords, offsets, sizes, masks=None):
+        self.coords = coords
+        self.offsets = offsets
+        self.sizes = sizes
+        if masks is None:
+            masks = np.zeros(len(offsets), dtype=np.uint32)
+        self.masks = masks
+        self._dict = None
+
+    @classmethod
+    def from_dataset(cls, dset):
+        """Collect storage information of an HDF5 dataset.
+
+        Parameters
+        ----------
+        dset : h5py.Dataset
+            HDF5 dataset for which to collect storage information.
+
+        Returns
+        -------
+        ChunkIndex
+            Storage information, empty if no data was ever written.
+        """
+        # Empty (null) dataset...
+        if dset.shape is None:
+            return cls.empty(0)
+
+        dsid = dset.id
+        rank = len(dset.shape) or 1
+        if dset.chunks is None:
+            # Contiguous dataset...
+            if dsid.get_offset() is None:
+                # No data ever written...
+                return cls.empty(rank)
+            return cls(np.zeros((1, rank), dtype=np.int64),
+                       np.array([dsid.get_offset()], dtype=np.int64),
+                       np.array([dsid.get_storage_size()], dtype=np.int64))
+
+        # Chunked dataset...
+        num_chunks = dsid.get_num_chunks()
+        if num_chunks == 0:
+            # No data ever written...
+            return cls.empty(rank)
+        return cls(*read_chunk_index(dsid, dset.chunks, num_chunks))
+
+    @classmethod
+    def empty(cls, rank):
+        return cls(np.empty((0, rank), dtype=np.int64),
+                   np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        """Total stored size of all chunks in bytes."""
+        return int(self.sizes.sum())
+
+    def chunk_keys(self, prefix='', separator='.'):
+        """Zarr chunk keys of all chunks, in index order."""
+        return [prefix + separator.join(map(str, c))
+                for c in self.coords.tolist()]
+
+    def as_dict(self):
+        """Per-chunk storage information as a dict of dicts (cached)."""
+        if self._dict is None:
+            self._dict = {
+                tuple(c): {'offset': o, 'size': s}
+                for c, o, s in zip(self.coords.tolist(),
+                                   self.offsets.tolist(),
+                                   self.sizes.tolist())}
+        return self._dict
+
+    def __getitem__(self, key):
+        return self.as_dict()[key]
+
+    def __iter__(self):
+        return iter(self.as_dict())
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return f'<ChunkIndex: {len(self)} chunks, {self.nbytes} bytes>'
+
+
+# Binary chunk manifest: a small JSON header plus a dense int64 table with one
+# (offset, size, source) row per cell of the chunk grid, in C order. Missing
+# chunks have offset -1 and size 0. The table is stored in .npy format so a
+# directory store can memory-map it and look up any chunk in O(1).
+manifest_meta_key = '.zchunkmanifest'
+manifest_table_key = '.zchunktable'
+manifest_format = 1
+
+
+def _chunk_grid(shape, chunks):
+    if not shape:
+        # Scalar arrays have one chunk with key '0'...
+        return (1,)
+    return tuple(-(-s // c) for s, c in zip(shape, chunks))
+
+
+def _store_file(store, key):
+    """Path of ``key`` in a directory-backed store, ``None`` otherwise."""
+    root = getattr(store, 'path', None)
+    if isinstance(root, str) and os.path.isdir(root):
+        fname = os.path.join(root, *key.split('/'))
+        if os.path.isfile(fname):
+            return fname
+    return None
+
+
+def manifest_table(index, shape, chunks, source_ids=None):
+    """Scatter a ``ChunkIndex`` into a dense manifest table.
+
+    Parameters
+    ----------
+    index : ChunkIndex
+        Chunk storage information.
+    shape, chunks : tuple of int
+        Shape and chunk shape of the Zarr array.
+    source_ids : numpy.ndarray, optional
+        Index into the manifest ``sources`` list for every chunk. All chunks
+        come from source 0 if not given.
+
+    Returns
+    -------
+    numpy.ndarray
+        ``int64`` table of shape (number of grid cells, 3).
+    """
+    grid = _chunk_grid(shape, chunks)
+    table = np.zeros((int(np.prod(grid)), 3), dtype=np.int64)
+    table[:, 0] = -1
+    if len(index):
+        flat = np.ravel_multi_index(tuple(index.coords.T), grid)
+        table[flat, 0] = index.offsets
+        table[flat, 1] = index.sizes
+        if source_ids is not None:
+            table[flat, 2] = source_ids
+    return table
+
+
+def write_manifest(store, path, shape, chunks, table, sources):
+    """Write a binary chunk manifest next to a Zarr array's metadata.
+
+    Parameters
+    ----------
+    store : MutableMapping
+        Zarr store.
+    path : str
+        Zarr array path in the store.
+    shape, chunks : tuple of int
+        Shape and chunk shape of the Zarr array.
+    table : numpy.ndarray
+        Dense manifest table, see ``manifest_table``.
+    sources : list of dict
+        Chunk sources; each has ``uri`` and ``array_name`` keys.
+    """
+    prefix = path + '/' if path else ''
+    grid = _chunk_grid(shape, chunks)
+    if table.shape != (int(np.prod(grid)), 3):
+        raise ValueError(f'{path}: manifest table does not match chunk grid')
+    header = {'format': manifest_format,
+              'shape': list(shape),
+              'chunks': list(chunks),
+              'grid': list(grid),
+              'nchunks': int(np.count_nonzero(table[:, 0] >= 0)),
+              'sources': list(sources)}
+    buf = io.BytesIO()
+    np.lib.format.write_array(buf, np.ascontiguousarray(table),
+                              allow_pickle=False)
+    store[prefix + manifest_table_key] = buf.getvalue()
+    store[prefix + manifest_meta_key] = json.dumps(
+        header, indent=4, sort_keys=True).encode('ascii')
+
+
+class ChunkManifest:
+    """Reader of a binary chunk manifest.
+
+    Only the JSON header is parsed; the table is memory-mapped when the store
+    lives on a local file system and read as one blob otherwise.
+
+    Parameters
+    ----------
+    header : dict
+        Manifest header.
+    table : numpy.ndarray
+        Dense (offset, size, source) table.
+    """
+
+    def __init__(self, header, table):
+        if header.get('format') != manifest_format:
+            raise ValueError(
+                f'Unsupported chunk manifest format: {header.get("format")}')
+        self.header = header
+        self.table = table
+        self.grid = tuple(header['grid'])
+        self.sources = header['sources']
+
+    @classmethod
+    def open(cls, store, path=''):
+        """Open the manifest of the Zarr array at ``path`` in ``store``."""
+        prefix = path + '/' if path else ''
+        header = json.loads(store[prefix + manifest_meta_key])
+        fname = _store_file(store, prefix + manifest_table_key)
+        if fname is not None:
+            table = np.load(fname, mmap_mode='r', allow_pickle=False)
+        else:
+            table = np.load(io.BytesIO(store[prefix + manifest_table_key]),
+                            allow_pickle=False)
+        return cls(header, table)
+
+    def __len__(self):
+        return self.header['nchunks']
+
+    def byte_range(self, coords):
+        """File location of the chunk at chunk grid coordinates ``coords``.
+
+        Returns
+        -------
+        tuple or None
+            ``(source, offset, size)`` with ``source`` one of the manifest
+            ``sources`` dicts, or ``None`` if the chunk was never written.
+        """
+        offset, size, src = self.table[np.ravel_multi_index(coords, self.grid)]
+        if offset < 0:
+            return None
+        return self.sources[src], int(offset), int(size)
+
+    def chunk_byte_range(self, chunk_key, separator='.'):
+        """Same as ``byte_range`` for a chunk key relative to the array."""
+        return self.byte_range(tuple(int(c) for c in chunk_key.split(separator)))
+
+    def to_index(self):
+        """Convert the written chunks back to a ``ChunkIndex``."""
+        flat = np.flatnonzero(self.table[:, 0] >= 0)
+        coords = np.stack(np.unravel_index(flat, self.grid), axis=1)
+        index = ChunkIndex(coords.astype(np.int64),
+                           np.array(self.table[flat, 0]),
+                           np.array(self.table[flat, 1]))
+        index.source_ids = np.array(self.table[flat, 2])
+        return index
@@ -1,12 +1,26 @@
 import os
 import sys
+import time
+import argparse
+import pathlib
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import h5py
+import numpy as np
+import numcodecs
 import zarr
-import dxchange
 import yaml
-import pickle
-import pathlib
+from numcodecs import Blosc, Zstd
+
 import meta
 
+# HDF5 exchange dataset paths (standard tomoscan layout)
+DS_PROJ  = '/exchange/data'
+DS_FLAT  = '/exchange/data_white'
+DS_DARK  = '/exchange/data_dark'
+DS_THETA = '/exchange/theta'
+
 def save_pickle(file_name, parameters):
     """Pickle saves and load exactly as it was, but is not human readable."""
     with open(file_name, 'wb') as f:
@@ -53,35 +67,174 @@ def dict_compare(parameters, loaded_parameters):
     else:
         print('False')
 
+def get_compressor(name, clevel):
+    """Zarr compressor from a command line name."""
+    if name == 'zstd':
+        return Zstd(level=clevel)
+    if name.startswith('blosc-'):
+        return Blosc(cname=name[len('blosc-'):], clevel=clevel,
+                     shuffle=Blosc.BITSHUFFLE)
+    if name == 'none':
+        return None
+    raise ValueError(f'Unknown compressor: {name}')
+
+
+def get_chunks(shape, layout, chunk_len):
+    """Zarr chunk shape for a (projections, rows, columns) dataset.
+
+    ``proj`` chunks hold ``chunk_len`` whole projections; ``sino`` chunks hold
+    ``chunk_len`` whole sinograms (all projections of ``chunk_len`` rows).
+    """
+    nproj, nrow, ncol = shape
+    if layout == 'proj':
+        return (max(1, min(chunk_len, nproj)), nrow, ncol)
+    return (nproj, max(1, min(chunk_len, nrow)), ncol)
+
+
+def stream_to_zarr(dset, zarr_path, chunks, compressor, memory_budget, nthreads):
+    """Copy an HDF5 dataset into a Zarr array slab by slab.
+
+    Slabs are read from HDF5 in the calling thread (h5py serializes HDF5
+    calls anyway) along the axis the chunks are split on, and compressed and
+    written by a thread pool. Every slab is a whole number of chunks, so the
+    workers never touch the same chunk. At most ``nthreads + 1`` slabs are in
+    memory at once and the slab length is chosen to keep them within
+    ``memory_budget`` bytes.
+
+    Sinogram chunks span all projections, see ``stream_sino_to_zarr``.
+
+    Returns
+    -------
+    tuple
+        Bytes copied (uncompressed) and elapsed seconds.
+    """
+    shape = dset.shape
+    za = zarr.open(zarr_path, mode='w', shape=shape, chunks=chunks,
+                   dtype=dset.dtype, compressor=compressor)
+    if 0 in shape:
+        return 0, 0.0
+    if chunks[0] == shape[0] and chunks[1] < shape[1]:
+        return stream_sino_to_zarr(dset, za, memory_budget, nthreads)
+
+    step = chunks[0]
+    bytes_per_index = dset.dtype.itemsize * int(np.prod(shape[1:]))
+    slab_chunks = memory_budget // ((nthreads + 1) * bytes_per_index * step)
+    slab_len = max(1, slab_chunks) * step
+    if slab_chunks < 1:
+        print(f'  WARNING: one chunk row ({step * bytes_per_index / 1024**2:.0f} MB) '
+              f'x {nthreads + 1} slabs exceeds the memory budget')
+
+    def write(start, stop, slab):
+        za[start:stop] = slab
+
+    t0 = time.perf_counter()
+    pending = []
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        for start in range(0, shape[0], slab_len):
+            stop = min(start + slab_len, shape[0])
+            slab = dset[start:stop]
+            pending.append(pool.submit(write, start, stop, slab))
+            # Keep at most nthreads slabs queued...
+            while len(pending) >= nthreads + 1 or (pending and pending[0].done()):
+                pending.pop(0).result()
+        for future in pending:
+            future.result()
+    dt = time.perf_counter() - t0
+    return dset.dtype.itemsize * int(np.prod(shape)), dt
+
+
+def stream_sino_to_zarr(dset, za, memory_budget, nthreads):
+    """Copy an HDF5 dataset into sinogram chunks, band of rows by band.
+
+    Tomoscan files are chunked by projection, so every read of a row range
+    decompresses all projection chunks of the file. The rows are therefore
+    copied in as few bands as the memory budget allows: each band holds all
+    projections of as many whole chunk rows as fit in ``memory_budget``, is
+    filled in source chunk order and then compressed chunk row by chunk row
+    by the thread pool. The file is decompressed once per band.
+
+    Returns
+    -------
+    tuple
+        Bytes copied (uncompressed) and elapsed seconds.
+    """
+    nproj, nrow, ncol = dset.shape
+    step = za.chunks[1]
+    bytes_per_row = dset.dtype.itemsize * nproj * ncol
+    band_chunks = memory_budget // (bytes_per_row * step)
+    band_len = min(max(1, band_chunks) * step, nrow)
+    if band_chunks < 1:
+        print(f'  WARNING: one sinogram chunk ({step * bytes_per_row / 1024**2:.0f} MB) '
+              f'exceeds the memory budget')
+    read_len = dset.chunks[0] if dset.chunks else nproj
+
+    def write(start, stop):
+        za[:, start:stop] = band[:, start - r0:stop - r0]
+
+    t0 = time.perf_counter()
+    band = np.empty((nproj, band_len, ncol), dtype=dset.dtype)
+    with ThreadPoolExecutor(max_workers=nthreads) as pool:
+        for r0 in range(0, nrow, band_len):
+            r1 = min(r0 + band_len, nrow)
+            for p0 in range(0, nproj, read_len):
+                p1 = min(p0 + read_len, nproj)
+                dset.read_direct(band, np.s_[p0:p1, r0:r1], np.s_[p0:p1, :r1 - r0])
+            for future in [pool.submit(write, start, min(start + step, r1))
+                           for start in range(r0, r1, step)]:
+                future.result()
+    dt = time.perf_counter() - t0
+    return dset.dtype.itemsize * nproj * nrow * ncol, dt
+
+
 def main(args):
 
-    if len(sys.argv) == 1:
-        print ('ERROR: Must provide the path to a run-file folder as the argument')
-        print ('Example:')
-        print ('        python %s /data/file.h5'% sys.argv[0])
+    parser = argparse.ArgumentParser(
+        description='Stream a tomoscan HDF5 file into Zarr arrays.')
+    parser.add_argument('file_name', help='Input HDF5 file')
+    parser.add_argument('--layout', choices=('proj', 'sino'), default='proj',
+                        help='Chunk layout: whole projections or whole sinograms')
+    parser.add_argument('--chunk', type=int, default=1,
+                        help='Projections (proj) or rows (sino) per chunk (default: 1)')
+    parser.add_argument('--compressor', default='blosc-zstd',
+                        help='blosc-zstd, blosc-lz4, zstd or none (default: blosc-zstd)')
+    parser.add_argument('--clevel', type=int, default=3, help='Compression level')
+    parser.add_argument('--threads', type=int, default=os.cpu_count(),
+                        help='Compression threads')
+    parser.add_argument('--memory', type=float, default=2.0,
+                        help='Memory budget for in-flight slabs (proj) or the '
+                             'sinogram band (sino) in GB (default: 2)')
+    args = parser.parse_args(args[1:])
+
+    file_name = args.file_name
+    p = pathlib.Path(file_name)
+    if not p.is_file():
+        print('ERROR: %s does not exist' % p)
         sys.exit(1)
-    else:
 
-        file_name   = sys.argv[1]
-        p = pathlib.Path(file_name)
-        if p.is_file():
-            p = pathlib.Path(file_name).joinpath(p.stem)
-            file_name_hdf   = p.with_suffix('.h5')
-            file_name_pickle   = p.with_suffix('.pickle')
-            file_name_yaml   = p.with_suffix('.yaml')
-            # file_name_zarr_data = p.with_suffix('.dtxml')
-            # file_name_zarr_flat  = p.parents[1].joinpath('master').with_suffix('.xlsx')
-        else:
-            print('ERROR: %s does not exist' % p)
-            sys.exit(1)
-    
     base_name    = os.path.splitext(file_name)[0] 
 
-    data, flat, dark, theta = dxchange.read_aps_tomoscan_hdf5(file_name)#, sino=(100, 400))
-    
-    zarr.save(base_name + '/data.zarr', data)
-    zarr.save(base_name + '/flat.zarr', flat)
-    zarr.save(base_name + '/dark.zarr', dark)
+    # Blosc's own threads would compete with the writer pool...
+    numcodecs.blosc.use_threads = False
+    compressor = get_compressor(args.compressor, args.clevel)
+    budget = int(args.memory * 1024**3)
+
+    with h5py.File(file_name, 'r') as f:
+        for path, name in ((DS_PROJ, 'data'), (DS_FLAT, 'flat'), (DS_DARK, 'dark')):
+            if path not in f:
+                print('WARNING: %s not found in %s' % (path, file_name))
+                continue
+            dset = f[path]
+            chunks = get_chunks(dset.shape, args.layout, args.chunk)
+            zarr_path = base_name + '/' + name + '.zarr'
+            nbytes, dt = stream_to_zarr(dset, zarr_path, chunks, compressor,
+                                        budget, args.threads)
+            rate = nbytes / 1024**2 / dt if dt else 0
+            stored = zarr.open(zarr_path, mode='r').nbytes_stored
+            print('%s %s chunks=%s: %.1f MB in %.2f s, %.1f MB/s, ratio %.2f'
+                  % (name, dset.shape, chunks, nbytes / 1024**2, dt, rate,
+                     nbytes / stored if stored else 0))
+        if DS_THETA in f:
+            zarr.save(base_name + '/theta.zarr', f[DS_THETA][:])
 
     # _, meta_dict = dxchange.read_hdf_meta(file_name) # this uses the meta data reader from dxchange
     mp = meta.read_meta.Hdf5MetadataReader(file_name)
@@ -4,17 +4,25 @@
 # conda install -c conda-forge hdf5 h5py
 # from https://gist.github.com/rsignell-usgs/49c214c9aaab4935e15a83bf3e228d03#file-h5-to-zarr-py-L59
 
+import argparse
+import json
 import logging
+import os
+import time
 from urllib.parse import urlparse, urlunparse
 import numpy as np
 import h5py
 import zarr
 from zarr.meta import encode_fill_value
-from numcodecs import Zlib
 import fsspec
 from zarr.util import json_dumps
 
+from chunk_index import (ChunkIndex, ChunkManifest, _store_file,
+                         manifest_meta_key, manifest_table, write_manifest)
+from h5codecs import filter_pipeline
+
 chunks_meta_key = '.zchunkstore'
+chunks_state_key = '.zchunkstate'
 
 lggr = logging.getLogger('h5-to-zarr')
 lggr.addHandler(logging.NullHandler())
@@ -34,29 +42,204 @@ def chunks_info(zarray, chunks_loc):
     ----------
     zarray : zarr.core.Array
         Zarr array that will use the chunk data.
-    chunks_loc : dict
+    chunks_loc : dict or ChunkIndex
         File storage information for the chunks belonging to the Zarr array.
+        A ``ChunkIndex`` carries its source information in the ``source``
+        attribute instead of a ``'source'`` key.
     """
-    if 'source' not in chunks_loc:
+    if isinstance(chunks_loc, ChunkIndex):
+        source = getattr(chunks_loc, 'source', None)
+    else:
+        source = chunks_loc.get('source')
+    if source is None:
         raise ValueError('Chunk source information missing')
-    if any([k not in chunks_loc['source'] for k in ('uri', 'array_name')]):
+    if any([k not in source for k in ('uri', 'array_name')]):
         raise ValueError(
-            f'{chunks_loc["source"]}: Chunk source information incomplete')
+            f'{source}: Chunk source information incomplete')
 
 
     key = _path_to_prefix(zarray.path) + chunks_meta_key
-    chunks_meta = dict()
-    for k, v in chunks_loc.items():
-        if k != 'source':
-            k = zarray._chunk_key(k)
-            if any([a not in v for a in ('offset', 'size')]):
-                raise ValueError(
-                    f'{k}: Incomplete chunk location information')
-        chunks_meta[k] = v
+    if isinstance(chunks_loc, ChunkIndex):
+        # Bulk path: build the keys straight from the index arrays...
+        separator = getattr(zarray, '_dimension_separator', None) or '.'
+        keys = chunks_loc.chunk_keys(zarray._key_prefix, separator)
+        chunks_meta = {
+            k: {'offset': o, 'size': s}
+            for k, o, s in zip(keys, chunks_loc.offsets.tolist(),
+                               chunks_loc.sizes.tolist())}
+        chunks_meta['source'] = source
+    else:
+        chunks_meta = dict()
+        for k, v in chunks_loc.items():
+            if k != 'source':
+                k = zarray._chunk_key(k)
+                if any([a not in v for a in ('offset', 'size')]):
+                    raise ValueError(
+                        f'{k}: Incomplete chunk location information')
+            chunks_meta[k] = v
 
     # Store Zarr array chunk location metadata...
     zarray.store[key] = json_dumps(chunks_meta)
 
+def chunks_manifest(zarray, chunks_loc):
+    """Store chunks location information for a Zarr array as a binary manifest.
+
+    Unlike ``chunks_info`` the chunk offsets and sizes go into a dense int64
+    table that readers can memory-map and index without parsing it; see
+    ``chunk_index.ChunkManifest``.
+
+    Parameters
+    ----------
+    zarray : zarr.core.Array
+        Zarr array that will use the chunk data.
+    chunks_loc : ChunkIndex
+        File storage information for the chunks belonging to the Zarr array.
+    """
+    source = getattr(chunks_loc, 'source', None)
+    if source is None:
+        raise ValueError('Chunk source information missing')
+    table = manifest_table(chunks_loc, zarray.shape, zarray.chunks)
+    write_manifest(zarray.store, zarray.path, zarray.shape, zarray.chunks,
+                   table, [source])
+
+def load_chunks_info(zarray):
+    """Load the stored chunks location information of a Zarr array.
+
+    The binary manifest is used when present, the JSON ``.zchunkstore``
+    otherwise.
+
+    Parameters
+    ----------
+    zarray : zarr.core.Array
+        Zarr array with chunk location metadata.
+
+    Returns
+    -------
+    ChunkIndex or None
+        Chunk storage information with its ``source`` attribute set, or
+        ``None`` if the array has no chunk location metadata.
+    """
+    prefix = _path_to_prefix(zarray.path)
+    store = zarray.store
+    if prefix + manifest_meta_key in store:
+        manifest = ChunkManifest.open(store, zarray.path)
+        index = manifest.to_index()
+        index.source = manifest.sources[0]
+        return index
+    if prefix + chunks_meta_key in store:
+        chunks_meta = json.loads(store[prefix + chunks_meta_key])
+        source = chunks_meta.pop('source')
+        separator = getattr(zarray, '_dimension_separator', None) or '.'
+        start = len(zarray._key_prefix)
+        rank = len(zarray.shape) or 1
+        coords = np.array([k[start:].split(separator) for k in chunks_meta],
+                          dtype=np.int64).reshape(-1, rank)
+        index = ChunkIndex(
+            coords,
+            np.array([v['offset'] for v in chunks_meta.values()], dtype=np.int64),
+            np.array([v['size'] for v in chunks_meta.values()], dtype=np.int64))
+        index.source = source
+        return index
+    return None
+
+def append_chunks_info(zarray, chunks_loc):
+    """Add chunk locations to the JSON ``.zchunkstore`` of a Zarr array.
+
+    The entries are appended in front of the closing brace without parsing
+    the existing manifest, in place when the store is a directory. Entries
+    for chunks already listed are appended again; JSON readers keep the
+    last value of a repeated key.
+
+    Parameters
+    ----------
+    zarray : zarr.core.Array
+        Zarr array with a ``.zchunkstore``.
+    chunks_loc : ChunkIndex
+        Locations of the new or rewritten chunks.
+    """
+    if not len(chunks_loc):
+        return
+    key = _path_to_prefix(zarray.path) + chunks_meta_key
+    separator = getattr(zarray, '_dimension_separator', None) or '.'
+    keys = chunks_loc.chunk_keys(zarray._key_prefix, separator)
+    tail = ''.join(
+        f',\n    {json.dumps(k)}: {{"offset": {o}, "size": {s}}}'
+        for k, o, s in zip(keys, chunks_loc.offsets.tolist(),
+                           chunks_loc.sizes.tolist()))
+    tail = (tail + '\n}').encode('ascii')
+
+    fname = _store_file(zarray.store, key)
+    if fname is not None:
+        with open(fname, 'rb+') as f:
+            f.seek(0, 2)
+            end = f.tell()
+            f.seek(max(0, end - 64))
+            last = f.read()
+            f.seek(end - len(last) + last.rindex(b'}'))
+            f.write(tail)
+            f.truncate()
+    else:
+        value = bytes(zarray.store[key]).rstrip()
+        zarray.store[key] = value[:value.rindex(b'}')] + tail
+
+def update_chunks_manifest(zarray, chunks_loc):
+    """Merge new chunk locations into the binary manifest of a Zarr array.
+
+    The old table is scattered into the (possibly larger) chunk grid of the
+    array and the new entries are written over it; no JSON is parsed.
+    """
+    manifest = ChunkManifest.open(zarray.store, zarray.path)
+    table = manifest_table(manifest.to_index(), zarray.shape, zarray.chunks)
+    if len(chunks_loc):
+        grid = tuple(-(-s // c) for s, c in zip(zarray.shape, zarray.chunks))
+        flat = np.ravel_multi_index(tuple(chunks_loc.coords.T), grid)
+        table[flat, 0] = chunks_loc.offsets
+        table[flat, 1] = chunks_loc.sizes
+    write_manifest(zarray.store, zarray.path, zarray.shape, zarray.chunks,
+                   table, manifest.sources)
+
+def _complete_chunks(shape, chunks):
+    """Chunk grid shape of the chunks that lie entirely inside ``shape``."""
+    return tuple(s // c for s, c in zip(shape, chunks))
+
+def _outside_cells(grid, complete):
+    """Grid cells of ``grid`` that are not inside the box ``complete``.
+
+    The cells are enumerated as disjoint boxes (those beyond ``complete``
+    along axis 0, then along axis 1 within it, ...), so the work is
+    proportional to the number of cells returned.
+    """
+    rank = len(grid)
+    boxes = list()
+    for axis in range(rank):
+        lo = [0] * rank
+        hi = list(complete[:axis]) + [grid[axis]] + list(grid[axis + 1:])
+        lo[axis] = complete[axis]
+        if any(l >= h for l, h in zip(lo, hi)):
+            continue
+        box = np.indices([h - l for l, h in zip(lo, hi)]).reshape(rank, -1).T
+        boxes.append(box + np.array(lo, dtype=np.int64))
+    if not boxes:
+        return np.empty((0, rank), dtype=np.int64)
+    return np.concatenate(boxes).astype(np.int64)
+
+def write_chunks_state(zarray, nchunks, ncomplete):
+    """Record the chunk counts an incremental update compares against.
+
+    ``nchunks`` is the number of chunks in the manifest, ``ncomplete`` the
+    number of those entirely inside the array shape.
+    """
+    zarray.store[_path_to_prefix(zarray.path) + chunks_state_key] = json_dumps(
+        {'shape': list(zarray.shape), 'nchunks': int(nchunks),
+         'ncomplete': int(ncomplete)})
+
+def read_chunks_state(zarray):
+    """Chunk counts written by ``write_chunks_state``, ``None`` if missing."""
+    key = _path_to_prefix(zarray.path) + chunks_state_key
+    if key not in zarray.store:
+        return None
+    return json.loads(zarray.store[key])
+
 class Hdf5ToZarr:
     """Translate the content of one HDF5 file into Zarr metadata.
 
@@ -73,18 +256,39 @@ class Hdf5ToZarr:
         Produce atributes required by the `xarray <http://xarray.pydata.org>`_
         package to correctly identify dimensions (HDF5 dimension scales) of a
         Zarr array. Default is ``False``.
+    manifest : {'json', 'binary', 'both'}, optional
+        Chunk location format: the JSON ``.zchunkstore`` key, the binary
+        ``.zchunkmanifest``/``.zchunktable`` pair, or both. Default is
+        ``'json'``.
+    incremental : bool, optional
+        Update a store produced by an earlier translation of the same (growing)
+        file instead of rebuilding it: only datasets whose shape or chunk count
+        changed are touched. Default is ``False``.
+    swmr : bool, optional
+        Open the HDF5 file in single-writer/multiple-reader mode, as needed
+        while a detector is still writing it. Default is ``False``.
     """
 
-    def __init__(self, h5f, store, xarray=False):
+    def __init__(self, h5f, store, xarray=False, manifest='json',
+                 incremental=False, swmr=False):
         # Open HDF5 file in read mode...
         lggr.debug(f'HDF5 file: {h5f}')
         lggr.debug(f'Zarr store: {store}')
         lggr.debug(f'xarray: {xarray}')
-        self._h5f = h5py.File(h5f, mode='r')
+        if manifest not in ('json', 'binary', 'both'):
+            raise ValueError(f'Unknown chunk manifest format: {manifest}')
+        self._h5f = h5py.File(h5f, mode='r', swmr=swmr)
         self._xr = xarray
-
-        # Create Zarr store's root group...
-        self._zroot = zarr.group(store=store, overwrite=True)
+        self._manifest = manifest
+        self._incremental = incremental
+        self._changed = list()
+
+        # Create Zarr store's root group (or reopen it)...
+        if incremental:
+            self._new_store = '.zgroup' not in store
+            self._zroot = zarr.open_group(store=store, mode='a')
+        else:
+            self._zroot = zarr.group(store=store, overwrite=True)
 
         # Figure out HDF5 file's URI...
         if hasattr(h5f, 'name'):
@@ -92,16 +296,37 @@ class Hdf5ToZarr:
         elif hasattr(h5f, 'url'):
             parts = urlparse(h5f.url())
             self._uri = urlunparse(parts[:3] + ('',) * 3)
+        elif isinstance(h5f, (str, os.PathLike)):
+            self._uri = os.path.abspath(h5f)
         else:
             self._uri = None
         lggr.debug(f'Source URI: {self._uri}')
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Close the HDF5 file."""
+        self._h5f.close()
+
     def translate(self):
         """Translate content of one HDF5 file into Zarr storage format.
 
         No data is copied out of the HDF5 file.
         """
         lggr.debug('Translation begins')
+        if self._incremental:
+            self._changed = list()
+            if self._new_store:
+                self.transfer_attrs(self._h5f, self._zroot)
+                self._new_store = False
+            self._h5f.visititems(self.updater)
+            self.update_consolidated()
+            lggr.debug(f'Updated: {self._changed}')
+            return self._changed
         self.transfer_attrs(self._h5f, self._zroot)
         self._h5f.visititems(self.translator)
 
@@ -142,14 +367,7 @@ class Hdf5ToZarr:
         """
         if isinstance(h5obj, h5py.Dataset):
             lggr.debug(f'Dataset: {h5obj.name}')
-            if (h5obj.scaleoffset or h5obj.fletcher32 or h5obj.shuffle or
-                    h5obj.compression in ('szip', 'lzf')):
-                raise RuntimeError(
-                    f'{h5obj.name} uses unsupported HDF5 filters')
-            if h5obj.compression == 'gzip':
-                compression = Zlib(level=h5obj.compression_opts)
-            else:
-                compression = None
+            compressor, filters = filter_pipeline(h5obj)
 
             # Get storage info of this HDF5 dataset...
             cinfo = self.storage_info(h5obj)
@@ -161,7 +379,8 @@ class Hdf5ToZarr:
                                             dtype=h5obj.dtype,
                                             chunks=h5obj.chunks or False,
                                             fill_value=h5obj.fillvalue,
-                                            compression=compression,
+                                            compressor=compressor,
+                                            filters=filters,
                                             overwrite=True)
             lggr.debug(f'Created Zarr array: {za}')
             self.transfer_attrs(h5obj, za)
@@ -174,15 +393,149 @@ class Hdf5ToZarr:
 
             # Store chunk location metadata...
             if cinfo:
-                cinfo['source'] = {'uri': self._uri,
-                                   'array_name': h5obj.name}
-                chunks_info(za, cinfo)
+                cinfo.source = {'uri': self._uri,
+                                'array_name': h5obj.name}
+                if self._manifest in ('json', 'both'):
+                    chunks_info(za, cinfo)
+                if self._manifest in ('binary', 'both'):
+                    chunks_manifest(za, cinfo)
+            if self._incremental:
+                ncomplete = len(cinfo)
+                if h5obj.chunks is not None:
+                    complete = _complete_chunks(h5obj.shape, h5obj.chunks)
+                    ncomplete = np.count_nonzero(
+                        (cinfo.coords < np.array(complete, dtype=np.int64)).all(axis=1))
+                write_chunks_state(za, len(cinfo), ncomplete)
 
         elif isinstance(h5obj, h5py.Group):
             lggr.debug(f'Group: {h5obj.name}')
             zgrp = self._zroot.create_group(h5obj.name)
             self.transfer_attrs(h5obj, zgrp)
 
+    def updater(self, name, h5obj):
+        """Bring the Zarr metadata of one HDF5 object up to date.
+
+        Objects new to the store are translated as usual. For datasets already
+        in the store, the shape and chunk count are compared with the small
+        ``.zchunkstate`` record, so unchanged datasets cost two metadata reads.
+        For grown datasets only the chunks that can have appeared since the
+        last update are looked up, appended to the manifest and the
+        ``.zarray`` shape is rewritten in place.
+        """
+        if name not in self._zroot:
+            self.translator(name, h5obj)
+            self._changed.append(name)
+            return
+        if not isinstance(h5obj, h5py.Dataset):
+            return
+
+        za = self._zroot[name]
+        state = read_chunks_state(za)
+        dsid = h5obj.id
+        if h5obj.chunks is None:
+            num_chunks = 0 if dsid.get_offset() is None else 1
+        else:
+            num_chunks = dsid.get_num_chunks()
+        if (state is not None and za.shape == h5obj.shape and
+                state['nchunks'] == num_chunks):
+            return
+
+        new = None
+        if (state is not None and h5obj.chunks is not None and
+                za.chunks == h5obj.chunks and za.dtype == h5obj.dtype and
+                len(za.shape) == len(h5obj.shape)):
+            new = self._new_chunks(h5obj, za.shape, state, num_chunks)
+        if new is None:
+            # Layout changed or chunks outside the appended region, start
+            # over for this dataset...
+            self.translator(name, h5obj)
+            self._changed.append(name)
+            return
+
+        lggr.debug(f'Dataset changed: {h5obj.name} {za.shape} -> '
+                   f'{h5obj.shape}, {state["nchunks"]} -> {num_chunks} chunks')
+        if za.shape != h5obj.shape:
+            key = za._key_prefix + '.zarray'
+            zmeta = json.loads(za.store[key])
+            zmeta['shape'] = list(h5obj.shape)
+            za.store[key] = json_dumps(zmeta)
+            za = self._zroot[name]
+
+        prefix = _path_to_prefix(za.path)
+        new.source = {'uri': self._uri, 'array_name': h5obj.name}
+        if self._manifest in ('json', 'both'):
+            if prefix + chunks_meta_key in za.store:
+                append_chunks_info(za, new)
+            elif len(new):
+                chunks_info(za, new)
+        if self._manifest in ('binary', 'both'):
+            if prefix + manifest_meta_key in za.store:
+                update_chunks_manifest(za, new)
+            elif len(new):
+                chunks_manifest(za, new)
+        complete = np.array(_complete_chunks(h5obj.shape, h5obj.chunks),
+                            dtype=np.int64)
+        write_chunks_state(za, num_chunks, num_chunks - np.count_nonzero(
+            (new.coords >= complete).any(axis=1)))
+        self._changed.append(name)
+
+    def _new_chunks(self, dset, old_shape, state, num_chunks):
+        """Chunks written since the last update of an append-only dataset.
+
+        Chunk grid cells entirely inside the old shape cannot have changed,
+        so only the cells outside it are queried with
+        ``get_chunk_info_by_coord``. If the chunk counts show that cells
+        inside the old shape changed after all, or the query is more work
+        than walking the whole chunk B-tree, ``None`` is returned and the
+        dataset has to be indexed from scratch.
+
+        Returns
+        -------
+        ChunkIndex or None
+            Locations of the chunks outside the old shape.
+        """
+        grid = tuple(-(-s // c) for s, c in zip(dset.shape, dset.chunks))
+        candidates = _outside_cells(grid, _complete_chunks(old_shape, dset.chunks))
+        if len(candidates) > max(1, num_chunks // 4):
+            return None
+
+        dsid = dset.id
+        coords, offsets, sizes = list(), list(), list()
+        for c in candidates.tolist():
+            blob = dsid.get_chunk_info_by_coord(tuple(a * b for a, b in
+                                                      zip(c, dset.chunks)))
+            if blob.byte_offset is None:
+                continue
+            coords.append(c)
+            offsets.append(blob.byte_offset)
+            sizes.append(blob.size)
+        if num_chunks - len(coords) != state['ncomplete']:
+            return None
+        return ChunkIndex(np.array(coords, dtype=np.int64).reshape(-1, len(grid)),
+                          np.array(offsets, dtype=np.int64),
+                          np.array(sizes, dtype=np.int64))
+
+    def update_consolidated(self):
+        """Refresh consolidated metadata for the objects changed by an update.
+
+        Entries of unchanged arrays in ``.zmetadata`` are left as they are.
+        Without consolidated metadata in the store, it is created.
+        """
+        store = self._zroot.store
+        if '.zmetadata' not in store:
+            zarr.convenience.consolidate_metadata(store)
+            return
+        if not self._changed:
+            return
+        consolidated = json.loads(store['.zmetadata'])
+        for path in self._changed:
+            prefix = _path_to_prefix(path.strip('/'))
+            for name in ('.zarray', '.zgroup', '.zattrs'):
+                if prefix + name in store:
+                    consolidated['metadata'][prefix + name] = json.loads(
+                        store[prefix + name])
+        store['.zmetadata'] = json_dumps(consolidated)
+
     def _get_array_dims(self, dset):
         """Get a list of dimension scale names attached to input HDF5 dataset.
 
@@ -220,7 +573,8 @@ class Hdf5ToZarr:
         """Get storage information of an HDF5 dataset in the HDF5 file.
 
         Storage information consists of file offset and size (length) for every
-        chunk of the HDF5 dataset.
+        chunk of the HDF5 dataset. It is collected in a single pass over the
+        chunk B-tree into NumPy arrays; see ``chunk_index.ChunkIndex``.
 
         Parameters
         ----------
@@ -229,59 +583,58 @@ class Hdf5ToZarr:
 
         Returns
         -------
-        dict
-            HDF5 dataset storage information. Dict keys are chunk array offsets
-            as tuples. Dict values are pairs with chunk file offset and size
-            integers.
+        ChunkIndex
+            HDF5 dataset storage information. Mapping keys are chunk array
+            offsets as tuples. Mapping values are dicts with chunk file offset
+            and size integers, built lazily on first lookup.
         """
-        # Empty (null) dataset...
-        if dset.shape is None:
-            return dict()
-
-        dsid = dset.id
-        if dset.chunks is None:
-            # Contiguous dataset...
-            if dsid.get_offset() is None:
-                # No data ever written...
-                return dict()
-            else:
-                key = (0,) * (len(dset.shape) or 1)
-                return {key: {'offset': dsid.get_offset(),
-                              'size': dsid.get_storage_size()}}
-        else:
-            # Chunked dataset...
-            num_chunks = dsid.get_num_chunks()
-            if num_chunks == 0:
-                # No data ever written...
-                return dict()
-
-            # Go over all the dataset chunks...
-            stinfo = dict()
-            chunk_size = dset.chunks
-            for index in range(num_chunks):
-                blob = dsid.get_chunk_info(index)
-                key = tuple(
-                    [a // b for a, b in zip(blob.chunk_offset, chunk_size)])
-                stinfo[key] = {'offset': blob.byte_offset,
-                               'size': blob.size}
-            return stinfo
-
+        stinfo = ChunkIndex.from_dataset(dset)
+        if stinfo.masks.any():
+            lggr.warning(f'{dset.name}: {np.count_nonzero(stinfo.masks)} '
+                         'chunks skipped some optional HDF5 filters')
+        return stinfo
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Translate an HDF5 file into Zarr metadata.')
+    parser.add_argument('h5file', help='Input HDF5 file or URL')
+    parser.add_argument('store', help='Output Zarr directory store')
+    parser.add_argument('--manifest', choices=('json', 'binary', 'both'),
+                        default='json', help='Chunk location format')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Update an existing store instead of rebuilding it')
+    parser.add_argument('--watch', type=float, default=0, metavar='SECONDS',
+                        help='Keep refreshing the store incrementally at this '
+                             'interval (implies --incremental and SWMR reads)')
+    args = parser.parse_args()
+
     lggr.setLevel(logging.DEBUG)
     lggr_handler = logging.StreamHandler()
     lggr_handler.setFormatter(logging.Formatter(
         '%(levelname)s:%(name)s:%(funcName)s:%(message)s'))
     lggr.addHandler(lggr_handler)
 
-    with fsspec.open('/Users/decarlo/Downloads/zarr/3D_resolution_pattern_1xHR_003.h5',
-                     mode='rb', anon=False, requester_pays=True,
-                     default_fill_cache=False) as f:
-        store = zarr.DirectoryStore('/Users/decarlo/Downloads/zarr/3D_resolution_pattern_1xHR_003.chunkstore')
-        h5chunks = Hdf5ToZarr(f, store, xarray=True)
-        h5chunks.translate()
-
-# Consolidate Zarr metadata...
-lggr.info('Consolidating Zarr dataset metadata')
-zarr.convenience.consolidate_metadata(store)
-lggr.info('Done')
\ No newline at end of file
+    store = zarr.DirectoryStore(args.store)
+    incremental = args.incremental or args.watch > 0
+    while True:
+        t0 = time.perf_counter()
+        with fsspec.open(args.h5file, mode='rb', anon=False,
+                         requester_pays=True,
+                         default_fill_cache=False) as f:
+            with Hdf5ToZarr(f, store, xarray=True,
+                            manifest=args.manifest,
+                            incremental=incremental,
+                            swmr=args.watch > 0) as h5chunks:
+                changed = h5chunks.translate()
+
+        if not incremental:
+            # Consolidate Zarr metadata...
+            lggr.info('Consolidating Zarr dataset metadata')
+            zarr.convenience.consolidate_metadata(store)
+        else:
+            lggr.info(f'{len(changed)} objects updated in '
+                      f'{(time.perf_counter() - t0) * 1e3:.1f} ms')
+        if args.watch <= 0:
+            break
+        time.sleep(args.watch)
+    lggr.info('Done')
@@ -0,0 +1,200 @@
+# Requirements:
+# numcodecs
+# python-lzf (optional, speeds up the LZF codec)
+
+"""
+numcodecs codecs for HDF5 filters that numcodecs does not cover, and the
+mapping of HDF5 filter pipelines onto Zarr compressor/filters.
+
+Importing this module registers the codecs, so any Zarr reader of metadata
+written by ``Hdf5ToZarr`` with LZF or Fletcher32 filtered datasets must
+``import h5codecs`` first.
+"""
+
+import numpy as np
+from numcodecs import Shuffle, Zlib
+from numcodecs.abc import Codec
+from numcodecs.compat import ensure_bytes, ensure_contiguous_ndarray
+from numcodecs.registry import register_codec
+
+try:
+    import lzf as _lzf
+except ImportError:
+    _lzf = None
+
+
+def _lzf_decompress(src, nbytes):
+    """Pure Python LZF decompressor (liblzf ``lzf_decompress``)."""
+    out = bytearray(nbytes)
+    ip = op = 0
+    end = len(src)
+    while ip < end:
+        ctrl = src[ip]
+        ip += 1
+        if ctrl < 32:
+            # Literal run...
+            ctrl += 1
+            out[op:op + ctrl] = src[ip:ip + ctrl]
+            ip += ctrl
+            op += ctrl
+        else:
+            # Back reference...
+            length = ctrl >> 5
+            ref = op - ((ctrl & 0x1f) << 8) - 1
+            if length == 7:
+                length += src[ip]
+                ip += 1
+            ref -= src[ip]
+            ip += 1
+            length += 2
+            if ref < 0 or op + length > nbytes:
+                raise RuntimeError('Corrupt LZF stream')
+            if ref + length <= op:
+                out[op:op + length] = out[ref:ref + length]
+            else:
+                for i in range(length):
+                    out[op + i] = out[ref + i]
+            op += length
+    if op != nbytes:
+        raise RuntimeError(f'LZF stream decoded to {op} bytes, expected {nbytes}')
+    return bytes(out)
+
+
+class LZF(Codec):
+    """HDF5 LZF filter (h5py filter 32000).
+
+    HDF5 stores a chunk unfiltered when LZF would not make it smaller, so an
+    input of exactly ``nbytes`` is passed through as is.
+
+    Parameters
+    ----------
+    nbytes : int
+        Size of one decoded chunk in bytes.
+    """
+
+    codec_id = 'h5lzf'
+
+    def __init__(self, nbytes):
+        self.nbytes = int(nbytes)
+
+    def encode(self, buf):
+        if _lzf is None:
+            raise RuntimeError('LZF encoding requires the python-lzf package')
+        buf = ensure_bytes(buf)
+        out = _lzf.compress(buf)
+        return buf if out is None else out
+
+    def decode(self, buf, out=None):
+        buf = ensure_bytes(buf)
+        if len(buf) == self.nbytes:
+            dec = buf
+        elif _lzf is not None:
+            dec = _lzf.decompress(buf, self.nbytes + 1)
+        else:
+            dec = _lzf_decompress(buf, self.nbytes)
+        if out is not None:
+            out = ensure_contiguous_ndarray(out).view('u1')
+            out[:] = np.frombuffer(dec, dtype='u1')
+            return out
+        return dec
+
+
+def _fletcher32_halves(data):
+    """HDF5 Fletcher32 running sums of ``data``, each reduced modulo 65535."""
+    data = np.frombuffer(data, dtype='u1')
+    if data.size % 2:
+        data = np.append(data, np.uint8(0))
+    # HDF5 sums big-endian 16-bit words...
+    words = data.view('>u2').astype(np.uint64)
+    n = words.size
+    sum1 = int(words.sum() % 65535)
+    weights = (np.arange(n, 0, -1, dtype=np.uint64) % 65535)
+    sum2 = int(((weights * words) % 65535).sum() % 65535)
+    return sum1, sum2
+
+
+class Fletcher32(Codec):
+    """HDF5 Fletcher32 filter: strips (and optionally checks) the checksum.
+
+    Parameters
+    ----------
+    verify : bool, optional
+        Check the stored checksum before stripping it. Default is ``True``.
+    """
+
+    codec_id = 'h5fletcher32'
+
+    def __init__(self, verify=True):
+        self.verify = verify
+
+    def encode(self, buf):
+        buf = ensure_bytes(buf)
+        sum1, sum2 = _fletcher32_halves(buf)
+        return buf + ((sum2 << 16) | sum1).to_bytes(4, 'little')
+
+    def decode(self, buf, out=None):
+        buf = ensure_bytes(buf)
+        data, stored = buf[:-4], int.from_bytes(buf[-4:], 'little')
+        if self.verify:
+            sum1, sum2 = _fletcher32_halves(data)
+            lo, hi = (stored & 0xffff) % 65535, (stored >> 16) % 65535
+            # Old HDF5 releases wrote the two halves swapped...
+            if (lo, hi) not in ((sum1, sum2), (sum2, sum1)):
+                raise RuntimeError('Fletcher32 checksum mismatch')
+        if out is not None:
+            out = ensure_contiguous_ndarray(out).view('u1')
+            out[:] = np.frombuffer(data, dtype='u1')
+            return out
+        return data
+
+
+register_codec(LZF)
+register_codec(Fletcher32)
+
+
+# HDF5 filter identifiers (h5py.h5z.FILTER_* plus the h5py LZF plugin)...
+_H5Z_DEFLATE = 1
+_H5Z_SHUFFLE = 2
+_H5Z_FLETCHER32 = 3
+_H5Z_LZF = 32000
+
+
+def filter_pipeline(dset):
+    """Map the HDF5 filter pipeline of a dataset onto numcodecs codecs.
+
+    HDF5 applies the filters in pipeline order when writing a chunk; Zarr
+    applies ``filters`` in order and then the ``compressor``. The last HDF5
+    filter therefore becomes the Zarr compressor and the rest the Zarr
+    filters, which makes Zarr decode chunks in the reverse HDF5 order.
+
+    Parameters
+    ----------
+    dset : h5py.Dataset
+        HDF5 dataset.
+
+    Returns
+    -------
+    tuple
+        Zarr ``(compressor, filters)``; either may be ``None``.
+    """
+    dcpl = dset.id.get_create_plist()
+    codecs = list()
+    for i in range(dcpl.get_nfilters()):
+        code, flags, values, name = dcpl.get_filter(i)
+        if code == _H5Z_DEFLATE:
+            codecs.append(Zlib(level=values[0] if values else 6))
+        elif code == _H5Z_SHUFFLE:
+            codecs.append(Shuffle(elementsize=dset.dtype.itemsize))
+        elif code == _H5Z_LZF:
+            nbytes = int(np.prod(dset.chunks)) * dset.dtype.itemsize
+            codecs.append(LZF(nbytes=nbytes))
+        elif code == _H5Z_FLETCHER32:
+            codecs.append(Fletcher32())
+        else:
+            if isinstance(name, bytes):
+                name = name.decode('utf-8', 'replace')
+            raise RuntimeError(
+                f'{dset.name} uses unsupported HDF5 filter {name} ({code})')
+    if not codecs:
+        return None, None
+    return codecs[-1], codecs[:-1] or None
@@ -0,0 +1,350 @@
+# Requirements:
+# zarr>=2.11,<3
+# numcodecs
+# fsspec
+
+"""
+Read-only Zarr store serving chunks straight from the source HDF5 file.
+
+``Hdf5ToZarr.translate()`` only writes Zarr metadata plus, for every array, a
+chunk manifest (``.zchunkstore`` JSON or the binary ``.zchunkmanifest`` /
+``.zchunktable`` pair). ``ReferenceStore`` wraps that metadata store and
+answers chunk-key lookups by reading the recorded byte ranges from the HDF5
+file through fsspec, so DXchange files can be opened with Zarr or xarray
+without converting them::
+
+    store = ReferenceStore(zarr.DirectoryStore('scan_001.chunkstore'))
+    data = zarr.open_consolidated(store)['exchange/data']
+    ds = xarray.open_zarr(store)
+"""
+
+import json
+import logging
+from collections import OrderedDict
+
+import fsspec
+from numcodecs import get_codec
+from numcodecs.compat import ensure_bytes
+from zarr.storage import BaseStore
+
+from chunk_index import ChunkManifest, manifest_meta_key
+import h5codecs  # noqa: F401 registers the HDF5 LZF/Fletcher32 codecs
+
+chunks_meta_key = '.zchunkstore'
+
+lggr = logging.getLogger('h5-to-zarr')
+lggr.addHandler(logging.NullHandler())
+
+
+def _split_key(key):
+    if '/' in key:
+        return key.rsplit('/', 1)
+    return '', key
+
+
+def _join_key(path, name):
+    return path + '/' + name if path else name
+
+
+def coalesce_ranges(ranges, max_gap, max_block):
+    """Merge sorted byte ranges that are (nearly) adjacent.
+
+    Parameters
+    ----------
+    ranges : list of tuple
+        ``(offset, size, key)`` triples sorted by offset.
+    max_gap : int
+        Largest hole in bytes that may be read through to join two ranges.
+    max_block : int
+        Largest merged read in bytes.
+
+    Returns
+    -------
+    list of tuple
+        ``(start, stop, members)`` where ``members`` are the original triples.
+    """
+    blocks = []
+    for offset, size, key in ranges:
+        if blocks:
+            start, stop, members = blocks[-1]
+            end = max(stop, offset + size)
+            if offset - stop <= max_gap and end - start <= max_block:
+                blocks[-1] = (start, end, members + [(offset, size, key)])
+                continue
+        blocks.append((offset, offset + size, [(offset, size, key)]))
+    return blocks
+
+
+class ReferenceStore(BaseStore):
+    """Read-only Zarr store reading chunks from their original HDF5 file.
+
+    Being a ``BaseStore``, it is used by Zarr as is (plain mappings get
+    wrapped), so chunk reads go through the coalescing ``getitems``.
+
+    Parameters
+    ----------
+    meta_store : MutableMapping
+        Zarr store produced by ``Hdf5ToZarr.translate()``.
+    decode : bool, optional
+        Decode chunks in the store and cache the decoded bytes; array metadata
+        is then served with ``compressor`` and ``filters`` removed. If
+        ``False``, raw (still compressed) chunk bytes are served and cached.
+        Default is ``True``.
+    cache_size : int, optional
+        Upper bound of the chunk cache in bytes. Default is 256 MiB.
+    max_gap : int, optional
+        Largest hole in bytes read through when coalescing chunk reads.
+        Default is 64 KiB.
+    max_block : int, optional
+        Largest coalesced read in bytes. Default is 64 MiB.
+    storage_options : dict, optional
+        Passed to fsspec when opening the source files.
+    """
+
+    _readable = True
+    _writeable = False
+    _erasable = False
+    _listable = True
+
+    def __init__(self, meta_store, decode=True, cache_size=256 * 2**20,
+                 max_gap=64 * 2**10, max_block=64 * 2**20,
+                 storage_options=None):
+        self._meta = meta_store
+        self._decode = decode
+        self._cache_size = cache_size
+        self._max_gap = max_gap
+        self._max_block = max_block
+        self._storage_options = storage_options or {}
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._manifests = dict()
+        self._zarrays = dict()
+        self._codecs = dict()
+        self._fs = dict()
+
+    # --- metadata ------------------------------------------------------------
+
+    def _manifest(self, path):
+        """Chunk manifest of the array at ``path``, loaded once."""
+        if path not in self._manifests:
+            if _join_key(path, manifest_meta_key) in self._meta:
+                self._manifests[path] = ChunkManifest.open(self._meta, path)
+            elif _join_key(path, chunks_meta_key) in self._meta:
+                self._manifests[path] = json.loads(
+                    self._meta[_join_key(path, chunks_meta_key)])
+            else:
+                self._manifests[path] = None
+        return self._manifests[path]
+
+    def _zarray(self, path):
+        """Array metadata at ``path``, ``None`` if ``path`` is no array."""
+        if path not in self._zarrays:
+            key = _join_key(path, '.zarray')
+            self._zarrays[path] = (json.loads(self._meta[key])
+                                   if key in self._meta else None)
+        return self._zarrays[path]
+
+    def _chunk_path(self, key):
+        """Split a chunk key into array path and chunk name.
+
+        Returns
+        -------
+        tuple or None
+            ``(path, name, separator)``, ``None`` if ``key`` is not a chunk
+            key. With ``dimension_separator`` ``'/'`` the chunk name spans
+            several key components.
+        """
+        path, name = _split_key(key)
+        if name.startswith('.'):
+            return None
+        zmeta = self._zarray(path)
+        if zmeta is not None and zmeta.get('dimension_separator', '.') == '.':
+            return path, name, '.'
+        parts = key.split('/')
+        for i in range(len(parts) - 1, -1, -1):
+            if not parts[i].isdigit():
+                return None
+            path = '/'.join(parts[:i])
+            zmeta = self._zarray(path)
+            if zmeta is not None:
+                if zmeta.get('dimension_separator') != '/':
+                    return None
+                return path, '.'.join(parts[i:]), '/'
+        return None
+
+    def _pipeline(self, path, zmeta=None):
+        """Compressor and filters of the array at ``path``, decode order."""
+        if path not in self._codecs:
+            if zmeta is None:
+                zmeta = self._zarray(path)
+            codecs = list()
+            if zmeta.get('compressor'):
+                codecs.append(get_codec(zmeta['compressor']))
+            for config in reversed(zmeta.get('filters') or []):
+                codecs.append(get_codec(config))
+            self._codecs[path] = codecs
+        return self._codecs[path]
+
+    def _strip_codecs(self, path, zmeta):
+        """Drop the codecs of arrays whose chunks are decoded here.
+
+        Arrays without a manifest (e.g. small regular arrays stored next to
+        the virtual ones) are served from the meta store as written, so
+        Zarr has to keep decoding them itself.
+        """
+        if self._manifest(path) is None:
+            return zmeta
+        self._pipeline(path, zmeta)
+        zmeta = dict(zmeta, compressor=None, filters=None)
+        return zmeta
+
+    def _metadata(self, key):
+        value = self._meta[key]
+        if not self._decode:
+            return value
+        path, name = _split_key(key)
+        if name == '.zarray':
+            zmeta = self._strip_codecs(path, json.loads(value))
+            return json.dumps(zmeta, indent=4, sort_keys=True).encode('ascii')
+        if name == '.zmetadata':
+            consolidated = json.loads(value)
+            for k, v in consolidated['metadata'].items():
+                p, n = _split_key(k)
+                if n == '.zarray':
+                    consolidated['metadata'][k] = self._strip_codecs(p, v)
+            return json.dumps(consolidated, indent=4,
+                              sort_keys=True).encode('ascii')
+        return value
+
+    # --- chunk location and reads --------------------------------------------
+
+    def _locate(self, key):
+        """``(uri, offset, size)`` of a chunk key, ``None`` if not a chunk."""
+        loc = self._chunk_path(key)
+        if loc is None:
+            return None
+        path, name, _ = loc
+        manifest = self._manifest(path)
+        if manifest is None:
+            return None
+        if isinstance(manifest, ChunkManifest):
+            try:
+                loc = manifest.chunk_byte_range(name)
+            except ValueError:
+                return None
+            if loc is None:
+                return None
+            source, offset, size = loc
+            return source['uri'], offset, size
+        entry = manifest.get(key)
+        if entry is None:
+            return None
+        return manifest['source']['uri'], entry['offset'], entry['size']
+
+    def _filesystem(self, uri):
+        if uri not in self._fs:
+            self._fs[uri] = fsspec.core.url_to_fs(uri, **self._storage_options)
+        return self._fs[uri]
+
+    def _read(self, uri, start, stop):
+        fs, path = self._filesystem(uri)
+        return fs.cat_file(path, start=start, end=stop)
+
+    def _finish(self, key, raw):
+        """Decode raw chunk bytes (if enabled) and put them in the cache."""
+        if self._decode:
+            buf = raw
+            for codec in self._pipeline(self._chunk_path(key)[0]):
+                buf = codec.decode(buf)
+            value = ensure_bytes(buf)
+        else:
+            value = bytes(raw)
+        self._cache[key] = value
+        self._cache_bytes += len(value)
+        while self._cache_bytes > self._cache_size and len(self._cache) > 1:
+            _, old = self._cache.popitem(last=False)
+            self._cache_bytes -= len(old)
+        return value
+
+    def getitems(self, keys, **kwargs):
+        """Fetch several keys, coalescing adjacent chunk reads.
+
+        Keys missing from the store are omitted from the result, which is
+        what Zarr expects for chunks that were never written.
+        """
+        result = dict()
+        pending = dict()
+        for key in keys:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                result[key] = self._cache[key]
+                continue
+            loc = self._locate(key)
+            if loc is None:
+                try:
+                    result[key] = self._metadata(key)
+                except KeyError:
+                    pass
+                continue
+            uri, offset, size = loc
+            pending.setdefault(uri, list()).append((offset, size, key))
+
+        for uri, ranges in pending.items():
+            ranges.sort()
+            for start, stop, members in coalesce_ranges(
+                    ranges, self._max_gap, self._max_block):
+                block = memoryview(self._read(uri, start, stop))
+                for offset, size, key in members:
+                    raw = block[offset - start:offset - start + size]
+                    result[key] = self._finish(key, raw)
+        return result
+
+    def __getitem__(self, key):
+        value = self.getitems([key]).get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        if key in self._cache or self._locate(key) is not None:
+            return True
+        return key in self._meta
+
+    def _chunk_keys(self, path):
+        manifest = self._manifest(path)
+        if manifest is None:
+            return []
+        if isinstance(manifest, ChunkManifest):
+            separator = (self._zarray(path) or {}).get('dimension_separator') or '.'
+            return manifest.to_index().chunk_keys(_join_key(path, ''), separator)
+        return [k for k in manifest if k != 'source']
+
+    def keys(self):
+        for key in self._meta:
+            path, name = _split_key(key)
+            if name in (chunks_meta_key, manifest_meta_key, '.zchunktable'):
+                continue
+            yield key
+            if name == '.zarray':
+                yield from self._chunk_keys(path)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return sum(1 for _ in self.keys())
+
+    def __setitem__(self, key, value):
+        raise PermissionError('ReferenceStore is read-only')
+
+    def __delitem__(self, key):
+        raise PermissionError('ReferenceStore is read-only')
+
+    def clear_cache(self):
+        """Drop all cached chunks."""
+        self._cache.clear()
+        self._cache_bytes = 0
+
+    def close(self):
+        self.clear_cache()
+        self._fs.clear()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+virtual_concat.py — concatenate tomoscan interval files into one virtual Zarr array.
+
+Builds a Zarr store holding a single ``/exchange/data`` array that spans the
+projections of all input HDF5 files along axis 0. No projection data is
+copied: the array's binary chunk manifest points every chunk at its source
+file and byte range, and ``ReferenceStore`` serves the chunks from there::
+
+    store = ReferenceStore(zarr.DirectoryStore('merged.zarr'))
+    data = zarr.open_consolidated(store)['exchange/data']
+
+The theta values of all files are concatenated into a small, regular Zarr
+array (``/exchange/theta``) stored alongside.
+
+All files must share dtype, image size, chunk shape and HDF5 filters, and the
+number of projections of every file except the last must be a multiple of the
+chunk length along axis 0 (always true for the usual one-projection chunks).
+
+Usage
+-----
+    python virtual_concat.py --glob '/data/2024-10/sample_*.h5' --output merged.zarr
+    python virtual_concat.py file_001.h5 file_002.h5 --output merged.zarr
+"""
+
+import argparse
+import glob as glob_module
+import os
+import sys
+import time
+
+import h5py
+import numpy as np
+import zarr
+
+from chunk_index import ChunkIndex, manifest_table, write_manifest
+from h5codecs import filter_pipeline
+
+DS_PROJ  = '/exchange/data'
+DS_THETA = '/exchange/theta'
+
+
+def _codec_config(codec):
+    return None if codec is None else codec.get_config()
+
+
+def scan_file(path, data_path):
+    """Collect layout, filters and chunk index of one interval file."""
+    with h5py.File(path, 'r') as f:
+        dset = f[data_path]
+        if dset.chunks is None:
+            raise ValueError(f'{path}: {data_path} is not chunked')
+        compressor, filters = filter_pipeline(dset)
+        layout = {
+            'shape': dset.shape,
+            'dtype': dset.dtype,
+            'chunks': dset.chunks,
+            'fill_value': dset.fillvalue,
+            'compressor': compressor,
+            'filters': filters,
+            'codecs': (_codec_config(compressor),
+                       [_codec_config(c) for c in filters or []]),
+            'attrs': dict(dset.attrs),
+        }
+        index = ChunkIndex.from_dataset(dset)
+    return layout, index
+
+
+def check_layouts(paths, layouts):
+    """Raise ValueError unless all files can be concatenated chunk by chunk."""
+    first = layouts[0]
+    for path, layout in zip(paths, layouts):
+        for key in ('dtype', 'chunks', 'codecs'):
+            if layout[key] != first[key]:
+                raise ValueError(f'{path}: {key} {layout[key]} differs from '
+                                 f'{paths[0]}: {first[key]}')
+        if layout['shape'][1:] != first['shape'][1:]:
+            raise ValueError(f'{path}: image shape {layout["shape"][1:]} differs '
+                             f'from {paths[0]}: {first["shape"][1:]}')
+    step = first['chunks'][0]
+    for path, layout in zip(paths[:-1], layouts[:-1]):
+        if layout['shape'][0] % step:
+            raise ValueError(f'{path}: {layout["shape"][0]} projections is not '
+                             f'a multiple of the chunk length {step}')
+
+
+def concat_indexes(layouts, indexes):
+    """Shift every file's chunk index along axis 0 and stack them.
+
+    Returns
+    -------
+    tuple
+        Combined ``ChunkIndex`` and the source (file) number of every chunk.
+    """
+    step = layouts[0]['chunks'][0]
+    coords, offsets, sizes, sources = [], [], [], []
+    start = 0
+    for i, (layout, index) in enumerate(zip(layouts, indexes)):
+        c = index.coords.copy()
+        c[:, 0] += start // step
+        coords.append(c)
+        offsets.append(index.offsets)
+        sizes.append(index.sizes)
+        sources.append(np.full(len(index), i, dtype=np.int64))
+        start += layout['shape'][0]
+    return (ChunkIndex(np.concatenate(coords), np.concatenate(offsets),
+                       np.concatenate(sizes)),
+            np.concatenate(sources))
+
+
+def read_theta(paths, theta_path):
+    """Concatenated theta of all files, ``None`` if no file has one.
+
+    Raises ValueError if only some files have theta, since the result would
+    then be out of step with the projections.
+    """
+    theta, missing = [], []
+    for path in paths:
+        with h5py.File(path, 'r') as f:
+            if theta_path in f:
+                theta.append(f[theta_path][:].astype(np.float64))
+            else:
+                missing.append(path)
+    if theta and missing:
+        raise ValueError(f'{missing[0]}: no {theta_path} dataset, theta would '
+                         f'not match the projections')
+    return np.concatenate(theta) if theta else None
+
+
+def virtual_concat(paths, store, data_path=DS_PROJ, theta_path=DS_THETA):
+    """Write a Zarr store with one array referencing all input files.
+
+    Parameters
+    ----------
+    paths : list of str
+        Input HDF5 files, in concatenation order.
+    store : MutableMapping
+        Output Zarr store.
+    data_path, theta_path : str, optional
+        Projection and theta dataset paths in the input files.
+
+    Returns
+    -------
+    zarr.core.Array
+        The virtual projection array (metadata only).
+    """
+    scans = [scan_file(p, data_path) for p in paths]
+    layouts = [s[0] for s in scans]
+    check_layouts(paths, layouts)
+    index, source_ids = concat_indexes(layouts, [s[1] for s in scans])
+    theta = read_theta(paths, theta_path)
+
+    first = layouts[0]
+    shape = (sum(l['shape'][0] for l in layouts),) + tuple(first['shape'][1:])
+    root = zarr.group(store=store, overwrite=True)
+    za = root.create_dataset(data_path, shape=shape, dtype=first['dtype'],
+                             chunks=first['chunks'],
+                             fill_value=first['fill_value'],
+                             compressor=first['compressor'],
+                             filters=first['filters'], overwrite=True)
+    for n, v in first['attrs'].items():
+        if isinstance(v, bytes):
+            v = v.decode('utf-8')
+        elif isinstance(v, (np.ndarray, np.number)):
+            v = v.tolist()
+        try:
+            za.attrs[n] = v
+        except TypeError:
+            print(f'Caught TypeError: {n}@{data_path} = {v} ({type(v)})')
+
+    sources = [{'uri': os.path.abspath(p), 'array_name': data_path}
+               for p in paths]
+    table = manifest_table(index, za.shape, za.chunks, source_ids=source_ids)
+    write_manifest(store, za.path, za.shape, za.chunks, table, sources)
+
+    if theta is not None:
+        # uncompressed: ReferenceStore serves arrays without a manifest as is
+        root.create_dataset(theta_path, data=theta, compressor=None,
+                            overwrite=True)
+    zarr.convenience.consolidate_metadata(store)
+    return za
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    ap.add_argument('files', nargs='*',
+                    help='Input HDF5 files (explicit list, in order)')
+    ap.add_argument('--glob', metavar='PATTERN',
+                    help='Glob pattern for input files (sorted by name)')
+    ap.add_argument('--output', '-o', required=True,
+                    help='Output Zarr directory store')
+    ap.add_argument('--data-path', default=DS_PROJ,
+                    help=f'Projection dataset path (default: {DS_PROJ})')
+    ap.add_argument('--theta-path', default=DS_THETA,
+                    help=f'Theta dataset path (default: {DS_THETA})')
+    args = ap.parse_args()
+
+    input_files = list(args.files)
+    if args.glob:
+        input_files += sorted(glob_module.glob(args.glob))
+    if not input_files:
+        ap.error('No input files specified (use positional args or --glob).')
+    seen = set()
+    input_files = [p for p in input_files if not (p in seen or seen.add(p))]
+    for path in input_files:
+        if not os.path.exists(path):
+            print(f'ERROR: file not found: {path}', file=sys.stderr)
+            sys.exit(1)
+
+    t0 = time.perf_counter()
+    try:
+        za = virtual_concat(input_files, zarr.DirectoryStore(args.output),
+                            args.data_path, args.theta_path)
+    except ValueError as err:
+        print(f'ERROR: {err}', file=sys.stderr)
+        sys.exit(1)
+    print(f'{len(input_files)} files -> {args.output}{args.data_path} '
+          f'{za.shape} {za.dtype} in {time.perf_counter() - t0:.2f} s')
+
+
+if __name__ == '__main__':
+    main()